@@ -0,0 +1,75 @@
+import sys
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# === Журнал приложения ===
+# Сообщения из любых потоков складываются в кольцевой буфер ограниченного размера,
+# а окно забирает их пачкой по таймеру (drain) — одно обновление виджета вместо
+# нескольких вызовов root.after на каждую строку. Дополнительно журнал может писаться
+# в файл с ротацией. Уровень DEBUG — для подробностей по отдельным статьям и запросам.
+
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+
+def parse_level(level):
+    if isinstance(level, int):
+        return level
+    return LEVELS.get(str(level).lower(), INFO)
+
+
+class AppLog:
+    def __init__(self, level=INFO, max_lines=500, console=sys.stdout):
+        self.level = parse_level(level)
+        self.console = console
+        self.lock = threading.Lock()
+        self.pending = deque(maxlen=max_lines)
+        self.dropped = 0  # строк, вытесненных из буфера до того, как окно их забрало
+        self.file = None
+
+    def configure(self, level=None, max_lines=None):
+        if level is not None:
+            self.level = parse_level(level)
+        if max_lines and max_lines != self.pending.maxlen:
+            with self.lock:
+                self.pending = deque(self.pending, maxlen=max_lines)
+
+    def open_file(self, path, max_bytes=1024 * 1024, backups=3):
+        self.close_file()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(message)s"))
+        self.file = handler
+
+    def close_file(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __call__(self, msg, level=INFO):
+        if level < self.level:
+            return
+        line = f"[{datetime.now().strftime('%H:%M:%S')}] {msg}"
+        if self.console:
+            try:
+                print(line, file=self.console)
+            except (OSError, UnicodeEncodeError):
+                pass  # нет консоли (сборка --windowed) или она не умеет в эмодзи
+        if self.pending.maxlen:
+            with self.lock:
+                if len(self.pending) == self.pending.maxlen:
+                    self.dropped += 1
+                self.pending.append(line)
+        if self.file:
+            self.file.handle(logging.LogRecord("freshrss_pro", level, "", 0, msg, None, None))
+
+    def drain(self):
+        # -> (накопившиеся строки, сколько строк пропало из-за переполнения)
+        with self.lock:
+            lines = list(self.pending)
+            self.pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        return lines, dropped
@@ -0,0 +1,926 @@
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+from dedup import canonical_url, simhash, bands, distance, MAX_DISTANCE, DEDUP_WINDOW
+
+# === Локальное хранилище статей (SQLite) ===
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id        TEXT PRIMARY KEY,
+    source    TEXT NOT NULL DEFAULT '',
+    feed_url  TEXT NOT NULL DEFAULT '',
+    title     TEXT NOT NULL DEFAULT '',
+    summary   TEXT NOT NULL DEFAULT '',
+    content   TEXT NOT NULL DEFAULT '',
+    link      TEXT NOT NULL DEFAULT '',
+    image_url TEXT NOT NULL DEFAULT '',
+    published INTEGER NOT NULL DEFAULT 0,
+    fetched   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_articles_published ON articles(published DESC);
+CREATE INDEX IF NOT EXISTS idx_articles_source ON articles(source, published DESC);
+
+CREATE TABLE IF NOT EXISTS favorites (
+    id    TEXT PRIMARY KEY,
+    added INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_favorites_added ON favorites(added DESC);
+
+-- Состояние синхронизации с серверами (курсоры, токены): ключ -> JSON
+CREATE TABLE IF NOT EXISTS sync_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+-- Статьи, пришедшие через API FreshRSS: их id на сервере и состояние прочитано/избрано
+CREATE TABLE IF NOT EXISTS remote_items (
+    id        TEXT PRIMARY KEY,
+    source    TEXT NOT NULL,
+    remote_id TEXT NOT NULL,
+    unread    INTEGER NOT NULL DEFAULT 1,
+    starred   INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_remote_items_remote ON remote_items(source, remote_id);
+
+-- Уже встречавшиеся статьи (64-битные ключи id): по ним определяются новые статьи
+CREATE TABLE IF NOT EXISTS seen (
+    key  INTEGER PRIMARY KEY,
+    seen INTEGER NOT NULL
+);
+
+-- Полосы SimHash-отпечатков статей (см. dedup.py): по ним ищутся кандидаты в дубликаты
+CREATE TABLE IF NOT EXISTS lsh (
+    key INTEGER NOT NULL,
+    id  TEXT NOT NULL
+);
+"""
+
+# Полнотекстовый индекс по очищенному тексту; rowid совпадает с rowid в articles.
+# tags — служебные слова для фильтров поиска (см. fts_tags); запрос пользователя ищется только в FTS_TEXT
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, summary, content, tags,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+);
+INSERT INTO articles_fts(articles_fts, rank) VALUES('rank', 'bm25(10.0, 4.0, 1.0, 0.0)');
+INSERT INTO articles_fts(articles_fts, rank) VALUES('usermerge', 2);
+"""
+FTS_TEXT = "{title summary content}"
+FTS_PREFIXES = (2, 3, 4)  # длины префиксного индекса (prefix в FTS_SCHEMA), в символах
+
+SCHEMA_VERSION = 7
+
+# До стольких совпадений результаты поиска ранжируются полным bm25; в запросе из нескольких слов —
+# если каждое слово встречается не больше чем в стольких статьях (bm25 читает их списки целиком)
+RANK_WINDOW = 200
+
+# Сколько id встречавшихся статей помнить для определения новых
+SEEN_LIMIT = 200000
+
+# Период фильтра по датам уходит в FTS не больше чем стольким словами дат (дни, месяцы или годы);
+# OR по многим спискам документов дороже, чем проверить лишние строки
+DATE_TAGS_LIMIT = 8
+# ...а в ярусе заголовков — только если со словами запроса в заголовке больше стольких статей:
+# короткий список дешевле проверить по датам строк
+TITLE_DATE_ROWS = 500
+MAX_TIMESTAMP = 253402300799      # 9999-12-31 — дальше datetime не считает
+
+# Кэш страниц соединения, КБ: поиск с фильтрами читает списки документов нескольких слов подряд,
+# и в кэше по умолчанию (2 МБ) они вытесняют друг друга — каждый запрос перечитывал бы их с диска
+CACHE_SIZE_KB = 16384
+
+# Страниц индекса за один шаг слияния сегментов (см. compact_index) — несколько миллисекунд под блокировкой
+FTS_MERGE_PAGES = 100
+
+# Избранное при выгрузке читается порциями: блокировка хранилища не держится на всю выгрузку
+FAVORITES_BATCH = 200
+
+COLUMNS = ("id", "source", "feed_url", "title", "summary", "content", "link", "image_url", "published", "fetched",
+           "text", "word_count")
+
+
+def normalize_link(link):
+    # Регистр схемы и хоста, порт по умолчанию, якорь и завершающий слэш на идентичность статьи не влияют
+    link = (link or "").strip()
+    try:
+        parts = urlsplit(link)
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return link
+    if not host:
+        return link
+    scheme = parts.scheme.lower()
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+    return urlunsplit((scheme, host, parts.path.rstrip("/") or "/", parts.query, ""))
+
+
+def normalize_title(title):
+    return " ".join(unicodedata.normalize("NFKC", title or "").split())
+
+
+def article_id(link, title, guid="", feed_url=""):
+    # Стабильный между запусками идентификатор: по guid / id записи ленты, а если его нет —
+    # по нормализованным ссылке и заголовку. Короткие guid вида "123" уникальны только
+    # в пределах своей ленты, поэтому к ним добавляется адрес ленты.
+    guid = (guid or "").strip()
+    if guid:
+        key = f"guid\n{guid}" if (":" in guid or "/" in guid) else f"guid\n{feed_url}\n{guid}"
+    else:
+        key = f"link\n{normalize_link(link)}\n{normalize_title(title)}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=20).hexdigest()
+
+
+def fingerprint(link, texts):
+    # (канонический адрес, SimHash заголовка и текста) — по ним ищутся дубликаты
+    return canonical_url(link), simhash(" ".join(texts))
+
+
+def legacy_article_id(link, title):
+    # Идентификатор версий до 2.0.0.5 — по нему находятся уже сохранённые статьи и избранное
+    return hashlib.sha1(f"{link}|{title}".encode("utf-8")).hexdigest()
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def strip_html(html):
+    if not html:
+        return ""
+    if "<" not in html and "&" not in html:
+        return html
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        return html
+    return " ".join(" ".join(parser.parts).split())
+
+
+_QUERY_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def fts_query(text, prefix_last=False):
+    # Пользовательский запрос -> безопасное выражение FTS5:
+    # "фраза в кавычках", слово* (префикс), остальные слова — через AND
+    terms = []
+    matches = list(_QUERY_TOKEN.finditer(text))
+    for i, m in enumerate(matches):
+        phrase, word = m.group(1), m.group(2)
+        if phrase is not None:
+            words = re.findall(r"\w+", phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+        words = re.findall(r"\w+", word)
+        if not words:
+            continue
+        prefix = word.endswith("*") or (prefix_last and i == len(matches) - 1)
+        terms += [f'"{w}"' for w in words[:-1]]
+        terms.append(f'"{words[-1]}"' + ("*" if prefix else ""))
+    return " AND ".join(terms)
+
+
+def typing_prefix(text):
+    # Поиск при наборе: искать ли последнее слово префиксом. Только пока слово дописывается
+    # (после него нет разделителя) и его длина есть в префиксном индексе — иначе FTS5 перебирал бы
+    # все слова словаря с этим началом. Длинное слово считаем набранным и ищем точно
+    words = re.findall(r"\w+", text)
+    return bool(words) and text[-1:] == words[-1][-1:] and len(words[-1]) in FTS_PREFIXES
+
+
+def match_words(match):
+    # Выражение fts_query -> отдельные слова: '"а б" AND "в"*' -> ['"а"', '"б"', '"в"*']
+    words = []
+    for phrase, star in re.findall(r'"([^"]*)"(\*?)', match):
+        parts = phrase.split()
+        words += [f'"{w}"' for w in parts[:-1]] + [f'"{parts[-1]}"{star}'] if parts else []
+    return list(dict.fromkeys(words))
+
+
+def source_tag(source):
+    return "s" + hashlib.blake2b((source or "").encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _utc_day(timestamp):
+    return datetime.fromtimestamp(min(max(int(timestamp or 0), 0), MAX_TIMESTAMP), timezone.utc).date()
+
+
+_TITLE_WORD = re.compile(r"[^\W_]+")  # "_" токенизатор unicode61 считает разделителем
+
+
+def fts_tags(source, published, title=""):
+    # Служебные слова индекса: источник, год, месяц и день публикации (UTC) и слова заголовка
+    # с префиксом "t". У них свои короткие списки документов, поэтому фильтры поиска и ярус
+    # заголовков пересекаются со списками слов запроса внутри FTS5, а не проверкой каждого совпадения
+    day = _utc_day(published)
+    words = " ".join("t" + w for w in _TITLE_WORD.findall(title or ""))
+    return f"{source_tag(source)} y{day:%Y} m{day:%Y%m} d{day:%Y%m%d} {words}"
+
+
+def title_query(match):
+    # Выражение fts_query -> то же по словам заголовка в tags: "слово"* -> "tслово"*, "а б" -> "tа tб"
+    return re.sub(r'"([^"]*)"', lambda m: '"' + " ".join("t" + w for w in _TITLE_WORD.findall(m.group(1))) + '"', match)
+
+
+def date_tags(first, last, limit=DATE_TAGS_LIMIT):
+    # Слова дат, покрывающие дни с first по last: по дням, а если их больше limit — по месяцам,
+    # затем по годам (лишнее отсеет проверка строки статьи). None — период слишком длинный
+    if (last - first).days < limit:
+        return [f"d{first + timedelta(days=i):%Y%m%d}" for i in range((last - first).days + 1)]
+    months = (last.year - first.year) * 12 + last.month - first.month
+    if months < limit:
+        return [f"m{first.year + (first.month - 1 + i) // 12:04d}{(first.month - 1 + i) % 12 + 1:02d}"
+                for i in range(months + 1)]
+    if last.year - first.year < limit:
+        return [f"y{year}" for year in range(first.year, last.year + 1)]
+    return None
+
+
+def fold_text(text):
+    # Та же нормализация, что у токенизатора unicode61 remove_diacritics: регистр и диакритика
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def word_matcher(text, prefix_last=False):
+    # Проверка запроса по набору слов статьи без обращения к индексу — нужна, чтобы
+    # сужать прошлую выдачу при наборе запроса. Для фраз возвращает None: их проверяет только FTS.
+    exact, prefixes = [], []
+    matches = list(_QUERY_TOKEN.finditer(fold_text(text)))
+    for i, m in enumerate(matches):
+        if m.group(1) is not None:
+            return None
+        word = m.group(2)
+        words = re.findall(r"\w+", word)
+        if not words:
+            continue
+        exact += words[:-1]
+        if word.endswith("*") or (prefix_last and i == len(matches) - 1):
+            prefixes.append(words[-1])
+        else:
+            exact.append(words[-1])
+    if not exact and not prefixes:
+        return None
+
+    def has_prefix(words, prefix):
+        i = bisect_left(words, prefix)
+        return i < len(words) and words[i].startswith(prefix)
+
+    def has_word(words, word):
+        i = bisect_left(words, word)
+        return i < len(words) and words[i] == word
+
+    def matches_words(words):
+        # words — отсортированный кортеж слов статьи (см. ArticleStore.search_words)
+        return all(has_word(words, w) for w in exact) and all(has_prefix(words, p) for p in prefixes)
+    return matches_words
+
+
+def _row_to_article(row):
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "summary": row["summary"],
+        "content": row["content"],
+        "published": row["published"],
+        "origin": {"title": row["source"]},
+        "link": row["link"],
+        "image_url": row["image_url"],
+        "feed_url": row["feed_url"],
+        "text": row["text"],
+        "word_count": row["word_count"]
+    }
+
+
+class ArticleStore:
+    def __init__(self, path):
+        self.path = path
+        in_memory = str(path) == ":memory:"
+        self.created = in_memory or not Path(path).exists()
+        if not in_memory:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        self.collapse = True  # показывать из группы дубликатов только главную статью
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            if not in_memory:
+                self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(f"PRAGMA cache_size = -{int(CACHE_SIZE_KB)}")
+            self.conn.executescript(SCHEMA)
+            self._migrate()
+            self.conn.commit()
+            self.seen = SeenSet(self.conn)
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # Полнотекстовый индекс появился в версии 1 — заполняем его по уже сохранённым статьям
+            self.conn.executescript(FTS_SCHEMA)
+            cur = self.conn.execute("SELECT rowid, title, summary, content FROM articles")
+            self.conn.executemany(
+                "INSERT INTO articles_fts (rowid, title, summary, content) VALUES (?, ?, ?, ?)",
+                ((r[0], strip_html(r[1]), strip_html(r[2]), strip_html(r[3])) for r in cur.fetchall())
+            )
+        if version < 2:
+            # Очищенный при загрузке текст; word_count = -1 — статья ещё не нормализована
+            self.conn.execute("ALTER TABLE articles ADD COLUMN text TEXT NOT NULL DEFAULT ''")
+            self.conn.execute("ALTER TABLE articles ADD COLUMN word_count INTEGER NOT NULL DEFAULT -1")
+        if version < 3:
+            # Уже сохранённые статьи считаются встреченными — после обновления они не «новые»
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen (key, seen) VALUES (?, ?)",
+                ((SeenSet.key(r[0]), r[1]) for r in self.conn.execute("SELECT id, fetched FROM articles").fetchall()))
+        if version < 4:
+            # Группы дубликатов: cluster — id главной статьи группы (NULL у самих главных),
+            # canonical IS NULL — статья ещё не проверена на дубликаты (см. cluster_backlog)
+            self.conn.execute("ALTER TABLE articles ADD COLUMN canonical TEXT")
+            self.conn.execute("ALTER TABLE articles ADD COLUMN simhash INTEGER")
+            self.conn.execute("ALTER TABLE articles ADD COLUMN cluster TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_canonical ON articles(canonical)")
+        if version < 5:
+            # Лента без дубликатов (cluster IS NULL) читается по индексу уже в порядке published,
+            # без сортировки всей таблицы; он же ищет дубликаты группы (cluster = ?)
+            self.conn.execute("DROP INDEX IF EXISTS idx_articles_cluster")
+            self.conn.execute("CREATE INDEX idx_articles_cluster_published ON articles(cluster, published DESC)")
+        if version < 6:
+            # Время публикации — прямо в полосах: окно DEDUP_WINDOW отсекается диапазоном индекса,
+            # и кандидатов столько, сколько статей полосы за эти сутки, а не за всю историю
+            self.conn.execute("ALTER TABLE lsh ADD COLUMN published INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("UPDATE lsh SET published = (SELECT published FROM articles WHERE articles.id = lsh.id)")
+            self.conn.execute("DROP INDEX IF EXISTS idx_lsh_key")
+            self.conn.execute("CREATE INDEX idx_lsh_key_published ON lsh(key, published)")
+        if version < 7:
+            # Столбец tags (источник, дата и слова заголовка — см. fts_tags) для фильтров поиска и яруса заголовков.
+            # Столбец в fts5 не добавить — индекс пересобирается из уже очищенного текста, без разбора HTML
+            self.conn.execute("ALTER TABLE articles_fts RENAME TO articles_fts_old")
+            self.conn.executescript(FTS_SCHEMA)
+            cur = self.conn.execute(
+                "SELECT f.rowid, f.title, f.summary, f.content, a.source, a.published FROM articles_fts_old f "
+                "JOIN articles a ON a.rowid = f.rowid")
+            self.conn.executemany(
+                "INSERT INTO articles_fts (rowid, title, summary, content, tags) VALUES (?, ?, ?, ?, ?)",
+                ((r[0], r[1], r[2], r[3], fts_tags(r[4], r[5], r[1])) for r in cur))
+            self.conn.execute("DROP TABLE articles_fts_old")
+            self.conn.execute("INSERT INTO articles_fts(articles_fts) VALUES('optimize')")
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def upsert(self, articles, feed_url=""):
+        # Возвращает id статей, которых раньше не было в хранилище
+        now = int(time.time())
+        rows = []
+        fts_values = {}
+        legacy = {}
+        for art in articles:
+            art_id = art.get("id")
+            if not art_id:
+                art_id = article_id(art.get("link", ""), art.get("title", ""), art.get("guid", ""),
+                                    art.get("feed_url", feed_url))
+                legacy[art_id] = legacy_article_id(art.get("link", ""), art.get("title", ""))
+            art["id"] = art_id
+            normalized = art.get("word_count", -1) >= 0
+            title = strip_html(art.get("title", ""))
+            fts_values[art_id] = (
+                title,
+                art["text"] if normalized else strip_html(art.get("summary", "")),
+                art["content_text"] if "content_text" in art else strip_html(art.get("content", "")),
+                fts_tags(art.get("origin", {}).get("title", ""), art.get("published", 0), title)
+            )
+            rows.append((
+                art_id,
+                art.get("origin", {}).get("title", ""),
+                art.get("feed_url", feed_url),
+                art.get("title", ""),
+                art.get("summary", ""),
+                art.get("content", ""),
+                art.get("link", ""),
+                art.get("image_url", "") or "",
+                int(art.get("published", 0) or 0),
+                now,
+                art.get("text", ""),
+                int(art.get("word_count", -1))
+            ))
+        if not rows:
+            return []
+        # Отпечатки для дубликатов считаются до захвата блокировки — почти наверняка новым статьям
+        signatures = {r[0]: fingerprint(r[6], fts_values[r[0]]) for r in rows if r[0] not in self.seen}
+        with self.lock:
+            existing = self._existing([r[0] for r in rows])
+            self._adopt_legacy({i: legacy[i] for i in legacy if i not in existing}, existing)
+            self.conn.executemany(
+                f"INSERT INTO articles ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                + ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c != "id"),
+                rows
+            )
+            # В индекс попадают только новые статьи и те, у которых изменился текст, источник или дата
+            self._index([r[0] for r in rows if existing.get(r[0]) != (r[1], r[3], r[4], r[5], r[8])], fts_values)
+            # Новая — статья, которой нет ни в базе, ни среди встречавшихся раньше: проверка в памяти
+            new_ids = list(dict.fromkeys(r[0] for r in rows if r[0] not in existing and r[0] not in self.seen))
+            self.seen.add(new_ids)
+            # Дубликаты уже показанных новостей в новые не попадают — о них не уведомляем и их не озвучиваем
+            inserted = {r[0]: r for r in rows if r[0] not in existing}
+            duplicates = self._cluster(
+                (i, r[8]) + (signatures.get(i) or fingerprint(r[6], fts_values[i])) for i, r in inserted.items())
+            self.conn.commit()
+        return [i for i in new_ids if i not in duplicates]
+
+    def _cluster(self, items):
+        # items: (id, время публикации, канонический адрес, отпечаток) в порядке поступления.
+        # Статья присоединяется к группе раньше сохранённой статьи с тем же каноническим адресом
+        # или с близким отпечатком текста. Возвращает id статей, оказавшихся дубликатами.
+        duplicates = set()
+        for art_id, published, canonical, signature in items:
+            main = None
+            # Полосы пишутся в lsh и для статьи, найденной по адресу: по ним ищут следующие дубликаты
+            keys = bands(signature) if signature is not None else []
+            if canonical:
+                row = self.conn.execute(
+                    "SELECT id, cluster FROM articles WHERE canonical = ? AND id != ? ORDER BY rowid LIMIT 1",
+                    (canonical, art_id)).fetchone()
+                if row:
+                    main = row[1] or row[0]
+            if main is None and signature is not None:
+                # Два диапазона индекса idx_lsh_key_published: статьи в окне DEDUP_WINDOW и статьи без даты.
+                # У статьи без даты окна нет — сравнивается со всей полосой
+                window = (published - DEDUP_WINDOW, published + DEDUP_WINDOW) if published else (-1 << 63, (1 << 63) - 1)
+                lookup = ("SELECT a.id, a.simhash, a.cluster FROM lsh l JOIN articles a ON a.id = l.id "
+                          f"WHERE l.key IN ({', '.join('?' * len(keys))}) AND l.id != ? AND ")
+                rows = self.conn.execute(
+                    lookup + "l.published BETWEEN ? AND ? UNION " + lookup + "l.published = 0",
+                    keys + [art_id, *window] + keys + [art_id]).fetchall()
+                best = min(rows, key=lambda r: distance(signature, r[1]), default=None)
+                if best and distance(signature, best[1]) <= MAX_DISTANCE:
+                    main = best[2] or best[0]
+            self.conn.execute("UPDATE articles SET canonical = ?, simhash = ?, cluster = ? WHERE id = ?",
+                              (canonical, signature, main, art_id))
+            self.conn.executemany("INSERT INTO lsh (key, id, published) VALUES (?, ?, ?)",
+                                  ((k, art_id, published) for k in keys))
+            if main:
+                duplicates.add(art_id)
+        return duplicates
+
+    def cluster_backlog(self, limit=500):
+        # Проверяет на дубликаты статьи, сохранённые до появления группировки (старые — первыми).
+        # -> (сколько проверено, сколько оказалось дубликатами)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT a.id, a.link, a.published, fts.title, fts.summary, fts.content FROM articles a "
+                "JOIN articles_fts fts ON fts.rowid = a.rowid WHERE a.canonical IS NULL ORDER BY a.rowid LIMIT ?",
+                (limit,)).fetchall()
+            duplicates = self._cluster((r[0], r[2]) + fingerprint(r[1], (r[3], r[4], r[5])) for r in rows)
+            self.conn.commit()
+        return len(rows), len(duplicates)
+
+    def duplicates_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM articles WHERE cluster IS NOT NULL").fetchone()[0]
+
+    def _adopt_legacy(self, legacy, existing):
+        # Статьи, сохранённые под старым id, переходят на новый вместе с избранным и связями с сервером.
+        # Избранное из favorites.json старых версий лежит под старым id и без самой статьи —
+        # отметка переходит на статью, как только та придёт из ленты.
+        found = self._existing(list(set(legacy.values())))
+        self.conn.executemany("UPDATE OR IGNORE favorites SET id = ? WHERE id = ?",
+                              ((new_id, old_id) for new_id, old_id in legacy.items()
+                               if old_id not in found and old_id != new_id))
+        for new_id, old_id in legacy.items():
+            if old_id not in found or old_id == new_id:
+                continue
+            self.conn.execute("UPDATE articles SET id = ? WHERE id = ?", (new_id, old_id))
+            self.conn.execute("UPDATE OR IGNORE favorites SET id = ? WHERE id = ?", (new_id, old_id))
+            self.conn.execute("UPDATE OR IGNORE remote_items SET id = ? WHERE id = ?", (new_id, old_id))
+            self.conn.execute("UPDATE articles SET cluster = ? WHERE cluster = ?", (new_id, old_id))
+            self.conn.execute("UPDATE lsh SET id = ? WHERE id = ?", (new_id, old_id))
+            existing[new_id] = found.pop(old_id)
+            self.seen.add([new_id])
+
+    def _index(self, ids, values):
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rowids = self.conn.execute(
+                f"SELECT id, rowid FROM articles WHERE id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            self.conn.executemany("DELETE FROM articles_fts WHERE rowid = ?", ((r[1],) for r in rowids))
+            self.conn.executemany(
+                "INSERT INTO articles_fts (rowid, title, summary, content, tags) VALUES (?, ?, ?, ?, ?)",
+                ((r[1],) + values[r[0]] for r in rowids)
+            )
+
+    def _existing(self, ids):
+        found = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cur = self.conn.execute(
+                f"SELECT id, source, title, summary, content, published FROM articles "
+                f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            found.update((row[0], tuple(row[1:])) for row in cur)
+        return found
+
+    def get(self, art_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM articles WHERE id = ?", (art_id,)).fetchone()
+            if not row:
+                return None
+            art = _row_to_article(row)
+            if row["cluster"] is None:
+                # Источники, из которых пришли дубликаты этой статьи
+                art["alternates"] = [r[0] for r in self.conn.execute(
+                    "SELECT source FROM articles WHERE cluster = ? ORDER BY rowid", (art_id,))]
+        return art
+
+    def headlines(self, ids):
+        # Заголовок, источник и время статей — для строк списка, без текста статьи: id -> кортеж
+        found = {}
+        with self.lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cur = self.conn.execute(
+                    f"SELECT id, title, source, published FROM articles WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk)
+                found.update((row[0], (row[1], row[2], row[3])) for row in cur)
+        return found
+
+    def unnormalized(self, limit=200):
+        # Статьи, сохранённые до появления нормализации при загрузке
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, summary, content, image_url FROM articles WHERE word_count < 0 LIMIT ?", (limit,)).fetchall()
+        return [{"id": r[0], "summary": r[1], "content": r[2], "image_url": r[3]} for r in rows]
+
+    def set_normalized(self, articles):
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE articles SET text = ?, word_count = ?, image_url = ? WHERE id = ?",
+                ((a["text"], a["word_count"], a.get("image_url") or "", a["id"]) for a in articles))
+            self.conn.commit()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    @contextmanager
+    def _cancellable(self, cancel):
+        # cancel() -> True прерывает выполняющийся запрос (sqlite3.OperationalError: interrupted)
+        if cancel is None:
+            yield
+            return
+        self.conn.set_progress_handler(lambda: 1 if cancel() else 0, 1000)
+        try:
+            yield
+        finally:
+            self.conn.set_progress_handler(None, 0)
+
+    def query_ids(self, search="", source=None, favorites_only=False, since=None, until=None,
+                  limit=None, prefix_last=False, cancel=None, unread_only=False, collapse=None):
+        # Список id в порядке показа — сами статьи подгружаются по одной.
+        # Без поискового запроса — новые сверху, с запросом — по релевантности.
+        # Дубликаты скрываются (collapse=None — по настройке хранилища), кроме избранного;
+        # избранное без запроса — по времени добавления, недавно отмеченные сверху.
+        collapse = (self.collapse if collapse is None else collapse) and not favorites_only
+        joins, where, params = self._filters(source, favorites_only, since, until, unread_only)
+        if not search:
+            sql = "SELECT a.id FROM articles a" + joins
+            if collapse:
+                where.append("a.cluster IS NULL")
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY f.added DESC, a.published DESC" if favorites_only else " ORDER BY a.published DESC"
+            if limit:
+                sql += f" LIMIT {int(limit)}"
+            with self.lock, self._cancellable(cancel):
+                try:
+                    return [row[0] for row in self.conn.execute(sql, params)]
+                except sqlite3.OperationalError:
+                    return []
+
+        match = fts_query(search, prefix_last)
+        if not match:
+            return []
+        # Ярус заголовков — по словам заголовка в tags (из той же строки, что и столбец title):
+        # фильтр {title} перебирал бы позиции во всех совпадениях запроса
+        text, title = f"{FTS_TEXT} : ({match})", f"{{tags}} : ({title_query(match)})"
+        with self.lock, self._cancellable(cancel):
+            try:
+                if not joins:
+                    # Источник и даты отбирает сам FTS по словам столбца tags; строка статьи только
+                    # уточняет границы (часть дня, слишком длинный период) — без индекса, проверкой
+                    scope = self._scope(source, since, until)
+                    if scope is None:
+                        return []
+                    by_source, by_date = scope
+                    if by_source:
+                        text, title = (f"{q} AND {{tags}} : ({by_source})" for q in (text, title))
+                    if by_date:
+                        if self._count(title, TITLE_DATE_ROWS + 1) > TITLE_DATE_ROWS:
+                            title = f"{title} AND {{tags}} : ({by_date})"
+                        text = f"{text} AND {{tags}} : ({by_date})"
+                    where = ["+" + term for term in where]
+                if not where and not joins and self._rare(match_words(match)):
+                    # Слова редкие — точное ранжирование bm25 обходится дёшево
+                    return self._match(text, "rank", limit, collapse=collapse)
+                # Частый запрос или фильтры: bm25 пришлось бы считать по всему списку документов.
+                # Ранжируем ярусами — сначала совпадения в заголовке, затем остальные;
+                # внутри яруса — по rowid, т.е. сначала недавно загруженные.
+                ids = self._match(title, "rowid DESC", limit, joins, where, params, collapse)
+                if limit and len(ids) >= limit:
+                    return ids
+                seen = set(ids)
+                rest = self._match(text, "rowid DESC", limit + len(ids) if limit else None, joins, where, params, collapse)
+                for art_id in rest:
+                    if limit and len(ids) >= limit:
+                        break
+                    if art_id not in seen:
+                        ids.append(art_id)
+                return ids
+            except sqlite3.OperationalError:
+                # Синтаксически неверный или прерванный запрос FTS5 — считаем, что ничего не найдено
+                return []
+
+    def _rare(self, words):
+        # Каждое слово — не больше чем в RANK_WINDOW статьях: счёт обрывается на первом частом,
+        # и AND частых слов не перебирает их списки ради горстки общих статей
+        return all(self._count(f"{FTS_TEXT} : ({word})", RANK_WINDOW + 1) <= RANK_WINDOW for word in words)
+
+    def _count(self, match, limit):
+        # Сколько статей подходит под выражение FTS, но не больше limit: счёт без выборки строк
+        return self.conn.execute("SELECT count(*) FROM (SELECT 1 FROM articles_fts WHERE articles_fts MATCH ? LIMIT ?)",
+                                 (match, limit)).fetchone()[0]
+
+    def compact_index(self, pages=FTS_MERGE_PAGES):
+        # Шаг слияния сегментов полнотекстового индекса: каждая запись статей добавляет сегмент,
+        # а поиск обходит их все. -> False, когда сливать больше нечего
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.execute("INSERT INTO articles_fts(articles_fts, rank) VALUES('merge', ?)", (pages,))
+            self.conn.commit()
+            return self.conn.total_changes - before >= 2
+
+    def search_words(self, ids):
+        # Отсортированные наборы нормализованных слов статей из полнотекстового индекса: id -> кортеж
+        words = {}
+        with self.lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cur = self.conn.execute(
+                    "SELECT a.id, fts.title, fts.summary, fts.content FROM articles a "
+                    "JOIN articles_fts fts ON fts.rowid = a.rowid "
+                    f"WHERE a.id IN ({', '.join('?' * len(chunk))})", chunk)
+                words.update(
+                    (row[0], tuple(sorted(set(re.findall(r"\w+", fold_text(f"{row[1]}\n{row[2]}\n{row[3]}"))))))
+                    for row in cur)
+        return words
+
+    @staticmethod
+    def _filters(source, favorites_only, since, until, unread_only=False):
+        joins, where, params = "", [], []
+        if favorites_only:
+            joins += " JOIN favorites f ON f.id = a.id"
+        if unread_only:
+            joins += " JOIN remote_items r ON r.id = a.id AND r.unread = 1"
+        if source:
+            where.append("a.source = ?")
+            params.append(source)
+        if since is not None:
+            where.append("a.published >= ?")
+            params.append(int(since))
+        if until is not None:
+            where.append("a.published < ?")
+            params.append(int(until))
+        return joins, where, params
+
+    def _scope(self, source, since, until):
+        # Фильтры поиска выражениями FTS по столбцу tags: (источник, период), "" — фильтра нет;
+        # None — ничего не найдётся
+        by_source, by_date = source_tag(source) if source else "", ""
+        if since is not None or until is not None:
+            first, last = self.conn.execute(
+                "SELECT (SELECT MIN(published) FROM articles), (SELECT MAX(published) FROM articles)").fetchone()
+            if first is None:
+                return None
+            first = max(first, since) if since is not None else first
+            last = min(last, until - 1) if until is not None else last
+            if first > last:
+                return None
+            days = date_tags(_utc_day(first), _utc_day(last))
+            if days:
+                by_date = " OR ".join(days)
+        return by_source, by_date
+
+    def _match(self, match, order, limit, joins="", where=(), params=(), collapse=False):
+        # Свёртка дубликатов при поиске — проверка строки, а не индекс: с "+" SQLite не поведёт отбор
+        # по idx_articles_cluster_published через все главные статьи мимо FTS и индексов фильтров
+        collapsed = ["+a.cluster IS NULL"] if collapse else []
+        if joins:
+            # Избранное и непрочитанное — небольшие наборы: отбор ведут они, а FTS только проверяет вхождение
+            sql = ("SELECT a.id FROM articles a" + joins + " WHERE "
+                   + " AND ".join(list(where) + collapsed + ["a.rowid IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?)"])
+                   + f" ORDER BY a.{order}")
+            args = list(params) + [match]
+        else:
+            sql = ("SELECT a.id FROM articles_fts fts JOIN articles a ON a.rowid = fts.rowid WHERE articles_fts MATCH ?"
+                   + "".join(f" AND {term}" for term in list(where) + collapsed) + f" ORDER BY fts.{order}")
+            args = [match] + list(params)
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [row[0] for row in self.conn.execute(sql, args)]
+
+    def sources(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT source FROM articles ORDER BY source")]
+
+    def is_favorite(self, art_id):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM favorites WHERE id = ?", (art_id,)).fetchone() is not None
+
+    def set_favorite(self, art_id, favorite=True):
+        with self.lock:
+            if favorite:
+                self.conn.execute("INSERT OR IGNORE INTO favorites (id, added) VALUES (?, ?)", (art_id, int(time.time())))
+            else:
+                self.conn.execute("DELETE FROM favorites WHERE id = ?", (art_id,))
+            self.conn.commit()
+
+    def import_favorites(self, legacy_ids):
+        # Избранное старых версий (id — legacy_article_id). Статьи, уже сохранённые под новым id,
+        # получают отметку сразу; остальные — в upsert, когда придут из ленты (см. _adopt_legacy).
+        # -> сколько отметок сразу нашли свою статью
+        legacy_ids = set(legacy_ids)
+        now = int(time.time())
+        with self.lock:
+            found = {}
+            for art_id, link, title in self.conn.execute("SELECT id, link, title FROM articles"):
+                old_id = legacy_article_id(link, title)
+                if old_id in legacy_ids:
+                    found[old_id] = art_id
+            self.conn.executemany("INSERT OR IGNORE INTO favorites (id, added) VALUES (?, ?)",
+                                  ((found.get(old_id, old_id), now) for old_id in legacy_ids))
+            self.conn.commit()
+        return len(found)
+
+    def favorites_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM favorites").fetchone()[0]
+
+    def favorites(self, batch=FAVORITES_BATCH):
+        # Избранные статьи целиком (с временем добавления "favorited"), недавно отмеченные первыми.
+        # Порции выбираются по индексу idx_favorites_added от места, где закончилась прошлая.
+        after = None
+        while True:
+            with self.lock:
+                sql = "SELECT a.*, f.added AS favorited FROM favorites f JOIN articles a ON a.id = f.id"
+                params = [batch]
+                if after:
+                    sql += " WHERE (f.added, f.id) < (?, ?)"
+                    params = [*after, batch]
+                rows = self.conn.execute(sql + " ORDER BY f.added DESC, f.id DESC LIMIT ?", params).fetchall()
+            for row in rows:
+                yield {**_row_to_article(row), "favorited": row["favorited"]}
+            if len(rows) < batch:
+                return
+            after = (rows[-1]["favorited"], rows[-1]["id"])
+
+    def get_state(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_state(self, key, value):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                              (key, json.dumps(value, ensure_ascii=False)))
+            self.conn.commit()
+
+    def set_remote_items(self, source, items):
+        # items: [(id статьи, id на сервере)] — связь сохраняется, состояние приходит в apply_remote_state
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO remote_items (id, source, remote_id) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET source = excluded.source, remote_id = excluded.remote_id",
+                ((art_id, source, remote_id) for art_id, remote_id in items))
+            self.conn.commit()
+
+    def apply_remote_state(self, source, unread, starred):
+        # unread / starred — множества id на сервере. Звёздочки сервера переносятся в избранное:
+        # отмеченные там статьи добавляются, снятые там — убираются; локальное избранное прочих статей не трогаем.
+        now = int(time.time())
+        with self.lock:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS remote_state (kind TEXT, remote_id TEXT)")
+            self.conn.execute("DELETE FROM remote_state")
+            self.conn.executemany("INSERT INTO remote_state VALUES ('unread', ?)", ((r,) for r in unread))
+            self.conn.executemany("INSERT INTO remote_state VALUES ('starred', ?)", ((r,) for r in starred))
+            self.conn.execute(
+                "UPDATE remote_items SET unread = remote_id IN (SELECT remote_id FROM remote_state WHERE kind = 'unread') "
+                "WHERE source = ?", (source,))
+            changed = self.conn.execute(
+                "SELECT id, remote_id IN (SELECT remote_id FROM remote_state WHERE kind = 'starred') AS now_starred "
+                "FROM remote_items WHERE source = ? AND starred != now_starred", (source,)).fetchall()
+            for art_id, now_starred in changed:
+                if now_starred:
+                    self.conn.execute("INSERT OR IGNORE INTO favorites (id, added) VALUES (?, ?)", (art_id, now))
+                else:
+                    self.conn.execute("DELETE FROM favorites WHERE id = ?", (art_id,))
+            self.conn.executemany("UPDATE remote_items SET starred = ? WHERE id = ?",
+                                  ((now_starred, art_id) for art_id, now_starred in changed))
+            self.conn.execute("DELETE FROM remote_state")
+            self.conn.commit()
+        return len(changed)
+
+    def unread_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM remote_items WHERE unread = 1").fetchone()[0]
+
+
+class SeenSet:
+    # Множество встречавшихся статей: проверка O(1) в памяти, копия в таблице seen переживает перезапуск.
+    # Хранятся 64-битные ключи id; сверх limit забываются встреченные раньше всех.
+    def __init__(self, conn, limit=SEEN_LIMIT):
+        self.conn = conn
+        self.limit = limit
+        self.keys = {row[0] for row in conn.execute("SELECT key FROM seen")}
+
+    @staticmethod
+    def key(art_id):
+        return int.from_bytes(hashlib.blake2b(art_id.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+    def __contains__(self, art_id):
+        return self.key(art_id) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, ids):
+        # Вызывается под блокировкой хранилища, commit делает вызывающий
+        keys = [k for k in map(self.key, ids) if k not in self.keys]
+        if not keys:
+            return
+        self.keys.update(keys)
+        now = int(time.time())
+        self.conn.executemany("INSERT OR IGNORE INTO seen (key, seen) VALUES (?, ?)", ((k, now) for k in keys))
+        if len(self.keys) > self.limit * 1.1:
+            self.conn.execute(
+                "DELETE FROM seen WHERE key NOT IN (SELECT key FROM seen ORDER BY seen DESC LIMIT ?)", (self.limit,))
+            self.keys = {row[0] for row in self.conn.execute("SELECT key FROM seen")}
+
+
+class ArticleList:
+    # Лёгкое представление выборки: в памяти только id, статья читается из базы при обращении
+    def __init__(self, store, ids):
+        self.store = store
+        self.ids = ids
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        art_id = self.ids[index]
+        art = self._cache.get(art_id)
+        if art is None:
+            art = self.store.get(art_id) or {}
+            if len(self._cache) >= 32:
+                self._cache.clear()
+            self._cache[art_id] = art
+        return art
+
+    def headlines(self, start, stop):
+        # (заголовок, источник, время публикации) строк start..stop-1 — для видимого окна списка
+        ids = self.ids[start:stop]
+        found = self.store.headlines(ids)
+        return [found.get(art_id, ("", "", 0)) for art_id in ids]
@@ -0,0 +1,90 @@
+import re
+from datetime import datetime
+from importlib.util import find_spec
+
+from article_store import strip_html
+
+# === Нормализация HTML статей при загрузке ===
+# Разбор HTML выполняется один раз в рабочем потоке загрузки, а показ статьи
+# дальше просто берёт готовый текст. Если установлен lxml — используется он (в разы быстрее),
+# иначе BeautifulSoup, а без него — встроенный html.parser. Сам парсер импортируется
+# при разборе первой статьи, а не при запуске.
+
+LXML_AVAILABLE = find_spec("lxml") is not None
+BS4_AVAILABLE = find_spec("bs4") is not None
+
+PARSER_BACKEND = "lxml" if LXML_AVAILABLE else "bs4" if BS4_AVAILABLE else "html.parser"
+
+_IMG_SRC = re.compile(r"""<img\b[^>]*?\ssrc\s*=\s*["']([^"']+)""", re.IGNORECASE)
+
+
+def _parse_lxml(html):
+    import lxml.html
+    doc = lxml.html.fragment_fromstring(html, create_parent="div")
+    for el in doc.xpath("//script|//style"):
+        el.drop_tree()
+    text = "\n".join(t.strip() for t in doc.itertext() if t.strip())
+    images = doc.xpath("//img/@src")
+    return text, images[0] if images else ""
+
+
+def _parse_bs4(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style"]):
+        tag.decompose()
+    img = soup.find("img", src=True)
+    return soup.get_text(separator="\n", strip=True), img["src"] if img else ""
+
+
+def parse_html(html):
+    # -> (очищенный текст, адрес первой картинки)
+    if not html:
+        return "", ""
+    if "<" not in html and "&" not in html:
+        return html.strip(), ""
+    try:
+        if LXML_AVAILABLE:
+            return _parse_lxml(html)
+        if BS4_AVAILABLE:
+            return _parse_bs4(html)
+    except Exception:
+        pass
+    img = _IMG_SRC.search(html)
+    return strip_html(html), img.group(1) if img else ""
+
+
+def clean_html(html):
+    return parse_html(html)[0]
+
+
+def normalize_article(art):
+    # Дополняет статью полями text, word_count и (если её не было) image_url.
+    # content_text нужен только для полнотекстового индекса и в базе отдельно не хранится.
+    text, summary_img = parse_html(art.get("summary", ""))
+    content_text, content_img = parse_html(art.get("content", ""))
+    art["text"] = text
+    art["word_count"] = len(text.split())
+    art["content_text"] = content_text
+    if not art.get("image_url"):
+        art["image_url"] = summary_img or content_img
+    return art
+
+
+def plain_text(art):
+    # Текст нормализуется при загрузке; разбор HTML здесь — только для старых записей
+    if art.get("word_count", -1) >= 0:
+        return art.get("text", "")
+    return clean_html(art.get("summary", ""))
+
+
+def display_text(art):
+    # Текст статьи в том виде, в каком он выводится в окне
+    title = art.get("title", "Без заголовка")
+    pub_time = datetime.fromtimestamp(art.get("published", 0)).strftime("%d %b %Y, %H:%M") if art.get("published") else "—"
+    meta = f"{art.get('origin', {}).get('title', 'Источник')} • {pub_time}"
+    alternates = art.get("alternates")
+    if alternates:
+        # Та же новость из других источников скрыта из ленты — показываем, сколько их
+        meta += f" • ещё в {len(alternates)}: {', '.join(dict.fromkeys(alternates))}"
+    return f"{title}\n\n{meta}\n\n{plain_text(art)}"
@@ -0,0 +1,94 @@
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from article_store import article_id
+from feed_stream import FeedStream
+from freshrss_engine import VERSION, FreshRSSEngine
+from feed_server import SyntheticFeeds, render_rss, render_atom
+
+# === Бенчмарк разбора больших лент: feedparser против потокового FeedStream ===
+# Одна большая RSS- и одна Atom-лента (как выгрузка FreshRSS), три режима:
+#   feedparser        — FreshRSSEngine.parse_feed, прежний путь
+#   поток             — FeedStream без множества встречавшихся статей: лента читается целиком
+#   поток, +N новых   — FeedStream, когда все статьи, кроме N свежих, уже встречались
+#   python benchmarks/bench_parse.py --items 5000 --item-bytes 3000 --output parse.json
+
+
+class Response:
+    # То, что parse_feed читает из ответа requests
+    def __init__(self, content):
+        self.content = content
+        self.headers = {"Content-Type": "application/xml"}
+
+
+def measure(label, parse, repeat):
+    timings = []
+    entries = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        entries = len(parse())
+        timings.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result = {"p50_ms": statistics.median(timings) * 1000, "max_ms": max(timings) * 1000, "entries": entries,
+              "python_peak_mb": peak / 1048576}
+    print(f"  {label:<22} {result['p50_ms']:10.1f} {result['max_ms']:10.1f} {entries:8d} {result['python_peak_mb']:9.1f}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора лент")
+    parser.add_argument("--items", type=int, default=5000, help="статей в ленте")
+    parser.add_argument("--item-bytes", type=int, default=3000, help="примерный размер текста статьи")
+    parser.add_argument("--new", type=int, default=20, help="новых статей для режима с остановкой")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    feeds = SyntheticFeeds(feeds=1, items=args.items, item_bytes=args.item_bytes)
+    items = feeds.feed_items(0)
+    engine = FreshRSSEngine(tempfile.mkdtemp(prefix="frss_bench_"), log=lambda msg, level=None: None)
+    results = {}
+    for fmt, render in (("rss", render_rss), ("atom", render_atom)):
+        data = render("Большая лента", "https://example.com/big", items)
+        url = f"https://example.com/big.{fmt}"
+        # Уже встречавшиеся — все, кроме args.new самых свежих (лента идёт от новых к старым)
+        seen = {article_id(it["link"], it["title"], it["id"], url) for it in items[args.new:]}
+        print(f"{fmt.upper()}: {len(data) / 1048576:.1f} МБ, {len(items)} статей")
+        print(f"  {'режим':<22} {'p50, мс':>10} {'макс, мс':>10} {'статей':>8} {'пик, МБ':>9}")
+        results[fmt] = {
+            "megabytes": len(data) / 1048576,
+            "feedparser": measure("feedparser", lambda: engine.parse_feed(Response(data), url, "RSS", {}), args.repeat),
+            "stream": measure("поток", lambda: list(FeedStream(data, url, "RSS")), args.repeat),
+            "stream_seen": measure(f"поток, +{args.new} новых",
+                                   lambda: list(FeedStream(data, url, "RSS", seen=seen)), args.repeat)
+        }
+        speedup = results[fmt]["feedparser"]["p50_ms"] / results[fmt]["stream"]["p50_ms"]
+        print(f"  поток быстрее feedparser в {speedup:.1f} раза")
+    engine.close()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "version": VERSION,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k != "output"},
+            "results": results
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Результаты: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+from article_store import ArticleList
+from article_text import display_text
+from freshrss_engine import VERSION, FreshRSSEngine
+from feed_server import SyntheticFeeds, SyntheticFeedServer, add_server_arguments, make_server
+
+# === Бенчмарк полного цикла: обновление -> поиск -> подготовка статей к показу ===
+# Поднимает локальный сервер синтетических лент и прогоняет ядро приложения без интерфейса.
+#   python benchmarks/bench_refresh.py --feeds 100 --latency-ms 50 --jitter-ms 100 --error-rate 0.02 \
+#       --freshrss --output after.json --compare before.json
+# Перед замерами — проверка ленты, опоздавшей к дедлайну обновления (при ошибке код выхода 1).
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return {
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[max(int(len(timings) * 0.95) - 1, 0)] * 1000,
+        "max_ms": timings[-1] * 1000
+    }
+
+
+def refresh_pass(engine, server, label):
+    server.reset_counters()
+    t0 = time.perf_counter()
+    stats = engine.refresh()
+    fetched = time.perf_counter() - t0
+    # То же, что делает окно в _finish_loading: список статей ленты и первая статья
+    t1 = time.perf_counter()
+    articles = ArticleList(engine.store, engine.query())
+    if articles:
+        display_text(articles[0])
+    finished = time.perf_counter() - t1
+    sources = stats["sources"]
+    result = {
+        "seconds": fetched + finished,
+        "fetch_seconds": fetched,
+        "finish_seconds": finished,
+        "sources": len(sources),
+        "errors": sum(1 for s in sources if s["error"]),
+        "not_modified": sum(1 for s in sources if s["status"] == 304),
+        "new_articles": len(stats["new_ids"]),
+        "total_articles": stats["total"],
+        "bytes": sum(s["bytes"] for s in sources),
+        "parse_seconds": sum(s["parse_seconds"] for s in sources),
+        "store_seconds": sum(s.get("store_seconds", 0.0) for s in sources),
+        "slowest_source_seconds": max((s["seconds"] for s in sources), default=0.0),
+        "server": dict(server.counters)
+    }
+    print(f"{label:<14} {result['seconds']:8.2f} {result['parse_seconds']:8.2f} {result['store_seconds']:8.2f} "
+          f"{result['new_articles']:7d} {result['not_modified']:5d} {result['errors']:7d} {result['bytes'] / 1048576:8.1f}")
+    return result
+
+
+def check_deadline(feeds=2, items=5, latency=1.0, deadline=0.3):
+    # Регрессия: лента, не успевшая к refresh_deadline, не должна запоминать ETag / Last-Modified —
+    # иначе следующие проходы получают 304, а её статьи так и не попадают в хранилище
+    server = SyntheticFeedServer(SyntheticFeeds(feeds=feeds, items=items), latency=latency).start()
+    config_dir = Path(tempfile.mkdtemp(prefix="frss_deadline_"))
+    (config_dir / "config.json").write_text(json.dumps({
+        "sources": server.sources(), "refresh_deadline": deadline}), encoding="utf-8")
+    engine = FreshRSSEngine(config_dir, log=lambda msg, level=None: None)
+    errors = []
+    try:
+        first = engine.refresh()
+        if first["total"]:
+            errors.append(f"первый проход успел сохранить {first['total']} статей до дедлайна {deadline} с")
+        time.sleep(latency + 0.5)  # опоздавшие загрузки первого прохода завершаются в фоне
+        server.latency = 0.0
+        second = engine.refresh()
+        statuses = [s["status"] for s in second["sources"]]
+        if statuses != [200] * feeds:
+            errors.append(f"второй проход: ответы {statuses} вместо 200 — валидаторы опоздавших лент сохранены")
+        if second["total"] != feeds * items:
+            errors.append(f"второй проход: в хранилище {second['total']} статей из {feeds * items}")
+    finally:
+        engine.close()
+        server.stop()
+    return errors
+
+
+def bench_search(engine, words, repeat):
+    queries = {
+        "частое слово": words[0],
+        "средняя частота": words[300],
+        "редкое слово": words[20000],
+        "два слова": f"{words[300]} {words[400]}",
+        "префикс": words[5000][:3],
+        "лента без поиска": ""
+    }
+    results = {}
+    for label, query in queries.items():
+        timings = []
+        found = 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            found = len(engine.query(search=query, limit=50, prefix_last=True))
+            timings.append(time.perf_counter() - t0)
+        results[label] = {**percentiles(timings), "results": found}
+        print(f"  {label:<18} p50 {results[label]['p50_ms']:7.3f} мс, p95 {results[label]['p95_ms']:7.3f} мс, "
+              f"найдено {found}")
+    return results
+
+
+def bench_display(engine, count):
+    ids = engine.query()
+    random.Random(3).shuffle(ids)
+    timings = []
+    for art_id in ids[:count]:
+        # Свежий ArticleList на каждую статью — без попаданий во внутренний кэш списка
+        t0 = time.perf_counter()
+        display_text(ArticleList(engine.store, [art_id])[0])
+        timings.append(time.perf_counter() - t0)
+    result = percentiles(timings) if timings else {}
+    if timings:
+        print(f"  подготовка статьи: p50 {result['p50_ms']:.3f} мс, p95 {result['p95_ms']:.3f} мс ({len(timings)} шт.)")
+    return result
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1048576 if sys.platform == "darwin" else peak / 1024
+
+
+def compare(baseline, current, path=()):
+    # Печатает изменение всех числовых метрик относительно прошлого прогона
+    for key, value in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare(old or {}, value, path + (key,))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(old, (int, float)) and old:
+            delta = (value - old) / old
+            mark = "  <-- хуже" if delta > 0.1 and key.endswith(("seconds", "_ms", "_mb")) else ""
+            print(f"  {'.'.join(path + (key,)):<56} {old:12.3f} -> {value:12.3f} ({delta:+.0%}){mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обновления, поиска и показа статей")
+    add_server_arguments(parser)
+    parser.add_argument("--freshrss", nargs="?", const="rss", choices=("rss", "api"),
+                        help="добавить источник-заменитель FreshRSS (RSS-лента или Google Reader API)")
+    parser.add_argument("--workers", type=int, default=8, help="fetch_workers")
+    parser.add_argument("--new-items", type=int, default=5, help="новых статей на ленту перед третьим проходом")
+    parser.add_argument("--repeat", type=int, default=50, help="повторов каждого поискового запроса")
+    parser.add_argument("--display", type=int, default=500, help="статей для замера подготовки к показу")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="считать пик памяти Python через tracemalloc (замедляет прогон)")
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    errors = check_deadline()
+    if errors:
+        print("Ошибка обновления с дедлайном:\n  " + "\n  ".join(errors))
+        return 1
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    server = make_server(args).start()
+    config_dir = Path(tempfile.mkdtemp(prefix="frss_bench_"))
+    (config_dir / "config.json").write_text(json.dumps({
+        "sources": server.sources(args.freshrss),
+        "fetch_workers": args.workers,
+        # Все синтетические ленты живут на одном хосте, а изображают разные сайты
+        "http_per_host": args.workers
+    }), encoding="utf-8")
+    engine = FreshRSSEngine(config_dir, log=lambda msg, level=None: None)
+
+    print(f"{'проход':<14} {'всего, с':>8} {'разбор':>8} {'запись':>8} {'новых':>7} {'304':>5} {'ошибок':>7} {'МБ':>8}")
+    refresh = {"cold": refresh_pass(engine, server, "холодный")}
+    refresh["warm"] = refresh_pass(engine, server, "без изменений")
+    server.feeds.advance(args.new_items)
+    refresh["incremental"] = refresh_pass(engine, server, f"+{args.new_items} на ленту")
+
+    print("Поиск:")
+    search = bench_search(engine, server.feeds.vocabulary[0], args.repeat)
+    print("Показ:")
+    display = bench_display(engine, args.display)
+
+    memory = {"peak_rss_mb": peak_rss_mb()}
+    if args.tracemalloc:
+        memory["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1048576
+        tracemalloc.stop()
+    print("Память: " + ", ".join(f"{k} {v:.1f}" for k, v in memory.items() if v is not None))
+
+    engine.close()
+    server.stop()
+
+    results = {
+        "version": VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "refresh": refresh,
+        "search": search,
+        "display": display,
+        "memory": memory
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Результаты: {args.output}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if baseline.get("params") != results["params"]:
+            print("⚠️ Параметры прогонов различаются — сравнение неточное")
+        print(f"Сравнение с {args.compare} ({baseline.get('version')}, {baseline.get('timestamp')}):")
+        compare(baseline, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from article_store import ArticleStore
+from dedup import bands
+
+# === Бенчмарк полнотекстового поиска по хранилищу статей ===
+#   python benchmarks/bench_search.py --articles 100000
+# Медиана каждого запроса должна укладываться в --max-ms (по умолчанию 1 мс) — иначе код выхода 1.
+
+SOURCES = [f"Источник {i}" for i in range(80)]
+MAX_P50_MS = 1.0
+ROUNDS = 5
+ROUND_PAUSE = 2.0   # с
+
+# Синтетический словарь с частотами по закону Ципфа — как в настоящих текстах:
+# несколько слов встречаются почти везде, а большинство — в единицах документов
+VOCABULARY = 60000
+SYLLABLES = ["ка", "ло", "ми", "ро", "ст", "на", "ви", "те", "за", "пр", "ра", "ко", "sa", "ti", "ne", "or"]
+
+
+def make_vocabulary(rng):
+    words = {"новости", "экономика", "политика", "спорт", "технологии", "наука", "культура", "погода"}
+    while len(words) < VOCABULARY:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))))
+    words = sorted(sorted(words), key=lambda w: (w not in ("новости", "экономика", "политика"), rng.random()))
+    weights, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1.0 / rank
+        weights.append(total)
+    return words, weights
+
+
+def make_text(rng, vocabulary, n):
+    words, weights = vocabulary
+    return " ".join(rng.choices(words, cum_weights=weights, k=n))
+
+
+def generate(store, count, vocabulary, seed=13, batch=1000):
+    rng = random.Random(seed)
+    now = int(time.time())
+    started = time.perf_counter()
+    offset = store.count()
+    for start in range(0, count, batch):
+        articles = []
+        for i in range(start, min(start + batch, count)):
+            articles.append({
+                "title": make_text(rng, vocabulary, 8),
+                "summary": f"<p>{make_text(rng, vocabulary, 40)}</p>",
+                "content": f"<div><p>{make_text(rng, vocabulary, 150)}</p><script>var x = 1;</script></div>",
+                "published": now - rng.randint(0, 365 * 86400),
+                "origin": {"title": rng.choice(SOURCES)},
+                "link": f"https://example.com/{offset + i}"
+            })
+        store.upsert(articles)
+    return time.perf_counter() - started
+
+
+def check_duplicates(store, vocabulary, count=50):
+    # Регрессия: перепечатка уже сохранённой статьи (тот же канонический адрес, текст длиннее 20 слов)
+    # должна уйти в группу дубликатов вместе со своими полосами SimHash, а не ронять upsert всей порции.
+    # В той же порции — уникальные статьи, которые проверяются через SimHash.
+    # Метка запуска — в адресах и в зерне: при повторном прогоне на той же базе тексты другие
+    tag = time.time_ns()
+    rng = random.Random(tag)
+    originals = store.conn.execute(
+        "SELECT link, title, summary, content, published FROM articles ORDER BY rowid LIMIT ?", (count,)).fetchall()
+    batch, unique = [], []
+    for i, (link, title, summary, content, published) in enumerate(originals):
+        batch.append({"title": title, "summary": summary, "content": content, "published": published,
+                      "origin": {"title": "Перепечатка"}, "link": f"{link}?utm_source=bench{tag}"})
+        art = {"title": make_text(rng, vocabulary, 8), "summary": f"<p>{make_text(rng, vocabulary, 40)}</p>",
+               "content": "", "published": published, "origin": {"title": SOURCES[0]},
+               "link": f"https://example.com/check/{tag}-{i}"}
+        batch.append(art)
+        unique.append(art)
+    new_ids = store.upsert(batch)
+    errors = []
+    if set(new_ids) != {art["id"] for art in unique}:
+        errors.append(f"новыми названы {len(new_ids)} статей вместо {len(unique)}")
+    for art in batch[::2]:
+        cluster, signature = store.conn.execute(
+            "SELECT cluster, simhash FROM articles WHERE id = ?", (art["id"],)).fetchone()
+        keys = {row[0] for row in store.conn.execute("SELECT key FROM lsh WHERE id = ?", (art["id"],))}
+        if cluster is None:
+            errors.append(f"{art['link']}: перепечатка не попала в группу")
+        elif signature is None or keys != set(bands(signature)):
+            errors.append(f"{art['link']}: полосы SimHash не совпадают с отпечатком статьи")
+    return errors[:5]
+
+
+def measure(store, cases, repeat, rounds=ROUNDS):
+    # Замер идёт раундами с паузами: скорость общего хоста «плавает» волнами по нескольку секунд,
+    # и одна волна не должна достаться целиком одному запросу. В раунде каждый запрос повторяется
+    # подряд. p50 — медиана лучшего раунда (как min у timeit), p95 — по всем замерам
+    timings = {label: [[] for _ in range(rounds)] for label in cases}
+    found = {}
+    for r in range(rounds):
+        if r:
+            time.sleep(ROUND_PAUSE)
+        for label, kwargs in cases.items():
+            for _ in range(max(repeat // rounds, 1)):
+                t0 = time.perf_counter()
+                found[label] = len(store.query_ids(**kwargs))
+                timings[label][r].append((time.perf_counter() - t0) * 1000)
+    results = []
+    for label, per_round in timings.items():
+        p50 = min(statistics.median(t) for t in per_round)
+        every = sorted(t for t in sum(per_round, []))
+        p95 = every[max(int(len(every) * 0.95) - 1, 0)]
+        print(f"{label:<36} {p50:8.3f} {p95:8.3f} {found[label]:8d}")
+        results.append({"label": label, "p50_ms": p50, "p95_ms": p95, "results": found[label]})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска ArticleStore")
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50, help="размер страницы результатов")
+    parser.add_argument("--db", help="путь к базе (по умолчанию — временный файл)")
+    parser.add_argument("--max-ms", type=float, default=MAX_P50_MS,
+                        help="предел медианы любого запроса, мс; 0 — не проверять")
+    args = parser.parse_args()
+
+    db_path = args.db or str(Path(tempfile.mkdtemp()) / "bench_articles.db")
+    store = ArticleStore(db_path)
+    vocabulary = make_vocabulary(random.Random(7))
+    if store.count() < args.articles:
+        elapsed = generate(store, args.articles - store.count(), vocabulary)
+        print(f"Загружено {store.count()} статей за {elapsed:.1f} с ({db_path})")
+    # Как приложение после обновления: сегменты индекса сливаются до замеров
+    t0 = time.perf_counter()
+    steps = 0
+    while store.compact_index():
+        steps += 1
+    if steps:
+        print(f"Индекс уплотнён за {time.perf_counter() - t0:.1f} с ({steps} шагов)")
+
+    errors = check_duplicates(store, vocabulary)
+    if errors:
+        print("Ошибка группировки дубликатов:\n  " + "\n  ".join(errors))
+        store.close()
+        return 1
+
+    words = vocabulary[0]
+    common, medium, rare = words[0], words[300], words[20000]
+    now = int(time.time())
+    print(f"{'запрос':<36} {'p50, мс':>8} {'p95, мс':>8} {'найдено':>8}")
+    cases = {
+        "редкое слово": dict(search=rare),
+        "слово средней частоты": dict(search=medium),
+        "частое слово": dict(search=common),
+        "два слова (AND)": dict(search=f"{medium} {words[400]}"),
+        "фраза": dict(search=f'"{common} {words[1]}"'),
+        "префикс": dict(search=words[5000][:4] + "*"),
+        "слово + источник": dict(search=medium, source=SOURCES[7]),
+        "слово + последние 30 дней": dict(search=medium, since=now - 30 * 86400),
+        "лента без поиска": dict(),
+        # По умолчанию дубликаты свёрнуты (cluster IS NULL); здесь — та же выборка без свёртки
+        "частое слово, без свёртки": dict(search=common, collapse=False),
+        "лента без поиска, без свёртки": dict(collapse=False),
+    }
+    results = measure(store, {label: {**kwargs, "limit": args.limit} for label, kwargs in cases.items()}, args.repeat)
+    worst = max(r["p50_ms"] for r in results)
+    print(f"Худшая медиана: {worst:.3f} мс")
+    store.close()
+    slow = [r for r in results if args.max_ms and r["p50_ms"] > args.max_ms]
+    if slow:
+        print(f"Медиана больше {args.max_ms} мс: " + ", ".join(f"{r['label']} ({r['p50_ms']:.3f} мс)" for r in slow))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
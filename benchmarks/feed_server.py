@@ -0,0 +1,374 @@
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_search import make_vocabulary, make_text
+from greader import ITEM_PREFIX, READING_LIST, READ, STARRED
+
+# === Локальный сервер синтетических лент для бенчмарков ===
+#   /feed/<n>.xml   — RSS 2.0 или Atom (доля Atom задаётся atom_ratio)
+#   /i/?a=rss&...   — заменитель FreshRSS: свежие статьи всех лент одной RSS-лентой
+#   /api/greader.php/... — заменитель Google Reader API FreshRSS (вход, stream/contents, stream/items/ids)
+# Ленты детерминированы (seed), поддерживают ETag / If-None-Match, а задержка и доля ошибок настраиваются.
+#   python benchmarks/feed_server.py --feeds 100 --latency-ms 80 --write-config /tmp/frss
+
+ITEM_INTERVAL = 600  # сек. между соседними статьями одной ленты
+API_PASSWORD = "bench"
+GREADER = "/api/greader.php"
+
+
+class SyntheticFeeds:
+    def __init__(self, feeds=50, items=50, item_bytes=1500, atom_ratio=0.5, freshrss_items=500, seed=1):
+        self.feeds = feeds
+        self.items = items
+        self.item_bytes = item_bytes
+        self.atom_ratio = atom_ratio
+        self.freshrss_items = freshrss_items
+        self.seed = seed
+        self.vocabulary = make_vocabulary(random.Random(seed))
+        self.epoch = int(time.time()) - items * ITEM_INTERVAL  # последние статьи — «сейчас»
+        self.added = 0  # статей, появившихся в каждой ленте после старта
+        self.lock = threading.Lock()
+        self.cache = {}  # (путь, added) -> тело ответа
+        self.stream = None  # (added, все статьи для Google Reader API, новые сверху)
+
+    def advance(self, count=5):
+        # Имитирует публикацию новых статей во всех лентах
+        with self.lock:
+            self.added += count
+            self.cache.clear()
+            self.stream = None
+
+    def is_atom(self, feed):
+        return random.Random(self.seed * 7919 + feed).random() < self.atom_ratio
+
+    def total(self):
+        return self.items + self.added
+
+    def item(self, feed, n):
+        rng = random.Random(self.seed * 1000003 + feed * 10007 + n)
+        paragraphs = []
+        size = 0
+        while size < self.item_bytes:
+            p = make_text(rng, self.vocabulary, rng.randint(20, 60))
+            paragraphs.append(f"<p>{p}</p>")
+            size += len(p) + 7
+        image = f'<img src="https://img.example.com/{feed}/{n}.jpg">' if n % 3 == 0 else ""
+        return {
+            "id": f"urn:synthetic:{feed}:{n}",
+            "title": make_text(rng, self.vocabulary, rng.randint(4, 10)).capitalize(),
+            "link": f"https://example.com/feed/{feed}/item/{n}",
+            "published": self.epoch + n * ITEM_INTERVAL + feed,
+            "summary": paragraphs[0],
+            "content": image + "".join(paragraphs)
+        }
+
+    def feed_items(self, feed):
+        total = self.total()
+        return [self.item(feed, n) for n in range(total - 1, max(total - self.items, 0) - 1, -1)]
+
+    def etag(self, path):
+        return f'"{zlib.crc32(path.encode()):08x}-{self.added}"'
+
+    def render(self, path):
+        key = (path, self.added)
+        with self.lock:
+            body = self.cache.get(key)
+        if body is not None:
+            return body
+        if path == "/i/":
+            body = self.render_freshrss()
+        else:
+            name = path.rsplit("/", 1)[-1].split(".")[0]
+            feed = int(name) if name.isdigit() else -1
+            if not 0 <= feed < self.feeds:
+                return None
+            items = self.feed_items(feed)
+            if self.is_atom(feed):
+                body = render_atom(f"Синтетическая лента {feed}", f"https://example.com/feed/{feed}", items)
+            else:
+                body = render_rss(f"Синтетическая лента {feed}", f"https://example.com/feed/{feed}", items)
+        with self.lock:
+            self.cache[key] = body
+        return body
+
+    def greader_items(self):
+        with self.lock:
+            if self.stream and self.stream[0] == self.added:
+                return self.stream[1]
+        total = self.total()
+        items = []
+        for feed in range(self.feeds):
+            for n in range(max(total - self.items, 0), total):
+                it = self.item(feed, n)
+                categories = [READING_LIST]
+                if (feed + n) % 3 == 0:
+                    categories.append(READ)
+                if n % 17 == 0:
+                    categories.append(STARRED)
+                items.append({
+                    "id": f"{ITEM_PREFIX}{feed * 1000000 + n + 1:016x}",
+                    "crawlTimeMsec": str(it["published"] * 1000),
+                    "timestampUsec": str(it["published"] * 1000000),
+                    "published": it["published"],
+                    "title": it["title"],
+                    "canonical": [{"href": it["link"]}],
+                    "alternate": [{"href": it["link"], "type": "text/html"}],
+                    "categories": categories,
+                    "origin": {"streamId": f"feed/{feed}", "title": f"Синтетическая лента {feed}"},
+                    "summary": {"content": it["content"]}
+                })
+        items.sort(key=lambda it: it["published"], reverse=True)
+        with self.lock:
+            self.stream = (self.added, items)
+        return items
+
+    def render_freshrss(self):
+        per_feed = max(1, self.freshrss_items // max(self.feeds, 1))
+        items = []
+        total = self.total()
+        for feed in range(self.feeds):
+            items += [self.item(feed, n) for n in range(total - 1, max(total - per_feed, 0) - 1, -1)]
+        items.sort(key=lambda it: it["published"], reverse=True)
+        return render_rss("FreshRSS (синтетический)", "https://freshrss.example.com/", items[:self.freshrss_items])
+
+
+def render_rss(title, link, items):
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>',
+           f"<title>{escape(title)}</title><link>{escape(link)}</link>"]
+    for it in items:
+        out.append(
+            f"<item><title>{escape(it['title'])}</title><link>{escape(it['link'])}</link>"
+            f'<guid isPermaLink="false">{it["id"]}</guid><pubDate>{formatdate(it["published"])}</pubDate>'
+            f"<description>{escape(it['summary'])}</description></item>")
+    out.append("</channel></rss>")
+    return "".join(out).encode("utf-8")
+
+
+def render_atom(title, link, items):
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">',
+           f'<title>{escape(title)}</title><link href="{escape(link)}"/><id>{escape(link)}</id>']
+    for it in items:
+        updated = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(it["published"]))
+        out.append(
+            f'<entry><title>{escape(it["title"])}</title><link href="{escape(it["link"])}"/>'
+            f"<id>{it['id']}</id><updated>{updated}</updated>"
+            f'<summary type="html">{escape(it["summary"])}</summary>'
+            f'<content type="html">{escape(it["content"])}</content></entry>')
+    out.append("</feed>")
+    return "".join(out).encode("utf-8")
+
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        server.count("requests")
+        rng = random.Random()
+        if server.latency or server.jitter:
+            time.sleep(server.latency + rng.uniform(0, server.jitter))
+        if server.error_rate and rng.random() < server.error_rate:
+            server.count("errors")
+            return self.reply(rng.choice((500, 502, 503)), b"synthetic error")
+
+        route = server.routes.get(url.path) or (server.feed_route if url.path.startswith("/feed/") else None)
+        if route is None:
+            return self.reply(404, b"not found")
+        route(self, url.path, parse_qs(url.query))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode("utf-8")) if length else {}
+        self.server.count("requests")
+        if url.path != f"{GREADER}/accounts/ClientLogin":
+            return self.reply(404, b"not found")
+        if form.get("Passwd") != [self.server.api_password]:
+            return self.reply(401, b"Error=BadAuthentication\n")
+        auth = f"{form.get('Email', ['bench'])[0]}/{self.server.auth_token}"
+        self.reply(200, f"SID={auth}\nLSID=null\nAuth={auth}\n".encode(), {"Content-Type": "text/plain"})
+
+    def _authorized(self):
+        return self.headers.get("Authorization", "").endswith(f"/{self.server.auth_token}")
+
+    def serve_stream(self, path, query):
+        if not self._authorized():
+            return self.reply(401, b"Unauthorized")
+        since = int(query.get("ot", ["0"])[0])
+        count = min(int(query.get("n", ["20"])[0]), 1000)
+        offset = int(query.get("c", ["0"])[0])
+        items = [it for it in self.server.feeds.greader_items() if it["published"] > since]
+        data = {"id": READING_LIST, "updated": int(time.time()), "items": items[offset:offset + count]}
+        if offset + count < len(items):
+            data["continuation"] = str(offset + count)
+        self.reply_json(data)
+
+    def serve_item_ids(self, path, query):
+        if not self._authorized():
+            return self.reply(401, b"Unauthorized")
+        stream = query.get("s", [READING_LIST])[0]
+        exclude = query.get("xt", [None])[0]
+        count = min(int(query.get("n", ["20"])[0]), 10000)
+        offset = int(query.get("c", ["0"])[0])
+        refs = [str(int(it["id"][len(ITEM_PREFIX):], 16)) for it in self.server.feeds.greader_items()
+                if stream in it["categories"] and exclude not in it["categories"]]
+        data = {"itemRefs": [{"id": ref} for ref in refs[offset:offset + count]]}
+        if offset + count < len(refs):
+            data["continuation"] = str(offset + count)
+        self.reply_json(data)
+
+    def reply_json(self, data):
+        self.reply(200, json.dumps(data, ensure_ascii=False).encode("utf-8"),
+                   {"Content-Type": "application/json; charset=utf-8"})
+
+    def serve_feed(self, path, query):
+        feeds = self.server.feeds
+        if path == "/i/":
+            if query.get("a") != ["rss"] or not query.get("token"):
+                return self.reply(403, b"forbidden")
+        body = feeds.render(path)
+        if body is None:
+            return self.reply(404, b"not found")
+        etag = feeds.etag(path)
+        if self.headers.get("If-None-Match") == etag:
+            self.server.count("not_modified")
+            return self.reply(304, b"", {"ETag": etag})
+        ctype = "application/atom+xml" if body.startswith(b'<?xml version="1.0" encoding="UTF-8"?>\n<feed') else "application/rss+xml"
+        self.reply(200, body, {"ETag": etag, "Content-Type": f"{ctype}; charset=utf-8"})
+
+    def reply(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        self.server.count("bytes", len(body))
+
+
+class SyntheticFeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, feeds, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0):
+        super().__init__((host, port), FeedRequestHandler)
+        self.feeds = feeds
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.routes = {  # путь -> обработчик(handler, path, query)
+            "/i/": FeedRequestHandler.serve_feed,
+            f"{GREADER}/reader/api/0/stream/contents/{READING_LIST}": FeedRequestHandler.serve_stream,
+            f"{GREADER}/reader/api/0/stream/items/ids": FeedRequestHandler.serve_item_ids
+        }
+        self.api_password = API_PASSWORD
+        self.auth_token = f"{random.Random(feeds.seed).getrandbits(64):016x}"
+        self.feed_route = FeedRequestHandler.serve_feed
+        self.counters_lock = threading.Lock()
+        self.counters = {"requests": 0, "errors": 0, "not_modified": 0, "bytes": 0}
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key, value=1):
+        with self.counters_lock:
+            self.counters[key] += value
+
+    def reset_counters(self):
+        with self.counters_lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def feed_urls(self):
+        return [f"{self.url}/feed/{i}.xml" for i in range(self.feeds.feeds)]
+
+    def sources(self, freshrss=None):
+        # Список источников в формате config.json; freshrss: None, "rss" (/i/?a=rss) или "api" (Google Reader API)
+        sources = [{"type": "rss", "url": url, "name": f"feed-{i}"} for i, url in enumerate(self.feed_urls())]
+        if freshrss:
+            src = {"type": "freshrss", "url": self.url, "user": "bench", "token": "bench", "name": "FreshRSS"}
+            if freshrss == "api":
+                src["api_password"] = self.api_password
+            sources.append(src)
+        return sources
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--feeds", type=int, default=50)
+    parser.add_argument("--items", type=int, default=50, help="статей в каждой ленте")
+    parser.add_argument("--item-bytes", type=int, default=1500, help="примерный размер текста статьи")
+    parser.add_argument("--atom-ratio", type=float, default=0.5, help="доля лент в формате Atom")
+    parser.add_argument("--freshrss-items", type=int, default=500, help="статей в ленте-заменителе FreshRSS")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 5xx")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def make_server(args, port=0):
+    feeds = SyntheticFeeds(args.feeds, args.items, args.item_bytes, args.atom_ratio, args.freshrss_items, args.seed)
+    return SyntheticFeedServer(feeds, port=port, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                               error_rate=args.error_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер синтетических RSS/Atom-лент")
+    add_server_arguments(parser)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--freshrss", nargs="?", const="rss", choices=("rss", "api"),
+                        help="добавить в конфиг источник FreshRSS (RSS-лента или Google Reader API)")
+    parser.add_argument("--write-config", metavar="DIR", help="записать config.json с источниками этого сервера")
+    args = parser.parse_args()
+
+    server = make_server(args, args.port)
+    if args.write_config:
+        path = Path(args.write_config) / "config.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"sources": server.sources(args.freshrss)}, indent=2, ensure_ascii=False),
+                        encoding="utf-8")
+        print(f"Конфиг: {path}")
+    print(f"Ленты: {server.url}/feed/0..{args.feeds - 1}.xml, FreshRSS: {server.url}/i/?a=rss&token=..., "
+          f"API: {server.url}{GREADER} (пароль API: {server.api_password})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import re
+import hashlib
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# === Поиск дубликатов статей из разных источников ===
+# Одна и та же новость приходит из RSS-ленты и из FreshRSS или от нескольких изданий сразу.
+# Точные копии узнаются по каноническому адресу (без схемы, www и меток отслеживания),
+# почти одинаковые тексты — по SimHash: 64-битному отпечатку слов, у похожих текстов
+# отличающемуся в нескольких битах. Отпечаток делится на LSH_BANDS полос по 8 бит; если
+# тексты расходятся меньше чем в LSH_BANDS битах, хотя бы одна полоса у них совпадает,
+# поэтому кандидаты ищутся по индексу полос, а не перебором всех статей.
+
+SIMHASH_BITS = 64
+LSH_BANDS = 8
+BAND_BITS = SIMHASH_BITS // LSH_BANDS
+MAX_DISTANCE = 6                  # биты; должно быть меньше LSH_BANDS
+SHINGLE = 2                       # слов в одном фрагменте
+MIN_WORDS = 20                    # у более коротких текстов отпечаток ненадёжен
+MAX_WORDS = 600                   # дальше текст на отпечаток почти не влияет
+DEDUP_WINDOW = 3 * 86400          # похожие тексты сравниваются в пределах трёх суток
+
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "yclid", "msclkid", "igshid", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+    "ref", "ref_src", "ref_url", "cmpid", "ncid"
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "at_", "__twitter", "_ga")
+
+
+def canonical_url(link):
+    # Адрес статьи без того, что не меняет саму статью. Для адресов главной страницы — пустая
+    # строка: некоторые ленты ставят её ссылкой у всех статей.
+    try:
+        parts = urlsplit((link or "").strip())
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return ""
+    if not host:
+        return ""
+    if host.startswith("www."):
+        host = host[4:]
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES))
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    if not path and not query:
+        return ""
+    return host + path + ("?" + urlencode(query) if query else "")
+
+
+def simhash(text):
+    # 64-битный отпечаток текста (со знаком — для INTEGER в SQLite) или None для коротких текстов
+    words = re.findall(r"\w+", text.casefold())[:MAX_WORDS]
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+    # Столбцы битов всех фрагментов считаются разом: zip по двоичным строкам работает на C
+    bits = [format(int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+            for s in shingles]
+    half = len(bits) / 2
+    value = 0
+    for column in zip(*bits):
+        value = (value << 1) | (column.count("1") > half)
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def bands(signature):
+    # Ключи полос отпечатка для индекса: номер полосы в старших битах, значение — в младших
+    value = signature & ((1 << SIMHASH_BITS) - 1)
+    mask = (1 << BAND_BITS) - 1
+    return [(band << BAND_BITS) | ((value >> (band * BAND_BITS)) & mask) for band in range(LSH_BANDS)]
+
+
+def distance(a, b):
+    return bin((a ^ b) & ((1 << SIMHASH_BITS) - 1)).count("1")
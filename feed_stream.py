@@ -0,0 +1,201 @@
+from io import BytesIO
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from xml.etree.ElementTree import iterparse, tostring, ParseError, XMLPullParser
+
+from article_store import article_id
+
+# === Потоковый разбор RSS/Atom ===
+# feedparser строит весь документ и объект на каждую запись, и на больших лентах (выгрузки
+# FreshRSS, подкасты) разбор занимает секунды. FeedStream идёт по XML инкрементально
+# (iterparse на C-парсере expat), отдаёт статьи по одной в том же виде, что и feedparser-путь
+# в FreshRSSEngine.fetch_feed, и сразу освобождает разобранные записи. Ленты обычно идут от
+# новых к старым, поэтому после SEEN_RUN уже встречавшихся статей подряд разбор обрывается —
+# дальше только старое. Всё, что не похоже на корректный RSS 2.0 / RSS 1.0 / Atom
+# (битый XML, неизвестные HTML-сущности, другой корневой элемент), вызывает FeedFormatError —
+# такую ленту разбирает feedparser, который прощает ошибки.
+
+ATOM = "http://www.w3.org/2005/Atom"
+RSS1 = "http://purl.org/rss/1.0/"
+CONTENT = "http://purl.org/rss/1.0/modules/content/"
+MEDIA = "http://search.yahoo.com/mrss/"
+DC = "http://purl.org/dc/elements/1.1/"
+SY = "http://purl.org/rss/1.0/modules/syndication/"
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+
+ROOTS = {"rss", f"{{{ATOM}}}feed", f"{{{RDF}}}RDF"}
+ITEMS = {"item", f"{{{RSS1}}}item", f"{{{ATOM}}}entry"}
+CHANNELS = {"channel", f"{{{RSS1}}}channel", f"{{{ATOM}}}feed"}
+
+# Поля ленты, которые читает scheduler.feed_hints (имена — как у feedparser)
+FEED_FIELDS = {
+    "title": "title", f"{{{RSS1}}}title": "title", f"{{{ATOM}}}title": "title",
+    "ttl": "ttl",
+    f"{{{SY}}}updatePeriod": "sy_updateperiod",
+    f"{{{SY}}}updateFrequency": "sy_updatefrequency"
+}
+
+SEEN_RUN = 5   # встреченных подряд статей, после которых лента дальше не читается
+
+
+class FeedFormatError(Exception):
+    pass
+
+
+def parse_date(value):
+    # RFC 822 (RSS) или ISO 8601 (Atom, dc:date) -> unix-время; 0, если дату не разобрать
+    value = (value or "").strip()
+    if not value:
+        return 0
+    try:
+        if value[:4].isdigit():
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00").replace("z", "+00:00"))
+        else:
+            dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _inner_html(elem):
+    # Содержимое type="xhtml" из Atom: разметка без пространства имён XHTML и без обёртки <div>
+    for node in elem.iter():
+        if isinstance(node.tag, str) and "}" in node.tag:
+            node.tag = node.tag.split("}", 1)[1]
+    if len(elem) == 1 and elem[0].tag == "div" and not (elem.text or "").strip():
+        elem = elem[0]
+    return (elem.text or "") + "".join(tostring(child, encoding="unicode", method="html") for child in elem)
+
+
+def _text(elem):
+    if elem.get("type") == "xhtml":
+        return _inner_html(elem).strip()
+    return (elem.text or "").strip()
+
+
+def sniff_feed(data):
+    # Начало документа -> заголовок ленты; FeedFormatError, если это не RSS/Atom.
+    # Хватает префикса: документ, оборванный после корневого элемента, ошибкой не считается.
+    parser = XMLPullParser(events=("start", "end"))
+    depth = 0          # вложенность записей: заголовок ищется только у самой ленты
+    root = None
+    try:
+        parser.feed(data)
+        for event, elem in parser.read_events():
+            if root is None:
+                if elem.tag not in ROOTS:
+                    raise FeedFormatError(f"не RSS/Atom: корневой элемент {elem.tag}")
+                root = elem
+            elif elem.tag in ITEMS:
+                depth += 1 if event == "start" else -1
+            elif event == "end" and not depth and FEED_FIELDS.get(elem.tag) == "title":
+                return _text(elem)
+    except ParseError as e:
+        raise FeedFormatError(str(e)) from e
+    if root is None:
+        raise FeedFormatError("пустой документ")
+    return ""
+
+
+class FeedStream:
+    # for art in FeedStream(data, url, name, seen=store.seen): ...
+    # После прохода: feed — поля ленты, entries — разобрано записей, stopped — разбор оборван на старых статьях.
+    def __init__(self, data, feed_url="", name="RSS", seen=None, min_entries=0):
+        self.data = data
+        self.feed_url = feed_url
+        self.name = name
+        self.seen = seen                # контейнер id встречавшихся статей (SeenSet) или None
+        self.min_entries = min_entries  # столько записей разбирается в любом случае (для оценки частоты)
+        self.feed = {}
+        self.entries = 0
+        self.stopped = False
+
+    def __iter__(self):
+        run = 0
+        newest_first = True
+        previous = 0
+        stack = []
+        try:
+            for event, elem in iterparse(BytesIO(self.data), events=("start", "end")):
+                if event == "start":
+                    if not stack and elem.tag not in ROOTS:
+                        raise FeedFormatError(f"не RSS/Atom: корневой элемент {elem.tag}")
+                    stack.append(elem)
+                    continue
+                stack.pop()
+                if elem.tag in ITEMS:
+                    art = self._article(elem)
+                    # Разобранная запись не копится в дереве: у родителя остаются только поля ленты
+                    stack[-1].remove(elem)
+                    self.entries += 1
+                    yield art
+                    if self.seen is None:
+                        continue
+                    # Обрывать можно только ленту, идущую от новых к старым
+                    if previous and art["published"] > previous:
+                        newest_first = False
+                    previous = art["published"] or previous
+                    run = run + 1 if article_id(art["link"], art["title"], art["guid"], self.feed_url) in self.seen else 0
+                    if newest_first and run >= SEEN_RUN and self.entries >= self.min_entries:
+                        self.stopped = True
+                        return
+                elif elem.tag in FEED_FIELDS and stack and stack[-1].tag in CHANNELS:
+                    self.feed.setdefault(FEED_FIELDS[elem.tag], _text(elem))
+        except ParseError as e:
+            raise FeedFormatError(str(e)) from e
+
+    def _article(self, item):
+        fields = {}
+        image_url = ""
+        link = ""
+        for child in item:
+            tag = child.tag
+            if not isinstance(tag, str):
+                continue
+            ns, _, local = tag[1:].partition("}") if tag[0] == "{" else ("", "", tag)
+            if ns == MEDIA and local == "content":
+                if not image_url and child.get("medium") == "image":
+                    image_url = child.get("url")
+            elif local == "enclosure":
+                if not image_url and "image" in child.get("type", ""):
+                    image_url = child.get("url")
+            elif local == "link":
+                rel = child.get("rel", "alternate")
+                if child.get("href") is None:
+                    link = link or (child.text or "").strip()          # RSS
+                elif rel == "alternate" and not link:
+                    link = child.get("href", "").strip()               # Atom
+                elif rel == "enclosure" and not image_url and "image" in child.get("type", ""):
+                    image_url = child.get("href")
+            elif local == "guid" and not ns:
+                fields.setdefault("guid", _text(child))
+                if child.get("isPermaLink", "true") != "false":
+                    fields.setdefault("permalink", fields["guid"])
+            elif ns == CONTENT and local == "encoded":
+                fields.setdefault("content", _text(child))
+            elif ns == DC and local == "date":
+                fields.setdefault("date", _text(child))
+            elif local in ("title", "id", "pubDate", "published", "updated", "description", "summary",
+                           "content") and ns in ("", ATOM, RSS1):
+                fields.setdefault(local, _text(child))
+        summary = fields.get("description", fields.get("summary", ""))
+        content = fields.get("content", "")
+        published = 0
+        for key in ("pubDate", "published", "date", "updated"):
+            published = parse_date(fields.get(key))
+            if published:
+                break
+        return {
+            "title": fields.get("title") or "Без заголовка",
+            # Как у feedparser: при отсутствии описания им становится содержимое
+            "summary": summary or content,
+            "content": content,
+            "published": published,
+            "origin": {"title": self.feed.get("title", self.name)},
+            "link": link or fields.get("permalink", ""),
+            "guid": fields.get("guid") or fields.get("id") or item.get(f"{{{RDF}}}about", ""),
+            "image_url": image_url,
+            "feed_url": self.feed_url
+        }
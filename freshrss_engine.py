@@ -0,0 +1,987 @@
+import os
+import sys
+import json
+import html
+import time
+import queue
+import calendar
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from pathlib import Path
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+
+from applog import AppLog, DEBUG, INFO, WARNING, ERROR
+from article_store import ArticleStore, legacy_article_id, typing_prefix, word_matcher
+from article_text import normalize_article, PARSER_BACKEND
+from feed_stream import FeedStream, FeedFormatError, sniff_feed
+from greader import GReaderClient, item_time, item_to_article, first_sync_since
+from metrics import Metrics
+from opml import iter_opml, write_opml, OpmlError
+from profiling import Profiler, profiled, env_enabled
+from http_client import HttpClient, DEFAULT_PER_HOST, DEFAULT_MIN_INTERVAL, DEFAULT_RETRIES
+from scheduler import FeedScheduler, response_hints, feed_hints, CADENCE_SAMPLES
+
+# === Ядро агрегатора без интерфейса ===
+# Загрузка лент, хранилище, кэш валидаторов и поиск. Окно FreshRSS Pro — лишь один из клиентов ядра,
+# второй — командная строка:
+#   python freshrss_engine.py refresh            # обновить все источники и вывести время по каждому
+#   python freshrss_engine.py search "запрос"    # поиск по хранилищу
+#   python freshrss_engine.py --metrics prometheus refresh   # и метрики после команды (или --metrics json)
+
+APP_NAME = "FreshRSS Pro"
+VERSION = "2.0.0.4"
+
+CONFIG_DIR = Path.home() / ".config" / "freshrss_pro"
+
+# Параллельная загрузка источников
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_CONNECT_TIMEOUT = 5     # сек. на установку соединения
+DEFAULT_READ_TIMEOUT = 20       # сек. на чтение ответа
+DEFAULT_REFRESH_DEADLINE = 120  # сек. на весь цикл обновления
+DEFAULT_MAX_FEED_MB = 10        # лента больше — обрывается, а не читается в память целиком
+
+# Расписание обновления: интервал из настроек — начальный для каждой ленты,
+# дальше он подстраивается под ленту в пределах [min, max]
+DEFAULT_RSS_UPDATE_INTERVAL = 3600  # 1 час
+DEFAULT_MIN_REFRESH_INTERVAL = 300
+DEFAULT_MAX_REFRESH_INTERVAL = 86400
+
+# FreshRSS: RSS-лента за неделю (без API-пароля) или синхронизация через Google Reader API
+FRESHRSS_HOURS = 168
+GREADER_CURSOR_OVERLAP = 120  # сек.: курсор отступает назад на случай расхождения часов
+
+SEARCH_RESULT_LIMIT = 1000  # лучших по релевантности результатов поиска
+SEARCH_FIRST_PAGE = 50      # первая порция результатов показывается сразу
+SEARCH_REFINE_LIMIT = 200   # выдачу до стольких статей уточняем без обращения к индексу
+
+EXPORT_FORMATS = ("json", "jsonl", "html")  # выгрузка избранного; формат — по расширению файла
+VALIDATE_PREFIX_BYTES = 256 * 1024  # проверка ленты читает только начало: корневой элемент и заголовок
+
+ENGINE_DEFAULTS = {
+    "sources": [],
+    "fetch_workers": DEFAULT_FETCH_WORKERS,
+    "connect_timeout": DEFAULT_CONNECT_TIMEOUT,
+    "read_timeout": DEFAULT_READ_TIMEOUT,
+    "refresh_deadline": DEFAULT_REFRESH_DEADLINE,
+    "http_per_host": DEFAULT_PER_HOST,
+    "http_min_interval": DEFAULT_MIN_INTERVAL,
+    "http_retries": DEFAULT_RETRIES,
+    "max_feed_mb": DEFAULT_MAX_FEED_MB,
+    "streaming_parser": True,
+    "profiling": False,
+    "rss_update_interval": DEFAULT_RSS_UPDATE_INTERVAL,
+    "adaptive_refresh": True,
+    "min_refresh_interval": DEFAULT_MIN_REFRESH_INTERVAL,
+    "max_refresh_interval": DEFAULT_MAX_REFRESH_INTERVAL,
+    "collapse_duplicates": True
+}
+
+
+def format_bytes(size):
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def load_config(path, defaults=ENGINE_DEFAULTS):
+    data = {}
+    if path.exists():
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except Exception as e:
+            print(f"[!] Ошибка загрузки конфига: {e}")
+    for key, value in defaults.items():
+        data.setdefault(key, list(value) if isinstance(value, list) else value)
+    return data
+
+
+def save_config(path, config):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(config, indent=2, ensure_ascii=False), encoding='utf-8')
+
+
+class FeedCache:
+    # Кэш HTTP-валидаторов (ETag / Last-Modified) по каждой ленте.
+    # Хранится рядом с config.json, поэтому условные запросы работают и после перезапуска.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.totals = {"requests": 0, "not_modified": 0, "bytes_downloaded": 0, "bytes_saved": 0}
+        self.stats = dict.fromkeys(self.totals, 0)
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            self.entries = data.get("feeds", {})
+            self.totals.update(data.get("totals", {}))
+        except Exception as e:
+            print(f"[!] Ошибка загрузки кэша лент: {e}")
+
+    def save(self):
+        with self.lock:
+            data = {"feeds": self.entries, "totals": self.totals}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp, self.path)
+
+    def begin_refresh(self):
+        with self.lock:
+            self.stats = dict.fromkeys(self.totals, 0)
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+    def validators(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            if not entry:
+                return {}
+            headers = {}
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            return headers
+
+    def downloaded(self, size):
+        with self.lock:
+            self._count("requests", 1)
+            self._count("bytes_downloaded", size)
+
+    def store(self, url, response):
+        # Валидаторы запоминаются только после записи статей ленты в хранилище (см. _refresh):
+        # иначе статьи, не успевшие к дедлайну, навсегда остались бы за ответами 304
+        with self.lock:
+            size = len(response.content)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if not etag and not last_modified:
+                self.entries.pop(url, None)
+                return
+            self.entries[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": size
+            }
+
+    def not_modified(self, url):
+        with self.lock:
+            entry = self.entries.get(url, {})
+            self._count("requests", 1)
+            self._count("not_modified", 1)
+            self._count("bytes_saved", entry.get("size", 0))
+
+    def _count(self, key, value):
+        self.stats[key] += value
+        self.totals[key] += value
+
+    @staticmethod
+    def hit_rate(counters):
+        return counters["not_modified"] / counters["requests"] if counters["requests"] else 0.0
+
+    def summary(self):
+        with self.lock:
+            s, t = self.stats, self.totals
+            return (f"304: {s['not_modified']}/{s['requests']} ({self.hit_rate(s):.0%}), "
+                    f"сэкономлено {format_bytes(s['bytes_saved'])}, скачано {format_bytes(s['bytes_downloaded'])} | "
+                    f"всего: {self.hit_rate(t):.0%} попаданий, сэкономлено {format_bytes(t['bytes_saved'])}")
+
+
+class LiveSearch:
+    # Поиск при наборе: один фоновый поток, устаревшие запросы отменяются,
+    # а уточнение запроса ("мир" -> "мирн") сужает прошлую выдачу вместо нового прохода по индексу
+    def __init__(self, store, on_results, metrics=None, profiler=None):
+        self.store = store
+        self.on_results = on_results  # вызывается из рабочего потока: (generation, query, ids, final)
+        self.metrics = metrics        # время поиска до полной выдачи (отменённые запросы не считаются)
+        self.profiler = profiler
+        self.queue = queue.Queue()
+        self.generation = 0
+        self.last = None  # (запрос, id выдачи, {id: слова статьи} или None)
+        self.favorites_only = False  # область прошлой выдачи: вся лента или только избранное
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, query, favorites_only=False):
+        self.generation += 1
+        self.queue.put((self.generation, query, favorites_only))
+        return self.generation
+
+    def invalidate(self):
+        # Хранилище пополнилось — прошлая выдача могла устареть
+        self.last = None
+
+    def _superseded(self, generation):
+        return generation != self.generation
+
+    def _run(self):
+        while True:
+            generation, query, favorites_only = self.queue.get()
+            # Из накопившихся запросов выполняем только последний
+            while not self.queue.empty():
+                generation, query, favorites_only = self.queue.get_nowait()
+            if self._superseded(generation):
+                continue
+            if favorites_only != self.favorites_only:
+                self.last = None  # выдачу из другой области уточнять нельзя
+                self.favorites_only = favorites_only
+            t0 = time.perf_counter()
+            try:
+                self._search(generation, query)
+            except Exception as e:
+                print(f"[!] Ошибка поиска: {e}")
+                continue
+            if self.metrics is not None and query and not self._superseded(generation):
+                self.metrics.observe("search", time.perf_counter() - t0)
+
+    @profiled("search")
+    def _search(self, generation, query):
+        cancel = lambda: self._superseded(generation)
+        if not query:
+            self.last = None
+            ids = self.store.query_ids(favorites_only=self.favorites_only, cancel=cancel)
+            if not cancel():
+                self.on_results(generation, query, ids, True)
+            return
+
+        narrowed = self._narrow(query)
+        if narrowed is not None:
+            self.last = (query, narrowed, self.last[2])
+            self.on_results(generation, query, narrowed, True)
+            return
+
+        ids = self.query_ids(query, self.favorites_only, SEARCH_FIRST_PAGE, cancel)
+        if cancel():
+            return
+        final = len(ids) < SEARCH_FIRST_PAGE
+        self.on_results(generation, query, ids, final)
+        if not final:
+            ids = self.query_ids(query, self.favorites_only, cancel=cancel)
+            if cancel():
+                return
+            self.on_results(generation, query, ids, True)
+        self.last = (query, ids, None)
+        if len(ids) <= SEARCH_REFINE_LIMIT:
+            self._prepare_refine(generation, ids)
+
+    def query_ids(self, query, favorites_only=False, limit=SEARCH_RESULT_LIMIT, cancel=None):
+        # Выдача запроса тем же планом, что и при наборе: префиксом ищется только дописываемое слово
+        return self.store.query_ids(search=query, favorites_only=favorites_only, limit=limit,
+                                    prefix_last=typing_prefix(query), cancel=cancel)
+
+    def _narrow(self, query):
+        if not self.last:
+            return None
+        prev_query, prev_ids, words = self.last
+        if words is None or not query.startswith(prev_query):
+            return None
+        if not typing_prefix(prev_query) and prev_query[-1:].isalnum() and query[len(prev_query):][:1].isalnum():
+            # Прошлое слово искалось точно, а запрос его продолжает: выдача "эконом" не содержит "экономи"
+            return None
+        match = word_matcher(query, prefix_last=typing_prefix(query))
+        if match is None:
+            return None
+        return [art_id for art_id in prev_ids if art_id in words and match(words[art_id])]
+
+    def _prepare_refine(self, generation, ids):
+        # Слова статей небольшой выдачи готовим, пока пользователь не нажал следующую клавишу
+        words = {}
+        for i in range(0, len(ids), 25):
+            if self._superseded(generation) or not self.queue.empty():
+                return
+            words.update(self.store.search_words(ids[i:i + 25]))
+        if self.last and self.last[1] is ids:
+            self.last = (self.last[0], ids, words)
+
+
+class FreshRSSEngine:
+    # События (колбэки вызываются из рабочих потоков — интерфейс сам переносит их в свой поток):
+    #   "batch_stored"      (source, new_ids) — статьи очередного источника сохранены
+    #   "refresh_finished"  (stats)           — цикл обновления завершён
+    def __init__(self, config_dir=CONFIG_DIR, config_defaults=ENGINE_DEFAULTS, log=None):
+        self.config_dir = Path(config_dir)
+        self.config_path = self.config_dir / "config.json"
+        self.favorites_path = self.config_dir / "favorites.json"
+        self.config = load_config(self.config_path, config_defaults)
+        self.log = log or AppLog(console=sys.stderr, max_lines=0)  # log(msg, level=INFO)
+        self.listeners = {}
+        self.refresh_lock = threading.Lock()
+        self.store = ArticleStore(self.config_dir / "articles.db")
+        self.store.collapse = bool(self.config.get("collapse_duplicates", True))
+        self.feed_cache = FeedCache(self.config_dir / "feed_cache.json")
+        if self.store.created:
+            # База статей создана заново — ответ 304 нечем было бы показать
+            self.feed_cache.clear()
+        self.scheduler = FeedScheduler(DEFAULT_RSS_UPDATE_INTERVAL, state=self.store.get_state("scheduler"))
+        # Один пул соединений на ленты, Google Reader API и сетевые запросы окна
+        self.http = HttpClient(
+            user_agent=f"{APP_NAME}/{VERSION}",
+            timeout=self.timeout(),
+            per_host=int(self.config.get("http_per_host", DEFAULT_PER_HOST)),
+            min_interval=float(self.config.get("http_min_interval", DEFAULT_MIN_INTERVAL)),
+            retries=int(self.config.get("http_retries", DEFAULT_RETRIES)),
+            max_bytes=int(float(self.config.get("max_feed_mb", DEFAULT_MAX_FEED_MB)) * 1024 * 1024)
+        )
+        self.metrics = Metrics()
+        # Профили пишутся только по запросу: FRESHRSS_PROFILE=1 или "profiling" в настройках
+        self.profiler = Profiler(self.config_dir / "profiles", self.log,
+                                 enabled=env_enabled() or bool(self.config.get("profiling", False)))
+        self.metrics.add_collector("feed_cache", self.feed_cache_stats)
+        self.metrics.add_collector("http", self.http.stats, label="host")
+        self.metrics.add_collector("store", lambda: {"articles": self.store.count(), "seen": len(self.store.seen)})
+        self.migrate_favorites()
+
+    def on(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def emit(self, event, *args):
+        for callback in self.listeners.get(event, []):
+            try:
+                callback(*args)
+            except Exception as e:
+                self.log(f"💥 Ошибка обработчика события {event}: {e}", ERROR)
+
+    def save_config(self):
+        save_config(self.config_path, self.config)
+
+    def timeout(self):
+        return (float(self.config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT)),
+                float(self.config.get("read_timeout", DEFAULT_READ_TIMEOUT)))
+
+    def close(self):
+        self.store.close()
+
+    def migrate_favorites(self):
+        # Старый формат избранного — набор строк "link|title" в favorites.json
+        if not self.favorites_path.exists():
+            return
+        try:
+            keys = json.loads(self.favorites_path.read_text(encoding='utf-8'))
+            ids = [legacy_article_id(*key.partition("|")[::2]) for key in keys]
+            found = self.store.import_favorites(ids)
+            # Файл убирается, только когда отметки уже в хранилище
+            self.favorites_path.replace(self.favorites_path.with_suffix(".json.bak"))
+            self.log(f"⭐ Избранное перенесено: {len(ids)} статей, уже в хранилище {found}")
+        except Exception as e:
+            print(f"[!] Ошибка переноса избранного: {e}")
+
+    def normalize_backlog(self):
+        # Дочищает статьи, сохранённые до появления нормализации при загрузке
+        total = 0
+        while True:
+            batch = self.store.unnormalized()
+            if not batch:
+                break
+            for art in batch:
+                normalize_article(art)
+            self.store.set_normalized(batch)
+            total += len(batch)
+        if total:
+            self.log(f"🧹 Нормализовано старых статей: {total} (парсер: {PARSER_BACKEND})")
+        return total
+
+    def cluster_backlog(self):
+        # Ищет дубликаты среди статей, сохранённых до появления группировки
+        total = duplicates = 0
+        while True:
+            checked, found = self.store.cluster_backlog()
+            if not checked:
+                break
+            total += checked
+            duplicates += found
+        if total:
+            self.log(f"🔁 Проверено на дубликаты старых статей: {total}, найдено дубликатов: {duplicates}")
+        return duplicates
+
+    def process_backlog(self):
+        # Фоновая дочистка после обновления версии: сначала текст, по нему — дубликаты
+        self.normalize_backlog()
+        self.cluster_backlog()
+
+    # ==================== ОБНОВЛЕНИЕ ====================
+    def refresh_async(self, **kwargs):
+        thread = threading.Thread(target=self.refresh, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+    def refresh(self, sources=None, forced=True):
+        # Проход по источникам (по умолчанию — по всем). Возвращает статистику прохода
+        # (её же получают подписчики "refresh_finished"); параллельный второй проход не запускается.
+        if not self.refresh_lock.acquire(blocking=False):
+            self.log("⏳ Обновление уже идёт")
+            return None
+        try:
+            stats = self._refresh(list(self.config.get("sources", [])) if sources is None else sources)
+            stats["forced"] = forced
+        finally:
+            self.refresh_lock.release()
+        self.metrics.record_refresh(stats)
+        self.emit("refresh_finished", stats)
+        self.compact_index()
+        return stats
+
+    def compact_index(self):
+        # Слияние сегментов поискового индекса после записи статей — короткими шагами, между которыми
+        # хранилище свободно для поиска и показа статей
+        t0 = time.perf_counter()
+        steps = 0
+        try:
+            while self.store.compact_index():
+                steps += 1
+        except Exception as e:
+            self.log(f"⚠️ Не удалось уплотнить поисковый индекс: {e}", WARNING)
+        if steps:
+            self.log(f"🗜️ Поисковый индекс уплотнён: {steps} шагов за {time.perf_counter() - t0:.1f} с", DEBUG)
+
+    def _configure_scheduler(self):
+        self.scheduler.default_interval = float(self.config.get("rss_update_interval", DEFAULT_RSS_UPDATE_INTERVAL))
+        self.scheduler.min_interval = float(self.config.get("min_refresh_interval", DEFAULT_MIN_REFRESH_INTERVAL))
+        self.scheduler.max_interval = float(self.config.get("max_refresh_interval", DEFAULT_MAX_REFRESH_INTERVAL))
+
+    def due_sources(self):
+        self._configure_scheduler()
+        return self.scheduler.due(self.config.get("sources", []))
+
+    def refresh_due(self):
+        # Плановый проход: только источники, чей срок подошёл. None — если таких нет
+        due = self.due_sources()
+        if not due:
+            return None
+        self.log(f"🔁 Плановое обновление: {len(due)} из {len(self.config.get('sources', []))} источников")
+        return self.refresh(due, forced=False)
+
+    def seconds_until_due(self, minimum=5, maximum=300):
+        # Сколько спать планировщику до ближайшего источника (с ограничениями сверху и снизу)
+        next_due = self.scheduler.next_due(self.config.get("sources", []))
+        if next_due is None:
+            return maximum
+        return min(max(next_due - time.time(), minimum), maximum)
+
+    @profiled("refresh")
+    def _refresh(self, sources):
+        self._configure_scheduler()
+        workers = max(1, min(int(self.config.get("fetch_workers", DEFAULT_FETCH_WORKERS)), len(sources) or 1))
+        deadline = float(self.config.get("refresh_deadline", DEFAULT_REFRESH_DEADLINE))
+        started = time.monotonic()
+        new_ids = []
+        results = []
+        self.feed_cache.begin_refresh()
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rss-fetch")
+        futures = {pool.submit(self.fetch_source, src): src for src in sources}
+        try:
+            # Результаты вливаются по мере готовности: быстрые ленты не ждут медленных
+            for fut in as_completed(futures, timeout=deadline):
+                src = futures[fut]
+                try:
+                    articles, info = fut.result()
+                except Exception as e:
+                    self.log(f"💥 Ошибка источника {src.get('url', '')}: {e}", ERROR)
+                    results.append((src, self._source_info(src, error=str(e))))
+                    continue
+                results.append((src, info))
+                commit = info.pop("commit", None)
+                validators = info.pop("validators", None)
+                if not articles and not commit:
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    stored = self.store.upsert(articles)
+                    if commit:
+                        # Курсор синхронизации двигается, только когда статьи уже записаны
+                        commit(articles)
+                    if validators:
+                        # Как и ETag / Last-Modified ленты: опоздавший к дедлайну ответ не даст 304 в следующий раз
+                        validators()
+                except Exception as e:
+                    self.log(f"💥 Ошибка сохранения статей {src.get('url', '')}: {e}", ERROR)
+                    info["error"] = str(e)
+                    continue
+                info["store_seconds"] = time.perf_counter() - t0
+                info["new"] = len(stored)
+                new_ids += stored
+                if stored or commit:
+                    self.emit("batch_stored", src, stored)
+        except FuturesTimeout:
+            pending = [futures[f] for f in futures if not f.done()]
+            self.log(f"⏱️ Дедлайн обновления ({deadline:.0f} с) истёк, не дождались: "
+                     f"{', '.join(src.get('name') or src.get('url', '') for src in pending)}", WARNING)
+            results += [(src, self._source_info(src, error="deadline")) for src in pending]
+        finally:
+            for f in futures:
+                f.cancel()
+            pool.shutdown(wait=False)
+
+        for src, info in results:
+            self.scheduler.record(src, info)
+            info.pop("published", None)
+        self.scheduler.forget(self.config.get("sources", []))
+        self.store.set_state("scheduler", self.scheduler.snapshot())
+
+        elapsed = time.monotonic() - started
+        self.log(f"⏲️ Источников: {len(sources)}, потоков: {workers}, время: {elapsed:.1f} с")
+        self.log(f"🗃️ Кэш лент — {self.feed_cache.summary()}", DEBUG)
+        self.log(f"🌐 HTTP — {self.http.summary()}", DEBUG)
+        try:
+            self.feed_cache.save()
+        except Exception as e:
+            self.log(f"⚠️ Не удалось сохранить кэш лент: {e}", WARNING)
+
+        return {
+            "started": time.time() - elapsed,
+            "seconds": elapsed,
+            "workers": workers,
+            "sources": [info for _, info in results],
+            "new_ids": new_ids,
+            "total": self.store.count(),
+            "feed_cache": dict(self.feed_cache.stats)
+        }
+
+    @staticmethod
+    def _source_info(src, **extra):
+        info = {
+            "name": src.get("name") or src.get("url", ""),
+            "url": src.get("url", ""),
+            "status": None,
+            "bytes": 0,
+            "seconds": 0.0,
+            "parse_seconds": 0.0,
+            "entries": 0,
+            "new": 0,
+            "error": None
+        }
+        info.update(extra)
+        return info
+
+    @profiled("fetch_source", worker=True)
+    def fetch_source(self, src):
+        # -> (статьи, сведения о запросе)
+        info = self._source_info(src)
+        t0 = time.perf_counter()
+        try:
+            if src["type"] == "freshrss" and src.get("api_password"):
+                articles = self.sync_greader(src, info)
+            elif src["type"] == "freshrss":
+                articles = self.fetch_freshrss_rss(src, info)
+            else:
+                articles = self.fetch_feed(src["url"], src.get("name", "RSS"), info)
+        finally:
+            info["seconds"] = time.perf_counter() - t0
+        info["entries"] = len(articles)
+        return articles, info
+
+    def fetch_freshrss_rss(self, src, info=None):
+        url = f"{src['url']}/i/?a=rss&user={src['user']}&token={src['token']}&hours={FRESHRSS_HOURS}"
+        self.log(f"📡 Запрос FreshRSS: {url}", DEBUG)
+        return self.fetch_feed(url, src.get("name", "FreshRSS"), info)
+
+    def sync_greader(self, src, info):
+        # Инкрементальная синхронизация через Google Reader API. Статьи возвращаются как обычно,
+        # а info["commit"] после их записи сохраняет связь с id на сервере, отметки и новый курсор.
+        key = f"greader:{src['url']}|{src['user']}"
+        state = self.store.get_state(key, {})
+        client = GReaderClient(
+            src["url"], src["user"], src["api_password"],
+            http=self.http,
+            timeout=self.timeout(),
+            auth=state.get("auth"),
+            on_auth=lambda auth: self.store.set_state(key, {**state, "auth": auth})
+        )
+        cursor = state.get("cursor") or first_sync_since(FRESHRSS_HOURS)
+        name = src.get("name", "FreshRSS")
+        try:
+            items = list(client.items(cursor - GREADER_CURSOR_OVERLAP))
+            unread = client.unread_ids()
+            starred = client.starred_ids()
+        except Exception as e:
+            info["error"] = str(e)
+            response = getattr(e, "response", None)
+            if response is not None:
+                info["status"] = response.status_code
+                response_hints(response.headers, info)
+            self.log(f"💥 Ошибка синхронизации FreshRSS {src['url']}: {e}", ERROR)
+            return []
+        finally:
+            info["bytes"] = client.bytes
+        info["status"] = 200
+
+        t0 = time.perf_counter()
+        articles = [normalize_article(item_to_article(item, src["url"], name)) for item in items]
+        info["parse_seconds"] = time.perf_counter() - t0
+        info["published"] = [art["published"] for art in articles]
+        new_cursor = max((item_time(item) for item in items), default=cursor)
+
+        def commit(stored):
+            self.store.set_remote_items(key, [(art["id"], art["remote_id"]) for art in stored])
+            changed = self.store.apply_remote_state(key, unread, starred)
+            self.store.set_state(key, {"auth": client.auth, "cursor": new_cursor, "synced": int(time.time())})
+            self.log(f"🔃 FreshRSS API: {len(items)} статей с курсора, непрочитано {len(unread)}, "
+                     f"избранных {len(starred)}, изменено отметок {changed}, запросов {client.requests}")
+
+        info["commit"] = commit
+        return articles
+
+    def fetch_feed(self, feed_url, name="RSS", info=None):
+        info = info if info is not None else {}
+        articles = []
+        try:
+            r = self.http.get(feed_url, timeout=self.timeout(), headers=self.feed_cache.validators(feed_url))
+            info["status"] = r.status_code
+            response_hints(r.headers, info)
+            if r.status_code == 304:
+                # Лента не менялась — её статьи уже лежат в хранилище
+                self.feed_cache.not_modified(feed_url)
+                return articles
+            r.raise_for_status()
+            info["bytes"] = len(r.content)
+            self.feed_cache.downloaded(info["bytes"])
+            t0 = time.perf_counter()
+            articles = None
+            if self.config.get("streaming_parser", True):
+                stream = FeedStream(r.content, feed_url, name, seen=self.store.seen, min_entries=CADENCE_SAMPLES + 1)
+                try:
+                    articles = list(stream)
+                    feed_hints(stream.feed, info)
+                    info["parser"] = "stream"
+                    info["stopped_early"] = stream.stopped
+                except FeedFormatError as e:
+                    self.log(f"🧩 {feed_url}: потоковый разбор не удался ({e}) — разбирает feedparser", DEBUG)
+            if articles is None:
+                articles = self.parse_feed(r, feed_url, name, info)
+            if not articles:
+                self.log(f"⚠️ Нет статей в {feed_url}", WARNING)
+                return articles
+            # HTML разбирается здесь, в потоке загрузки, а не при каждом показе статьи
+            for art in articles:
+                normalize_article(art)
+            info["parse_seconds"] = time.perf_counter() - t0
+            info["published"] = [art["published"] for art in articles]
+            info["validators"] = lambda: self.feed_cache.store(feed_url, r)
+        except Exception as e:
+            info["error"] = str(e)
+            self.log(f"💥 Ошибка загрузки {feed_url}: {e}", ERROR)
+        return articles
+
+    def parse_feed(self, r, feed_url, name, info):
+        # Разбор feedparser: медленнее потокового, но прощает битый XML и неизвестные форматы
+        import feedparser
+        d = feedparser.parse(r.content, response_headers={k.lower(): v for k, v in r.headers.items()})
+        feed_hints(d.feed, info)
+        info["parser"] = "feedparser"
+        articles = []
+        for entry in d.entries:
+            pub_ts = 0
+            # *_parsed у feedparser — время в UTC
+            parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+            if parsed:
+                pub_ts = calendar.timegm(parsed)
+            elif hasattr(entry, 'published') and entry.published:
+                try:
+                    dt = parsedate_to_datetime(entry.published)
+                    pub_ts = int(dt.timestamp())
+                except:
+                    pub_ts = 0
+
+            articles.append({
+                "title": getattr(entry, 'title', 'Без заголовка'),
+                "summary": getattr(entry, 'summary', ''),
+                "content": getattr(entry, 'content', [{}])[0].get('value', ''),
+                "published": pub_ts,
+                "origin": {"title": d.feed.get("title", name)},
+                "link": getattr(entry, 'link', ''),
+                "guid": entry.get("id", ""),
+                "image_url": self.extract_image(entry),
+                "feed_url": feed_url
+            })
+        return articles
+
+    @staticmethod
+    def extract_image(entry):
+        try:
+            if hasattr(entry, 'media_content') and entry.media_content:
+                for media in entry.media_content:
+                    if media.get('medium') == 'image':
+                        return media.get('url')
+            if hasattr(entry, 'enclosures'):
+                for enc in entry.enclosures:
+                    if 'image' in enc.get('type', ''):
+                        return enc.href
+        except:
+            pass
+        return ""
+
+    # ==================== ЧТЕНИЕ ====================
+    @profiled("query")
+    def query(self, **kwargs):
+        if not kwargs.get("search"):
+            return self.store.query_ids(**kwargs)
+        with self.metrics.timer("search"):
+            return self.store.query_ids(**kwargs)
+
+    def feed_cache_stats(self):
+        with self.feed_cache.lock:
+            totals = dict(self.feed_cache.totals)
+        return {**totals, "hit_rate": FeedCache.hit_rate(totals)}
+
+    def get(self, art_id):
+        return self.store.get(art_id)
+
+    def count(self):
+        return self.store.count()
+
+    def is_favorite(self, art_id):
+        return self.store.is_favorite(art_id)
+
+    def toggle_favorite(self, art_id):
+        favorite = not self.store.is_favorite(art_id)
+        self.store.set_favorite(art_id, favorite)
+        return favorite
+
+    # ==================== ИСТОЧНИКИ ====================
+    def import_opml(self, path):
+        # Ленты из OPML, которых ещё нет среди источников, — в виде записей config["sources"]
+        known = {src.get("url", "").rstrip("/") for src in self.config.get("sources", [])}
+        sources = []
+        for item in iter_opml(path):
+            url = item["url"]
+            if url.rstrip("/") in known:
+                continue
+            known.add(url.rstrip("/"))
+            src = {"type": "rss", "url": url, "name": item["title"] or urlsplit(url).hostname or "RSS"}
+            if item["folder"]:
+                src["folder"] = item["folder"]
+            sources.append(src)
+        return sources
+
+    def export_opml(self, path, sources=None):
+        # Только RSS-источники: в адресе ленты FreshRSS — токен пользователя
+        sources = [src for src in (self.config.get("sources", []) if sources is None else sources)
+                   if src.get("type") == "rss"]
+        count = write_opml(path, sources, APP_NAME)
+        self.log(f"📤 Источники выгружены в OPML: {count} -> {Path(path).name}")
+        return count
+
+    def validate_feeds(self, urls, on_progress=None, cancel=None):
+        # Параллельная проверка адресов: отвечает ли и похоже ли на RSS/Atom.
+        # -> {url: {"ok", "status", "title", "error", "seconds"}}; on_progress(готово, всего, url, результат)
+        # вызывается из рабочих потоков; cancel() -> True прерывает ещё не начатые проверки.
+        urls = list(dict.fromkeys(urls))
+        results = {}
+        if not urls:
+            return results
+        workers = max(1, min(int(self.config.get("fetch_workers", DEFAULT_FETCH_WORKERS)), len(urls)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rss-check") as pool:
+            futures = {pool.submit(self._validate_feed, url, cancel): url for url in urls}
+            for fut in as_completed(futures):
+                url = futures[fut]
+                results[url] = fut.result()
+                if on_progress:
+                    on_progress(len(results), len(urls), url, results[url])
+        ok = sum(1 for r in results.values() if r["ok"])
+        self.log(f"🧪 Проверено источников: {len(urls)}, рабочих {ok}, с ошибкой {len(urls) - ok}")
+        return results
+
+    def _validate_feed(self, url, cancel=None):
+        result = {"ok": False, "status": None, "title": "", "error": "", "seconds": 0.0}
+        if cancel and cancel():
+            result["error"] = "отменено"
+            return result
+        t0 = time.perf_counter()
+        try:
+            r = self.http.get(url, timeout=self.timeout(), retries=0, max_bytes=VALIDATE_PREFIX_BYTES, truncate=True)
+            result["status"] = r.status_code
+            r.raise_for_status()
+            try:
+                result["title"] = sniff_feed(r.content)
+            except FeedFormatError as e:
+                # Ленту с ошибками в XML может прочитать feedparser — как и при обновлении
+                try:
+                    import feedparser
+                except ImportError:
+                    raise e
+                d = feedparser.parse(r.content)
+                if not d.version:
+                    raise
+                result["title"] = d.feed.get("title", "")
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = str(e)
+            self.log(f"🧪 {url}: {e}", DEBUG)
+        result["seconds"] = time.perf_counter() - t0
+        return result
+
+    def export_favorites(self, path, fmt=None):
+        # Все избранные статьи целиком в JSON, JSON Lines или HTML. Статьи пишутся в файл по мере
+        # чтения из хранилища, через временный файл — недописанная выгрузка не заменит прошлую.
+        path = Path(path)
+        fmt = fmt or path.suffix.lstrip(".").lower()
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"неизвестный формат выгрузки: {fmt} (поддерживаются {', '.join(EXPORT_FORMATS)})")
+        t0 = time.perf_counter()
+        count = 0
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            if fmt == "json":
+                f.write("[")
+            elif fmt == "html":
+                f.write(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{APP_NAME}: избранное</title></head><body>\n')
+            for art in self.store.favorites():
+                if fmt == "html":
+                    f.write(export_html(art))
+                elif fmt == "jsonl":
+                    f.write(json.dumps(art, ensure_ascii=False) + "\n")
+                else:
+                    f.write(("," if count else "") + "\n" + json.dumps(art, ensure_ascii=False))
+                count += 1
+            if fmt == "json":
+                f.write("\n]\n")
+            elif fmt == "html":
+                f.write("</body></html>\n")
+        os.replace(tmp, path)
+        self.log(f"📤 Избранное выгружено: {count} статей -> {path.name} "
+                 f"({format_bytes(path.stat().st_size)}, {time.perf_counter() - t0:.2f} с)")
+        return count
+
+
+def export_html(art):
+    when = time.strftime("%d.%m.%Y %H:%M", time.localtime(art["published"])) if art["published"] else ""
+    return (f'<article>\n<h2><a href="{html.escape(art["link"])}">{html.escape(art["title"])}</a></h2>\n'
+            f'<p>{html.escape(art["origin"]["title"])} • {when}</p>\n'
+            f'{art["content"] or art["summary"]}\n</article>\n<hr>\n')
+
+
+# ==================== КОМАНДНАЯ СТРОКА ====================
+def print_refresh_stats(stats):
+    print(f"{'источник':<40} {'код':>4} {'время, с':>9} {'разбор, с':>9} {'размер':>10} {'статей':>7} {'новых':>6}")
+    for info in sorted(stats["sources"], key=lambda i: i["seconds"], reverse=True):
+        status = info["error"] and "ERR" or info["status"] or "—"
+        print(f"{info['name'][:40]:<40} {status:>4} {info['seconds']:9.2f} {info['parse_seconds']:9.3f} "
+              f"{format_bytes(info['bytes']):>10} {info['entries']:7d} {info['new']:6d}")
+    errors = [i for i in stats["sources"] if i["error"]]
+    print(f"Итого: {len(stats['sources'])} источников, {stats['workers']} потоков, {stats['seconds']:.2f} с; "
+          f"новых статей {len(stats['new_ids'])}, в хранилище {stats['total']}, ошибок {len(errors)}")
+
+
+def run_opml(engine, args):
+    if args.action == "export":
+        print(f"Выгружено источников: {engine.export_opml(args.file)}")
+        return 0
+    try:
+        sources = engine.import_opml(args.file)
+    except (OSError, OpmlError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    if sources and not args.no_check:
+        def progress(done, total, url, result):
+            mark = "✓" if result["ok"] else f"✗ {result['error'][:60]}"
+            print(f"[{done}/{total}] {url} {mark}", file=sys.stderr)
+        results = engine.validate_feeds([src["url"] for src in sources], progress)
+        sources = [src for src in sources if results[src["url"]]["ok"]]
+    engine.config["sources"] = engine.config.get("sources", []) + sources
+    engine.save_config()
+    print(f"Добавлено источников: {len(sources)}")
+    return 0
+
+
+def dump_metrics(metrics, fmt, path=None):
+    text = metrics.json() if fmt == "json" else metrics.prometheus()
+    if not path:
+        print(text)
+        return
+    # Через временный файл: сборщик метрик не прочитает файл недописанным
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="freshrss_engine", description=f"{APP_NAME} без интерфейса")
+    parser.add_argument("--config-dir", default=str(CONFIG_DIR), help="каталог с config.json и базой статей")
+    parser.add_argument("-q", "--quiet", action="store_true", help="не выводить журнал")
+    parser.add_argument("-v", "--verbose", action="store_true", help="подробный журнал (уровень debug)")
+    parser.add_argument("--profile", action="store_true",
+                        help="профилировать команду (cProfile + tracemalloc), профили — в <config-dir>/profiles")
+    parser.add_argument("--metrics", choices=("json", "prometheus"),
+                        help="после команды вывести метрики (источники, кэши, время операций)")
+    parser.add_argument("--metrics-out", metavar="FILE", help="записать метрики в файл, а не в stdout")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    refresh = commands.add_parser("refresh", help="обновить все источники и вывести время")
+    refresh.add_argument("--json", action="store_true", help="вывести статистику в JSON")
+    refresh.add_argument("--due", action="store_true", help="только источники, чей срок по расписанию подошёл")
+
+    search = commands.add_parser("search", help="поиск по хранилищу")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+
+    opml = commands.add_parser("opml", help="импорт и экспорт источников в OPML")
+    opml.add_argument("action", choices=("import", "export"))
+    opml.add_argument("file")
+    opml.add_argument("--no-check", action="store_true", help="импортировать без проверки адресов")
+
+    favorites = commands.add_parser("favorites", help="список избранного или выгрузка")
+    favorites.add_argument("--export", metavar="FILE", help="выгрузить избранное целиком (.json, .jsonl или .html)")
+
+    args = parser.parse_args(argv)
+    log = AppLog(DEBUG if args.verbose else INFO, max_lines=0, console=None if args.quiet else sys.stderr)
+    engine = FreshRSSEngine(args.config_dir, log=log)
+    engine.profiler.enabled |= args.profile
+    try:
+        if args.command == "refresh":
+            if not engine.config.get("sources"):
+                print(f"Нет источников в {engine.config_path}", file=sys.stderr)
+                return 1
+            engine.process_backlog()
+            stats = engine.refresh_due() if args.due else engine.refresh()
+            if stats is None:
+                print(f"Ни один источник не ждёт обновления, ближайший — через {engine.seconds_until_due(0, 86400):.0f} с",
+                      file=sys.stderr)
+                return 0
+            if args.json:
+                print(json.dumps(stats, ensure_ascii=False, indent=2))
+            else:
+                print_refresh_stats(stats)
+        elif args.command == "search":
+            t0 = time.perf_counter()
+            ids = engine.query(search=args.query, limit=args.limit, prefix_last=True)
+            elapsed = (time.perf_counter() - t0) * 1000
+            for art_id in ids:
+                art = engine.get(art_id)
+                print(f"{art['origin']['title'][:20]:<20} {art['title']}")
+            print(f"Найдено {len(ids)} за {elapsed:.1f} мс", file=sys.stderr)
+        elif args.command == "opml":
+            return run_opml(engine, args)
+        elif args.command == "favorites":
+            if args.export:
+                try:
+                    engine.export_favorites(args.export)
+                except ValueError as e:
+                    print(e, file=sys.stderr)
+                    return 1
+            else:
+                for art_id in engine.query(favorites_only=True):
+                    art = engine.get(art_id)
+                    print(f"{art['origin']['title'][:20]:<20} {art['title']}")
+    finally:
+        # Метрики пишутся после любой команды, в том числе когда обновлять было нечего:
+        # иначе файл для textfile collector устаревает в самом частом случае
+        try:
+            if args.metrics:
+                dump_metrics(engine.metrics, args.metrics, args.metrics_out)
+        finally:
+            engine.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
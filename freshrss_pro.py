@@ -1,21 +1,37 @@
+import time
+STARTUP_T0 = time.perf_counter()  # точка отсчёта для --startup-profile — до всех остальных импортов
+
 import os
 import sys
 import json
-import time
+import argparse
 import threading
-import requests
+import tkinter
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from importlib.util import find_spec
 from pathlib import Path
 from urllib.parse import urlparse
-from email.utils import parsedate_to_datetime
 from io import BytesIO
 
 import customtkinter as ctk
-import pyttsx3
-import feedparser
-from bs4 import BeautifulSoup
 
-# === Опциональные зависимости ===в разработке
+from applog import AppLog, DEBUG, INFO, WARNING, ERROR
+from article_store import ArticleList
+from article_text import clean_html, display_text, plain_text
+from freshrss_engine import APP_NAME, VERSION, CONFIG_DIR, ENGINE_DEFAULTS, FreshRSSEngine, LiveSearch, format_bytes
+from image_cache import LRUCache, ThumbnailCache
+from tts import TTSWorker, DEFAULT_RATE as DEFAULT_TTS_RATE, DEFAULT_VOLUME as DEFAULT_TTS_VOLUME, \
+    DEFAULT_CACHE_MB as DEFAULT_TTS_CACHE_MB
+from virtual_list import VirtualList, DARK_COLORS, LIGHT_COLORS
+from profiling import profiled, env_enabled
+from session_snapshot import save_snapshot, load_snapshot
+
+# === Опциональные зависимости ===
+# Тяжёлые модули (Pillow, plyer, pystray, pyttsx3, requests) импортируются при первом
+# использовании — здесь только проверяется, что они установлены, без их загрузки.
+# в разработке:
 #try:
 #    from newspaper import Article as NewspaperArticle
 #    NEWSPAPER_AVAILABLE = True
@@ -23,57 +39,230 @@ from bs4 import BeautifulSoup
  #   NEWSPAPER_AVAILABLE = False
 #    print("[!] newspaper3k не установлен — полный текст недоступен")
 
-try:
-    from PIL import Image, ImageTk
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
+PIL_AVAILABLE = find_spec("PIL") is not None
+if not PIL_AVAILABLE:
     print("[!] Pillow не установлен — изображения не будут отображаться")
 
-try:
-    from plyer import notification
-    PLYER_AVAILABLE = True
-except ImportError:
-    PLYER_AVAILABLE = False
+PLYER_AVAILABLE = find_spec("plyer") is not None
+if not PLYER_AVAILABLE:
     print("[!] plyer не установлен — уведомления недоступны")
 
-try:
-    import pystray
-    from pystray import MenuItem as item
-    TRAY_AVAILABLE = True
-except ImportError:
-    TRAY_AVAILABLE = False
+TRAY_AVAILABLE = find_spec("pystray") is not None and PIL_AVAILABLE
+if not TRAY_AVAILABLE:
     print("[!] pystray не установлен — трей недоступен")
 
 # === Конфигурация ===
-APP_NAME = "FreshRSS Pro"
-VERSION = "2.0.0.4"
-
-CONFIG_DIR = Path.home() / ".config" / "freshrss_pro"
-CONFIG_PATH = CONFIG_DIR / "config.json"
-FAVORITES_PATH = CONFIG_DIR / "favorites.json"
+# Загрузка лент, хранилище и поиск живут в freshrss_engine.py; здесь — только окно приложения
+THUMBS_DIR = CONFIG_DIR / "thumbs"
+TTS_CACHE_DIR = CONFIG_DIR / "tts_cache"
+PROFILES_DIR = CONFIG_DIR / "profiles"
+SNAPSHOT_PATH = CONFIG_DIR / "session.snap"
 
 DEFAULT_WEATHER_CITY = "Moscow"
-DEFAULT_RSS_UPDATE_INTERVAL = 3600  # 1 час
+WEATHER_MAX_BYTES = 64 * 1024
+
+REFRESH_BUSY_POLL = 1       # сек.: как часто планировщик проверяет, закончилось ли идущее обновление
+
+SEARCH_DEBOUNCE_MS = 250    # пауза в наборе, после которой запускается поиск
+SOURCE_LIST_HEIGHT = 280    # высота списка источников в настройках, пикселей
+
+# Журнал: окно забирает накопившиеся строки раз в LOG_FLUSH_MS и хранит только последние
+LOG_FLUSH_MS = 200
+DEFAULT_LOG_LINES = 500
+LOG_PATH = CONFIG_DIR / "logs" / "freshrss_pro.log"
+
+# Кэш изображений
+THUMB_SIZE = (800, 400)
+IMAGE_MAX_BYTES = 8 * 1024 * 1024   # картинка больше — не загружается
+DEFAULT_IMAGE_CACHE_MB = 64      # декодированные изображения в памяти
+DEFAULT_THUMB_CACHE_MB = 200     # миниатюры на диске
+DEFAULT_THUMB_CACHE_DAYS = 30    # срок жизни миниатюры
+
+# Предзагрузка следующих статей
+DEFAULT_PREFETCH_AHEAD = 3
+DEFAULT_PREFETCH_MB = 48
+
+# TTS и трей поднимаются в фоне, когда окно уже отрисовано
+DEFERRED_INIT_MS = 50
+
+STATS_REFRESH_MS = 2000     # окно статистики перечитывает метрики, пока открыто
+
+# Сколько следующих статей заранее записывать в аудио при включённом Авто-TTS
+DEFAULT_TTS_PRERENDER = 2
+
+GUI_DEFAULTS = {
+    **ENGINE_DEFAULTS,
+    "weather_city": DEFAULT_WEATHER_CITY,
+    "hide_log": False,
+    "log_level": "info",
+    "log_lines": DEFAULT_LOG_LINES,
+    "log_file": False,
+    "log_file_mb": 1,
+    "log_file_backups": 3,
+    "minimize_to_tray": True,
+    "image_cache_mb": DEFAULT_IMAGE_CACHE_MB,
+    "thumb_cache_mb": DEFAULT_THUMB_CACHE_MB,
+    "thumb_cache_days": DEFAULT_THUMB_CACHE_DAYS,
+    "prefetch_ahead": DEFAULT_PREFETCH_AHEAD,
+    "prefetch_mb": DEFAULT_PREFETCH_MB,
+    "tts_rate": DEFAULT_TTS_RATE,
+    "tts_volume": DEFAULT_TTS_VOLUME,
+    "tts_cache_mb": DEFAULT_TTS_CACHE_MB,
+    "tts_prerender": DEFAULT_TTS_PRERENDER
+}
+
+
+class Prefetcher:
+    # Пока читается текущая статья, в фоне готовит следующие по направлению листания:
+    # очищенный текст и уже уменьшенную картинку. Объём готовых данных ограничен.
+    def __init__(self, prepare_text, load_image, max_bytes, workers=2):
+        self.prepare_text = prepare_text
+        self.load_image = load_image  # url -> PIL.Image или None, если Pillow недоступен
+        self.max_bytes = max_bytes
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.lock = threading.Lock()
+        self.ready = OrderedDict()  # id -> (текст, картинка, размер)
+        self.size = 0
+        self.generation = 0
+        self.futures = []
+        self.hits = 0
+        self.misses = 0
+
+    def schedule(self, articles):
+        with self.lock:
+            self._cancel_locked()
+            generation = self.generation
+            self.futures = [
+                self.pool.submit(self._prepare, generation, art)
+                for art in articles if art.get("id") and art["id"] not in self.ready
+            ]
+
+    def cancel(self):
+        with self.lock:
+            self._cancel_locked()
+
+    def _cancel_locked(self):
+        self.generation += 1
+        for f in self.futures:
+            f.cancel()
+        self.futures = []
+
+    def _prepare(self, generation, art):
+        if generation != self.generation:
+            return
+        text = self.prepare_text(art)
+        image = None
+        if self.load_image and art.get("image_url") and generation == self.generation:
+            try:
+                image = self.load_image(art["image_url"])
+            except Exception:
+                image = None
+        size = len(text) * 2 + (image.width * image.height * 4 if image is not None else 0)
+        with self.lock:
+            if art["id"] in self.ready:
+                self.size -= self.ready.pop(art["id"])[2]
+            self.ready[art["id"]] = (text, image, size)
+            self.size += size
+            while self.size > self.max_bytes and self.ready:
+                self.size -= self.ready.popitem(last=False)[1][2]
+
+    def get(self, art_id):
+        with self.lock:
+            item = self.ready.get(art_id)
+            if item is None:
+                self.misses += 1
+                return None
+            self.ready.move_to_end(art_id)
+            self.hits += 1
+            return item[0], item[1]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.ready),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class StartupProfile:
+    # Замеры фаз запуска (--startup-profile): от начала импорта до первой показанной статьи.
+    # Выключенный профиль ничего не считает.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.last = STARTUP_T0
+        self.phases = []
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - STARTUP_T0))
+        self.last = now
+
+    def finish(self, phase, log):
+        if not self.enabled:
+            return
+        self.mark(phase)
+        self.enabled = False
+        lines = [f"{'фаза':<28} {'мс':>8} {'с начала':>9}"]
+        lines += [f"{name:<28} {took * 1000:8.1f} {since * 1000:9.1f}" for name, took, since in self.phases]
+        print("\n".join(lines), file=sys.stderr)
+        log(f"🚀 Запуск до первой статьи: {self.phases[-1][2] * 1000:.0f} мс", INFO)
 
 
 class FreshRSSPro:
-    def __init__(self):
+    def __init__(self, startup_profile=False):
         self.version = VERSION
-        self.config = self.load_config()
-        self.favorites = self.load_favorites()
-        self.articles = []
-        self.all_articles = []
+        self.startup = StartupProfile(startup_profile)
+        self.startup.mark("импорт модулей")
+        self.applog = AppLog(max_lines=DEFAULT_LOG_LINES)
+        self.engine = FreshRSSEngine(CONFIG_DIR, GUI_DEFAULTS, log=self.log)
+        self.startup.mark("ядро и хранилище")
+        self.engine.on("batch_stored", lambda src, new_ids: self.root.after(0, self._on_batch_stored))
+        self.engine.on("refresh_finished", self._on_refresh_finished)
+        self.config = self.engine.config
+        self.store = self.engine.store
+        self._configure_log()
+        threading.Thread(target=self.engine.process_backlog, daemon=True).start()
+        self.articles = ArticleList(self.store, [])
+        self.article_list = None
         self.current_index = -1
         self.auto_advance = False
         self.auto_tts = False
-        self.tts_engine = None
-        self._init_tts()
+        self.tts = TTSWorker(
+            TTS_CACHE_DIR,
+            int(self.config.get("tts_cache_mb", DEFAULT_TTS_CACHE_MB)) * 1024 * 1024,
+            rate=int(self.config.get("tts_rate", DEFAULT_TTS_RATE)),
+            volume=float(self.config.get("tts_volume", DEFAULT_TTS_VOLUME)),
+            log=self.log
+        )
         self.weather = "—"
         self.image_label = None
-        self.image_cache = {}
+        self.image_cache = LRUCache(int(self.config.get("image_cache_mb", DEFAULT_IMAGE_CACHE_MB)) * 1024 * 1024)
+        self.thumb_cache = ThumbnailCache(
+            THUMBS_DIR,
+            int(self.config.get("thumb_cache_mb", DEFAULT_THUMB_CACHE_MB)) * 1024 * 1024,
+            int(self.config.get("thumb_cache_days", DEFAULT_THUMB_CACHE_DAYS)) * 86400
+        )
+        threading.Thread(target=self.thumb_cache.prune, daemon=True).start()
+        self.metrics = self.engine.metrics
+        self.profiler = self.engine.profiler
+        self.metrics.add_collector("image_cache", self.image_cache.stats)
+        self.metrics.add_collector("thumb_cache", self.thumb_cache.stats)
+        self.metrics.add_collector("tts_cache", self.tts.stats)
+        self.image_request = None
+        self.reconcile_snapshot = False  # лента восстановлена из снимка и ещё не сверена с хранилищем
+        self.prefetcher = Prefetcher(
+            self._display_text,
+            self._load_thumbnail if PIL_AVAILABLE else None,
+            int(self.config.get("prefetch_mb", DEFAULT_PREFETCH_MB)) * 1024 * 1024
+        )
+        self.metrics.add_collector("prefetch", self.prefetcher.stats)
         self.status_label = None
-        self.last_article_hashes = set()
         self.rss_updater_thread = None
         self.stop_rss_updater = threading.Event()
         self.tray_icon = None
@@ -85,6 +274,7 @@ class FreshRSSPro:
         self.root.title(f"🎧 {APP_NAME} • v{self.version}")
         self.root.geometry("1100x800")
         self.root.minsize(900, 700)
+        self.startup.mark("окно")
 
         # Иконка приложения (если есть .ico рядом)
         icon_path = Path(__file__).with_suffix('.ico')
@@ -97,82 +287,77 @@ class FreshRSSPro:
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         # Горячие клавиши
-        self.root.bind("<Left>", lambda e: self.prev_article())
-        self.root.bind("<Right>", lambda e: self.next_article())
-        self.root.bind("<space>", lambda e: self.toggle_auto_advance_switch())
-        self.root.bind("<f>", lambda e: self.toggle_favorite())
-        self.root.bind("<F>", lambda e: self.toggle_favorite())
-        self.root.bind("<s>", lambda e: self.focus_search())
-        self.root.bind("<S>", lambda e: self.focus_search())
-        self.root.bind("<t>", lambda e: self.toggle_theme())
-        self.root.bind("<T>", lambda e: self.toggle_theme())
+        self.root.bind("<Left>", self._hotkey(self.prev_article))
+        self.root.bind("<Right>", self._hotkey(self.next_article))
+        self.root.bind("<space>", self._hotkey(self.toggle_auto_advance_switch))
+        self.root.bind("<f>", self._hotkey(self.toggle_favorite))
+        self.root.bind("<F>", self._hotkey(self.toggle_favorite))
+        self.root.bind("<s>", self._hotkey(self.focus_search))
+        self.root.bind("<S>", self._hotkey(self.focus_search))
+        self.root.bind("<t>", self._hotkey(self.toggle_theme))
+        self.root.bind("<T>", self._hotkey(self.toggle_theme))
 
         if not self.config.get("sources"):
             self.show_settings_window(first_run=True)
         else:
             self.create_main_ui()
-            self.load_articles()
+            self.startup.mark("интерфейс")
+            # Если есть что показать из прошлого запуска, обновление не сбивает читателя с текущей статьи
+            self.load_articles(forced=not self.show_stored_articles())
             self.start_weather_updater()
             self.start_rss_updater()
             self.update_status_bar()
 
-        # Запуск трей-иконки
-        if TRAY_AVAILABLE:
-            self.setup_tray()
+        # Озвучка и трей не нужны для первого кадра — их черёд, когда окно отрисовано
+        self.root.after(DEFERRED_INIT_MS, self._deferred_init)
 
-    def _init_tts(self):
-        try:
-            self.tts_engine = pyttsx3.init()
-            self.tts_engine.setProperty('rate', 170)
-            self.tts_engine.setProperty('volume', 0.9)
-        except Exception as e:
-            print(f"[TTS] Не удалось инициализировать: {e}")
-            self.tts_engine = None
+    def _deferred_init(self):
+        self.startup.mark("первый кадр")
+        self.tts.start()
+        if TRAY_AVAILABLE:
+            threading.Thread(target=self.setup_tray, daemon=True).start()
 
-    def load_config(self):
-        if CONFIG_PATH.exists():
-            try:
-                data = json.loads(CONFIG_PATH.read_text(encoding='utf-8'))
-                data.setdefault("weather_city", DEFAULT_WEATHER_CITY)
-                data.setdefault("hide_log", False)
-                data.setdefault("rss_update_interval", DEFAULT_RSS_UPDATE_INTERVAL)
-                data.setdefault("minimize_to_tray", True)
-                return data
-            except Exception as e:
-                print(f"[!] Ошибка загрузки конфига: {e}")
-        return {
-            "sources": [],
-            "weather_city": DEFAULT_WEATHER_CITY,
-            "hide_log": False,
-            "rss_update_interval": DEFAULT_RSS_UPDATE_INTERVAL,
-            "minimize_to_tray": True
-        }
+    def _hotkey(self, action):
+        # Горячие клавиши не должны срабатывать, пока пользователь печатает в поле ввода
+        def handler(event):
+            if isinstance(event.widget, tkinter.Entry):
+                return
+            action()
+        return handler
 
     def save_config(self):
-        CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-        CONFIG_PATH.write_text(json.dumps(self.config, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.engine.save_config()
 
-    def load_favorites(self):
-        if FAVORITES_PATH.exists():
-            try:
-                return set(json.loads(FAVORITES_PATH.read_text(encoding='utf-8')))
-            except:
-                return set()
-        return set()
-
-    def save_favorites(self):
-        CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-        FAVORITES_PATH.write_text(json.dumps(list(self.favorites), indent=2, ensure_ascii=False), encoding='utf-8')
-
-    def log(self, msg):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        full_msg = f"[{timestamp}] {msg}"
-        print(full_msg)
-        if hasattr(self, 'log_text'):
-            self.root.after(0, lambda: self.log_text.configure(state="normal"))
-            self.root.after(0, lambda: self.log_text.insert("end", full_msg + "\n"))
-            self.root.after(0, lambda: self.log_text.configure(state="disabled"))
-            self.root.after(0, lambda: self.log_text.see("end"))
+    def log(self, msg, level=INFO):
+        # Можно вызывать из любого потока: строка попадает в буфер, окно заберёт её в _flush_log
+        self.applog(msg, level)
+
+    def _configure_log(self):
+        lines = int(self.config.get("log_lines", DEFAULT_LOG_LINES))
+        self.applog.configure(level=self.config.get("log_level", "info"), max_lines=lines)
+        try:
+            if self.config.get("log_file"):
+                self.applog.open_file(LOG_PATH, int(float(self.config.get("log_file_mb", 1)) * 1024 * 1024),
+                                      int(self.config.get("log_file_backups", 3)))
+            else:
+                self.applog.close_file()
+        except OSError as e:
+            print(f"[!] Не удалось открыть файл журнала: {e}")
+
+    def _flush_log(self):
+        lines, dropped = self.applog.drain()
+        if lines:
+            max_lines = int(self.config.get("log_lines", DEFAULT_LOG_LINES))
+            if dropped:
+                lines.insert(0, f"… пропущено строк: {dropped}")
+            self.log_text.configure(state="normal")
+            self.log_text.insert("end", "\n".join(lines[-max_lines:]) + "\n")
+            excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - max_lines
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_text.configure(state="disabled")
+            self.log_text.see("end")
+        self.root.after(LOG_FLUSH_MS, self._flush_log)
 
     # ==================== НОВОЕ: ОКНО НАСТРОЕК (С СКРОЛЛОМ) ====================
     def show_settings_window(self, first_run=False):
@@ -207,52 +392,244 @@ class FreshRSSPro:
         self.city_entry.insert(0, self.config.get("weather_city", DEFAULT_WEATHER_CITY))
 
         # ---------- Источники ----------
+        # Список виртуальный: рисуются только видимые строки, а правится один источник за раз в форме
+        # под списком — окно открывается сразу и при тысячах лент
         ctk.CTkLabel(scrollable_frame, text="---------- Источники новостей ----------", font=("Roboto", 12, "bold")).pack(anchor="w", padx=10, pady=(10, 5))
         sources_frame = ctk.CTkFrame(scrollable_frame)
         sources_frame.pack(fill="x", padx=10, pady=5)
 
-        entries = []
-
-        def add_row(url="", src_type="rss", user="", token=""):
-            row = ctk.CTkFrame(sources_frame)
-            row.pack(fill="x", pady=3)
-
-            url_e = ctk.CTkEntry(row, placeholder_text="https://example.com/feed.xml", width=350)
-            url_e.pack(side="left", padx=2, fill="x", expand=True)
-            if url:
-                url_e.insert(0, url)
-
-            type_var = ctk.StringVar(value=src_type)
-            ctk.CTkRadioButton(row, text="RSS", variable=type_var, value="rss").pack(side="left", padx=2)
-            ctk.CTkRadioButton(row, text="FreshRSS", variable=type_var, value="freshrss").pack(side="left", padx=2)
-
-            user_e = ctk.CTkEntry(row, placeholder_text="user", width=90)
-            token_e = ctk.CTkEntry(row, placeholder_text="token", width=90, show="•")
-
-            if src_type == "freshrss":
+        sources = [dict(src) for src in self.config.get("sources", [])]
+        checks = {}         # url -> результат проверки (FreshRSSEngine.validate_feeds)
+        shown = []          # индексы sources, подходящие под фильтр, в порядке показа
+        selected = -1       # индекс правимого источника в sources; -1 — новый
+        filter_job = None
+        cancel_checks = threading.Event()
+        settings.bind("<Destroy>", lambda e: cancel_checks.set() if e.widget is settings else None, add="+")
+
+        filter_frame = ctk.CTkFrame(sources_frame)
+        filter_frame.pack(fill="x", pady=(0, 3))
+        filter_e = ctk.CTkEntry(filter_frame, placeholder_text="Фильтр: название, адрес или папка")
+        filter_e.pack(side="left", fill="x", expand=True, padx=2)
+        count_label = ctk.CTkLabel(filter_frame, text="")
+        count_label.pack(side="right", padx=5)
+
+        def source_rows(start, stop):
+            rows = []
+            for i in shown[start:stop]:
+                src = sources[i]
+                check = checks.get(src["url"])
+                mark = "" if check is None else "✅ " if check["ok"] else f"❌ {check['error'][:60]} • "
+                kind = "FreshRSS" if src["type"] == "freshrss" else "RSS"
+                folder = f"{src['folder']} • " if src.get("folder") else ""
+                rows.append((src.get("name") or src["url"], f"{mark}{kind} • {folder}{src['url']}"))
+            return rows
+
+        list_frame = ctk.CTkFrame(sources_frame)
+        list_frame.pack(fill="x")
+        source_list = VirtualList(list_frame, source_rows, lambda index: select_source(index), colors=self._list_colors())
+        source_list.canvas.configure(height=SOURCE_LIST_HEIGHT)
+        source_scroll = ctk.CTkScrollbar(list_frame, command=source_list.yview)
+        source_scroll.pack(side="right", fill="y")
+        source_list.pack(side="left", fill="x", expand=True)
+        source_list.set_scrollbar(source_scroll)
+
+        progress_frame = ctk.CTkFrame(sources_frame, fg_color="transparent")
+        progress_frame.pack(fill="x")
+        progress_bar = ctk.CTkProgressBar(progress_frame)
+        progress_label = ctk.CTkLabel(progress_frame, text="")
+
+        def refilter():
+            text = filter_e.get().strip().lower()
+            shown[:] = [i for i, src in enumerate(sources)
+                        if not text or text in src["url"].lower() or text in src.get("name", "").lower()
+                        or text in src.get("folder", "").lower()]
+            source_list.set_count(len(shown), shown.index(selected) if selected in shown else -1)
+            count_label.configure(text=f"{len(shown)} из {len(sources)}" if text else f"{len(sources)} источников")
+
+        def on_filter_key(event=None):
+            nonlocal filter_job
+            if filter_job:
+                settings.after_cancel(filter_job)
+            filter_job = settings.after(SEARCH_DEBOUNCE_MS, refilter)
+
+        filter_e.bind("<KeyRelease>", on_filter_key)
+
+        # Форма правки выбранного источника
+        form = ctk.CTkFrame(sources_frame)
+        form.pack(fill="x", pady=3)
+        url_e = ctk.CTkEntry(form, placeholder_text="https://example.com/feed.xml", width=350)
+        url_e.pack(side="left", padx=2, fill="x", expand=True)
+        type_var = ctk.StringVar(value="rss")
+        ctk.CTkRadioButton(form, text="RSS", variable=type_var, value="rss").pack(side="left", padx=2)
+        ctk.CTkRadioButton(form, text="FreshRSS", variable=type_var, value="freshrss").pack(side="left", padx=2)
+        user_e = ctk.CTkEntry(form, placeholder_text="user", width=90)
+        token_e = ctk.CTkEntry(form, placeholder_text="token", width=90, show="•")
+        # Пароль API (необязательно): с ним FreshRSS синхронизируется через Google Reader API
+        api_e = ctk.CTkEntry(form, placeholder_text="API-пароль", width=90, show="•")
+
+        def toggle_fields(*_):
+            if type_var.get() == "freshrss":
                 user_e.pack(side="left", padx=2)
                 token_e.pack(side="left", padx=2)
-                if user: user_e.insert(0, user)
-                if token: token_e.insert(0, token)
-
-            def toggle_fields(*_):
-                if type_var.get() == "freshrss":
-                    user_e.pack(side="left", padx=2)
-                    token_e.pack(side="left", padx=2)
-                else:
-                    user_e.pack_forget()
-                    token_e.pack_forget()
-
-            type_var.trace_add("write", toggle_fields)
-            entries.append((url_e, type_var, user_e, token_e))
-
-        for src in self.config.get("sources", []):
-            if src["type"] == "freshrss":
-                add_row(src["url"], "freshrss", src["user"], src["token"])
+                api_e.pack(side="left", padx=2)
+            else:
+                user_e.pack_forget()
+                token_e.pack_forget()
+                api_e.pack_forget()
+
+        type_var.trace_add("write", toggle_fields)
+
+        def fill_form(src):
+            for entry, key in ((url_e, "url"), (user_e, "user"), (token_e, "token"), (api_e, "api_password")):
+                entry.delete(0, "end")
+                if src.get(key):
+                    entry.insert(0, src[key])
+            type_var.set(src.get("type", "rss"))
+
+        def form_source():
+            # Источник из формы в виде записи config["sources"]; None — заполнено не всё
+            url = url_e.get().strip()
+            if not url:
+                return None
+            previous = sources[selected] if selected >= 0 else {}
+            same = previous.get("url") == url
+            if type_var.get() == "freshrss":
+                user, token, api_password = user_e.get().strip(), token_e.get().strip(), api_e.get().strip()
+                if not (user and (token or api_password)):
+                    return None
+                src = {
+                    "type": "freshrss",
+                    "url": url.rstrip('/'),
+                    "user": user,
+                    "token": token,
+                    "name": urlparse(url).hostname or "FreshRSS"
+                }
+                if api_password:
+                    src["api_password"] = api_password
+                return src
+            src = {
+                "type": "rss",
+                "url": url,
+                "name": previous.get("name") if same and previous.get("name") else urlparse(url).hostname or "RSS"
+            }
+            if same and previous.get("folder"):
+                src["folder"] = previous["folder"]
+            return src
+
+        def select_source(index):
+            nonlocal selected
+            selected = shown[index]
+            source_list.select(index)
+            fill_form(sources[selected])
+
+        def new_source():
+            nonlocal selected
+            selected = -1
+            source_list.select(-1)
+            fill_form({})
+            url_e.focus()
+
+        def apply_source(quiet=False):
+            nonlocal selected
+            src = form_source()
+            if src is None:
+                if not quiet:
+                    from tkinter import messagebox
+                    messagebox.showwarning("Источник", "Укажите адрес, а для FreshRSS — пользователя и токен или API-пароль",
+                                           parent=settings)
+                return
+            if selected >= 0:
+                sources[selected] = src
             else:
-                add_row(src["url"], "rss")
+                sources.append(src)
+                selected = len(sources) - 1
+            refilter()
+
+        def delete_source():
+            nonlocal selected
+            if selected < 0:
+                return
+            del sources[selected]
+            selected = -1
+            fill_form({})
+            refilter()
+
+        form_btns = ctk.CTkFrame(sources_frame, fg_color="transparent")
+        form_btns.pack(fill="x")
+        ctk.CTkButton(form_btns, text="✔ Применить", width=110, command=apply_source).pack(side="left", padx=2)
+        ctk.CTkButton(form_btns, text="+ Новый", width=90, command=new_source).pack(side="left", padx=2)
+        ctk.CTkButton(form_btns, text="🗑 Удалить", width=90, command=delete_source).pack(side="left", padx=2)
+
+        def import_opml():
+            # Разбор и проверка адресов — в фоне; в список попадают только отвечающие ленты
+            from tkinter import filedialog, messagebox
+            path = filedialog.askopenfilename(parent=settings, filetypes=[("OPML", "*.opml *.xml"), ("Все файлы", "*.*")])
+            if not path:
+                return
+            known = {src["url"].rstrip("/") for src in sources}
+            progress_bar.set(0)
+            progress_bar.pack(side="left", fill="x", expand=True, padx=5, pady=3)
+            progress_label.configure(text="Чтение OPML…")
+            progress_label.pack(side="right", padx=5)
+
+            def progress(done, total, url, result):
+                # Окно перерисовывается примерно на каждый процент, а не на каждый адрес
+                if done == total or done % max(total // 100, 1) == 0:
+                    self.root.after(0, lambda: progress_update(done, total, url))
+
+            def progress_update(done, total, url):
+                if cancel_checks.is_set():
+                    return
+                progress_bar.set(done / total)
+                progress_label.configure(text=f"Проверено {done} из {total}: {urlparse(url).hostname or url}")
+
+            def work():
+                try:
+                    found = [src for src in self.engine.import_opml(path) if src["url"].rstrip("/") not in known]
+                except Exception as e:
+                    message = f"Не удалось прочитать OPML:\n{e}"
+                    self.root.after(0, lambda: finish([], {}, message))
+                    return
+                results = self.engine.validate_feeds([src["url"] for src in found], progress,
+                                                     cancel=cancel_checks.is_set)
+                self.root.after(0, lambda: finish(found, results))
+
+            def finish(found, results, error=None):
+                if cancel_checks.is_set():
+                    return
+                progress_bar.pack_forget()
+                progress_label.pack_forget()
+                if error:
+                    messagebox.showerror("OPML", error, parent=settings)
+                    return
+                checks.update(results)
+                added = [src for src in found if results[src["url"]]["ok"]]
+                failed = [src for src in found if not results[src["url"]]["ok"]]
+                sources.extend(added)
+                refilter()
+                for src in failed:
+                    self.log(f"⚠️ OPML: {src['url']} не добавлен — {results[src['url']]['error']}", WARNING)
+                self.log(f"📥 OPML: добавлено {len(added)} источников, не прошли проверку {len(failed)}")
+                messagebox.showinfo("OPML", f"Добавлено источников: {len(added)}"
+                                    + (f"\nНе прошли проверку: {len(failed)} (подробно — в журнале)" if failed else ""),
+                                    parent=settings)
+
+            threading.Thread(target=work, daemon=True).start()
+
+        def export_opml():
+            from tkinter import filedialog, messagebox
+            path = filedialog.asksaveasfilename(parent=settings, initialfile="freshrss_pro.opml", defaultextension=".opml",
+                                                filetypes=[("OPML", "*.opml")])
+            if path:
+                try:
+                    count = self.engine.export_opml(path, sources)
+                    messagebox.showinfo("OPML", f"Выгружено источников: {count}", parent=settings)
+                except Exception as e:
+                    messagebox.showerror("Ошибка", f"Не удалось выгрузить OPML:\n{e}", parent=settings)
 
-        ctk.CTkButton(scrollable_frame, text="+ Добавить источник", command=lambda: add_row()).pack(pady=5)
+        ctk.CTkButton(form_btns, text="📤 OPML", width=90, command=export_opml).pack(side="right", padx=2)
+        ctk.CTkButton(form_btns, text="📥 OPML", width=90, command=import_opml).pack(side="right", padx=2)
+        refilter()
 
         # ---------- Обновления ----------
         upd_frame = ctk.CTkFrame(scrollable_frame)
@@ -264,6 +641,9 @@ class FreshRSSPro:
         ctk.CTkRadioButton(upd_frame, text="Каждые 30 минут", variable=self.interval_var, value="1800").pack(anchor="w", padx=5)
         ctk.CTkRadioButton(upd_frame, text="Каждый час", variable=self.interval_var, value="3600").pack(anchor="w", padx=5)
         ctk.CTkRadioButton(upd_frame, text="Каждые 2 часа", variable=self.interval_var, value="7200").pack(anchor="w", padx=5)
+        self.adaptive_refresh_var = ctk.BooleanVar(value=self.config.get("adaptive_refresh", True))
+        ctk.CTkCheckBox(upd_frame, text="Подстраивать интервал под каждую ленту",
+                        variable=self.adaptive_refresh_var).pack(anchor="w", padx=5, pady=(5, 0))
 
         # ---------- Доп. фишки ----------
         misc_frame = ctk.CTkFrame(scrollable_frame)
@@ -273,6 +653,20 @@ class FreshRSSPro:
         self.hide_log_var = ctk.BooleanVar(value=self.config.get("hide_log", False))
         ctk.CTkCheckBox(misc_frame, text="Скрыть лог", variable=self.hide_log_var).pack(anchor="w", padx=5)
 
+        self.debug_log_var = ctk.BooleanVar(value=self.config.get("log_level", "info") == "debug")
+        ctk.CTkCheckBox(misc_frame, text="Подробный лог (по каждой статье и запросу)", variable=self.debug_log_var).pack(anchor="w", padx=5)
+
+        self.log_file_var = ctk.BooleanVar(value=self.config.get("log_file", False))
+        ctk.CTkCheckBox(misc_frame, text=f"Писать лог в файл ({LOG_PATH.parent})", variable=self.log_file_var).pack(anchor="w", padx=5)
+
+        self.collapse_duplicates_var = ctk.BooleanVar(value=self.config.get("collapse_duplicates", True))
+        ctk.CTkCheckBox(misc_frame, text="Показывать одну статью вместо дубликатов из разных источников",
+                        variable=self.collapse_duplicates_var).pack(anchor="w", padx=5)
+
+        self.profiling_var = ctk.BooleanVar(value=self.config.get("profiling", False))
+        ctk.CTkCheckBox(misc_frame, text=f"Профилирование обновления, поиска и показа статей ({PROFILES_DIR})",
+                        variable=self.profiling_var).pack(anchor="w", padx=5)
+
         self.minimize_to_tray_var = ctk.BooleanVar(value=self.config.get("minimize_to_tray", True))
         ctk.CTkCheckBox(misc_frame, text="Сворачивать в трей при закрытии", variable=self.minimize_to_tray_var).pack(anchor="w", padx=5)
 
@@ -283,7 +677,7 @@ class FreshRSSPro:
         def test_connection():
             city = self.city_entry.get().strip() or DEFAULT_WEATHER_CITY
             try:
-                r = requests.get(f"https://wttr.in/{city}?format=4", timeout=10)
+                r = self.engine.http.get(f"https://wttr.in/{city}?format=4", timeout=10, max_bytes=WEATHER_MAX_BYTES)
                 if r.status_code == 200:
                     self.log("✅ Погода: соединение успешно")
                     from tkinter import messagebox
@@ -291,7 +685,7 @@ class FreshRSSPro:
                 else:
                     raise Exception(f"HTTP {r.status_code}")
             except Exception as e:
-                self.log(f"❌ Погода: ошибка — {e}")
+                self.log(f"❌ Погода: ошибка — {e}", ERROR)
                 from tkinter import messagebox
                 messagebox.showerror("Тест", f"Не удалось получить погоду:\n{e}")
 
@@ -302,18 +696,16 @@ class FreshRSSPro:
                 try:
                     with open(path, encoding='utf-8') as f:
                         new_cfg = json.load(f)
-                    self.config = new_cfg
+                    # Словарь конфигурации общий с ядром — обновляем его на месте
+                    self.config.clear()
+                    self.config.update(new_cfg)
                     self.save_config()
                     self.city_entry.delete(0, "end")
                     self.city_entry.insert(0, self.config.get("weather_city", DEFAULT_WEATHER_CITY))
-                    for widget in sources_frame.winfo_children():
-                        widget.destroy()
-                    entries.clear()
-                    for src in self.config.get("sources", []):
-                        if src["type"] == "freshrss":
-                            add_row(src["url"], "freshrss", src["user"], src["token"])
-                        else:
-                            add_row(src["url"], "rss")
+                    sources[:] = [dict(src) for src in self.config.get("sources", [])]
+                    checks.clear()
+                    new_source()
+                    refilter()
                     self.log("📥 Конфигурация импортирована")
                 except Exception as e:
                     messagebox.showerror("Ошибка", f"Не удалось импортировать:\n{e}")
@@ -338,30 +730,19 @@ class FreshRSSPro:
             city = self.city_entry.get().strip() or DEFAULT_WEATHER_CITY
             self.config["weather_city"] = city
             self.config["hide_log"] = bool(self.hide_log_var.get())
+            self.config["log_level"] = "debug" if self.debug_log_var.get() else "info"
+            self.config["log_file"] = bool(self.log_file_var.get())
+            self._configure_log()
             self.config["minimize_to_tray"] = bool(self.minimize_to_tray_var.get())
             self.config["rss_update_interval"] = int(self.interval_var.get())
-
-            sources = []
-            for url_e, t_var, u_e, tok_e in entries:
-                url = url_e.get().strip()
-                if not url:
-                    continue
-                if t_var.get() == "freshrss":
-                    user, token = u_e.get().strip(), tok_e.get().strip()
-                    if url and user and token:
-                        sources.append({
-                            "type": "freshrss",
-                            "url": url.rstrip('/'),
-                            "user": user,
-                            "token": token,
-                            "name": urlparse(url).hostname or "FreshRSS"
-                        })
-                else:
-                    sources.append({
-                        "type": "rss",
-                        "url": url,
-                        "name": urlparse(url).hostname or "RSS"
-                    })
+            self.config["adaptive_refresh"] = bool(self.adaptive_refresh_var.get())
+            self.config["collapse_duplicates"] = bool(self.collapse_duplicates_var.get())
+            self.store.collapse = self.config["collapse_duplicates"]
+            self.config["profiling"] = bool(self.profiling_var.get())
+            self.profiler.enabled = self.config["profiling"] or env_enabled()
+
+            # Набранное в форме, но не применённое, тоже сохраняется
+            apply_source(quiet=True)
             self.config["sources"] = sources
             self.save_config()
             settings.destroy()
@@ -383,6 +764,7 @@ class FreshRSSPro:
         self.title_label.pack(side="left")
 
         ctk.CTkButton(top_frame, text="⚙️ Настройки", command=self.show_settings_window).pack(side="right", padx=5)
+        ctk.CTkButton(top_frame, text="📊", width=40, command=self.show_stats_window).pack(side="right", padx=5)
         ctk.CTkButton(top_frame, text="🔄 Обновить", command=self.load_articles).pack(side="right", padx=5)
         self.theme_btn = ctk.CTkButton(top_frame, text="🌓 Тема", command=self.toggle_theme)
         self.theme_btn.pack(side="right", padx=5)
@@ -392,6 +774,14 @@ class FreshRSSPro:
         self.search_entry = ctk.CTkEntry(search_frame, placeholder_text="Поиск по статьям...")
         self.search_entry.pack(side="left", fill="x", expand=True, padx=5)
         self.search_entry.bind("<Return>", lambda e: self.perform_search())
+        self.search_entry.bind("<KeyRelease>", self.on_search_key)
+        self.search_job = None
+        self.search_query = ""
+        self.favorites_only = False  # показывается только избранное
+        self.live_search = LiveSearch(self.store, self._on_search_results, self.metrics, self.profiler)
+        ctk.CTkButton(search_frame, text="📤", width=40, command=self.export_favorites).pack(side="right", padx=5)
+        self.favorites_switch = ctk.CTkSwitch(search_frame, text="⭐ Избранное", command=self.toggle_favorites_view)
+        self.favorites_switch.pack(side="right", padx=10)
         ctk.CTkButton(search_frame, text="🔍", width=50, command=self.perform_search).pack(side="right", padx=5)
 
         ctrl_frame = ctk.CTkFrame(self.root)
@@ -408,6 +798,17 @@ class FreshRSSPro:
 
         content_frame = ctk.CTkFrame(self.root)
         content_frame.pack(fill="both", expand=True, padx=10, pady=5)
+
+        # Список статей: рисуются только видимые строки, заголовки читаются из базы по мере прокрутки
+        list_frame = ctk.CTkFrame(content_frame)
+        list_frame.pack(side="left", fill="y", padx=(0, 10))
+        self.article_list = VirtualList(list_frame, self._article_rows, self.show_article, colors=self._list_colors())
+        list_scroll = ctk.CTkScrollbar(list_frame, command=self.article_list.yview)
+        list_scroll.pack(side="right", fill="y")
+        self.article_list.pack(side="left", fill="y")
+        self.article_list.set_scrollbar(list_scroll)
+        self.article_list.set_count(len(self.articles), self.current_index)
+
         self.image_label = ctk.CTkLabel(content_frame, text="")
         self.image_label.pack(pady=(0, 10))
         self.content_text = ctk.CTkTextbox(content_frame, wrap="word", font=("Segoe UI", 13))
@@ -420,6 +821,7 @@ class FreshRSSPro:
         self.log_text = ctk.CTkTextbox(self.log_frame, height=80, font=("Consolas", 10), text_color="lightgray")
         self.log_text.pack(fill="x", padx=5, pady=5)
         self.log_text.configure(state="disabled")
+        self.root.after(LOG_FLUSH_MS, self._flush_log)
 
         # Статусная строка
         self.status_label = ctk.CTkLabel(self.root, text="Готово", anchor="w", height=20, text_color="gray")
@@ -446,10 +848,31 @@ class FreshRSSPro:
         mode = ctk.get_appearance_mode()
         new_mode = "Light" if mode == "Dark" else "Dark"
         ctk.set_appearance_mode(new_mode)
+        if self.article_list:
+            self.article_list.set_colors(self._list_colors())
         self.log(f"🎨 Тема: {new_mode}")
 
+    @staticmethod
+    def _list_colors():
+        return DARK_COLORS if ctk.get_appearance_mode() == "Dark" else LIGHT_COLORS
+
+    def _article_rows(self, start, stop):
+        rows = []
+        for title, source, published in self.articles.headlines(start, stop):
+            when = datetime.fromtimestamp(published).strftime("%d.%m %H:%M") if published else "—"
+            rows.append((title or "Без заголовка", f"{source} • {when}"))
+        return rows
+
+    def _set_articles(self, ids, current=-1):
+        # Новая выборка для показа: в памяти только id, строки списка дорисуются по мере прокрутки
+        self.articles = ArticleList(self.store, ids)
+        if self.article_list:
+            self.article_list.set_count(len(ids), current)
+
     def toggle_auto_tts(self):
         self.auto_tts = bool(self.auto_tts_switch.get())
+        if not self.auto_tts:
+            self.tts.stop()
 
     def toggle_auto_advance(self):
         self.auto_advance = bool(self.auto_advance_switch.get())
@@ -472,14 +895,10 @@ class FreshRSSPro:
     def toggle_favorite(self):
         if 0 <= self.current_index < len(self.articles):
             art = self.articles[self.current_index]
-            key = f"{art.get('link', '')}|{art.get('title', '')}"
-            if key in self.favorites:
-                self.favorites.discard(key)
-                self.favorite_btn.configure(text="🤍 В избранное")
-            else:
-                self.favorites.add(key)
+            if self.engine.toggle_favorite(art["id"]):
                 self.favorite_btn.configure(text="❤️ В избранном")
-            self.save_favorites()
+            else:
+                self.favorite_btn.configure(text="🤍 В избранное")
 
     def export_article(self):
         if not (0 <= self.current_index < len(self.articles)):
@@ -493,7 +912,7 @@ class FreshRSSPro:
             filetypes=[("Text", "*.txt"), ("HTML", "*.html")]
         )
         if path:
-            content = self._clean_text(art.get("full_text", art.get("summary", "")))
+            content = self._article_text(art)
             try:
                 with open(path, "w", encoding="utf-8") as f:
                     if path.endswith(".html"):
@@ -504,116 +923,243 @@ class FreshRSSPro:
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Не удалось сохранить:\n{e}")
 
+    def show_stats_window(self):
+        # Метрики ядра и окна: источники, кэши, время обновления, поиска и показа статьи
+        window = ctk.CTkToplevel(self.root)
+        window.title("📊 Статистика")
+        window.geometry("900x600")
+        text = ctk.CTkTextbox(window, wrap="none", font=("Consolas", 11))
+        text.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+
+        def update():
+            if not window.winfo_exists():
+                return
+            position = text.yview()[0]
+            text.configure(state="normal")
+            text.delete("0.0", "end")
+            text.insert("0.0", self.metrics.report())
+            text.configure(state="disabled")
+            text.yview_moveto(position)
+            window.after(STATS_REFRESH_MS, update)
+
+        def copy_json():
+            self.root.clipboard_clear()
+            self.root.clipboard_append(self.metrics.json())
+            self.log("📋 Метрики в JSON скопированы в буфер обмена")
+
+        def save_prometheus():
+            from tkinter import filedialog
+            path = filedialog.asksaveasfilename(parent=window, initialfile="freshrss.prom", defaultextension=".prom",
+                                                filetypes=[("Prometheus", "*.prom"), ("Text", "*.txt")])
+            if path:
+                Path(path).write_text(self.metrics.prometheus(), encoding="utf-8")
+                self.log(f"💾 Метрики сохранены: {Path(path).name}")
+
+        btn_frame = ctk.CTkFrame(window)
+        btn_frame.pack(fill="x", padx=10, pady=(0, 10))
+        ctk.CTkButton(btn_frame, text="📋 JSON", command=copy_json).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="💾 Prometheus", command=save_prometheus).pack(side="left", padx=5)
+        update()
+
     def _clean_text(self, html):
         try:
-            soup = BeautifulSoup(html, "html.parser")
-            for tag in soup(["script", "style"]):
-                tag.decompose()
-            return soup.get_text(separator="\n", strip=True)
+            return clean_html(html)
         except:
             return str(html)
 
-    def load_articles(self):
+    def _article_text(self, art):
+        return plain_text(art)
+
+    def load_articles(self, forced=True):
         self.log("🔄 Загрузка всех источников...")
-        self.all_articles = []
-        threading.Thread(target=self._fetch_all_sources, daemon=True).start()
-
-    def _fetch_all_sources(self):
-        new_hashes = set()
-        for src in self.config["sources"]:
-            if src["type"] == "freshrss":
-                articles = self._fetch_freshrss_rss(src)
-            else:
-                articles = self._fetch_generic_rss(src["url"])
-            for art in articles:
-                h = hash((art.get("title", ""), art.get("link", ""), art.get("published", 0)))
-                new_hashes.add(h)
-                self.all_articles.append(art)
-
-        # Уведомление о новых статьях
-        new_articles = new_hashes - self.last_article_hashes
-        if new_articles and PLYER_AVAILABLE and new_hashes:
+        self.engine.refresh_async(forced=forced)
+
+    def show_stored_articles(self):
+        # Статьи прошлых запусков показываются сразу, до ответа источников: по снимку прошлого
+        # сеанса — та же лента, статья и поиск; без снимка — вся лента из хранилища
+        if self.restore_snapshot():
+            return True
+        ids = self.store.query_ids()
+        if not ids:
+            return False
+        self._set_articles(ids)
+        self.show_article(0)
+        return True
+
+    def restore_snapshot(self):
+        snapshot = load_snapshot(SNAPSHOT_PATH)
+        if not snapshot or not snapshot[0]:
+            return False
+        ids, state = snapshot
+        # По id, а не по номеру: перед выходом лента могла сдвинуться
+        current = state.get("current")
+        index = ids.index(current) if current in ids else min(max(int(state.get("index", 0)), 0), len(ids) - 1)
+        if not self.store.get(ids[index]):
+            return False  # статью успели удалить из хранилища — снимок устарел
+        query = state.get("query", "")
+        if query:
+            self.search_entry.insert(0, query)
+            self.search_query = query
+        if state.get("favorites"):
+            self.favorites_switch.select()
+            self.favorites_only = True
+        self._set_articles(ids, index)
+        self.show_article(index)
+        # Первое обновление сверит ленту с хранилищем, не сбивая читателя с текущей статьи
+        self.reconcile_snapshot = True
+        self.log(f"⚡ Восстановлен прошлый сеанс: {len(ids)} статей, статья {index + 1}"
+                 + (f", поиск «{query}»" if query else ""), DEBUG)
+        return True
+
+    def save_session(self, background=True):
+        # Состояние собирается в потоке Tk, сжатие и запись — в фоне
+        if not self.articles:
+            return
+        index = self.current_index
+        ids = list(self.articles.ids)
+        state = {
+            "index": index,
+            "current": ids[index] if 0 <= index < len(ids) else None,
+            "query": self.search_query,
+            "favorites": self.favorites_only,
+            "saved": int(time.time())
+        }
+
+        def write():
+            try:
+                save_snapshot(SNAPSHOT_PATH, ids, state)
+            except Exception as e:
+                self.log(f"⚠️ Не удалось сохранить снимок сеанса: {e}", WARNING)
+        if background:
+            threading.Thread(target=write, daemon=True).start()
+        else:
+            write()
+
+    def _on_batch_stored(self):
+        # Вызывается в потоке Tk: статьи каждого источника появляются в ленте сразу, как при плановом
+        # обновлении — открытая статья остаётся выбранной, а пока ничего не показано, открывается первая
+        self._merge_new_articles()
+
+    def _on_refresh_finished(self, stats):
+        # Вызывается в потоке обновления
+        new_ids = stats["new_ids"]
+        if new_ids and PLYER_AVAILABLE:
+            from plyer import notification
             notification.notify(
                 title="FreshRSS Pro",
-                message=f"Новых статей: {len(new_articles)}",
+                message=f"Новых статей: {len(new_ids)}",
                 app_name=APP_NAME,
                 timeout=5
             )
-        self.last_article_hashes = new_hashes
-
-        self.root.after(0, self._finish_loading)
-
-    def _fetch_freshrss_rss(self, src):
-        url = f"{src['url']}/i/?a=rss&user={src['user']}&token={src['token']}&hours=168"
-        self.log(f"📡 Запрос FreshRSS: {url}")
-        return self._fetch_generic_rss(url, src.get("name", "FreshRSS"))
-
-    def _fetch_generic_rss(self, feed_url, name="RSS"):
-        articles = []
-        try:
-            d = feedparser.parse(feed_url)
-            if not d.entries:
-                self.log(f"⚠️ Нет статей в {feed_url}")
-                return articles
-            for entry in d.entries[:25]:
-                pub_ts = 0
-                if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                    pub_ts = int(time.mktime(entry.published_parsed))
-                elif hasattr(entry, 'published') and entry.published:
-                    try:
-                        dt = parsedate_to_datetime(entry.published)
-                        pub_ts = int(dt.timestamp())
-                    except:
-                        pub_ts = 0
-
-                articles.append({
-                    "title": getattr(entry, 'title', 'Без заголовка'),
-                    "summary": getattr(entry, 'summary', ''),
-                    "content": getattr(entry, 'content', [{}])[0].get('value', ''),
-                    "published": pub_ts,
-                    "origin": {"title": d.feed.get("title", name)},
-                    "link": getattr(entry, 'link', ''),
-                    "image_url": self._extract_image(entry)
-                })
-        except Exception as e:
-            self.log(f"💥 Ошибка загрузки {feed_url}: {e}")
-        return articles
-
-    def _extract_image(self, entry):
-        try:
-            if hasattr(entry, 'media_content') and entry.media_content:
-                for media in entry.media_content:
-                    if media.get('medium') == 'image':
-                        return media.get('url')
-            if hasattr(entry, 'enclosures'):
-                for enc in entry.enclosures:
-                    if 'image' in enc.get('type', ''):
-                        return enc.href
-        except:
-            pass
-        return ""
+        if stats.get("forced", True):
+            self.root.after(0, self._finish_loading)
+        elif new_ids or self.reconcile_snapshot:
+            self.reconcile_snapshot = False
+            self.root.after(0, self._merge_new_articles)
+        self.root.after(0, self.save_session)
+
+    def _merge_new_articles(self):
+        # После планового обновления новые статьи добавляются в ленту, не сбивая читателя с текущей
+        self.live_search.invalidate()
+        if self.search_query or self.favorites_only:
+            return  # выдача поиска и избранное обновятся при следующем запросе
+        if self.current_index < 0:
+            self._finish_loading()
+            return
+        current = self.articles.ids[self.current_index]
+        ids = self.store.query_ids()
+        self.current_index = ids.index(current) if current in ids else 0
+        self._set_articles(ids, self.current_index)
 
+    @profiled("finish_loading")
     def _finish_loading(self):
-        if not self.all_articles:
+        self.live_search.invalidate()
+        total = self.store.count()
+        if not total:
             self.content_text.delete("0.0", "end")
             self.content_text.insert("0.0", "Нет статей.")
-            self.log("⚠️ Ни одна статья не загружена")
+            self.startup.finish("пустая лента", self.log)
+            self.log("⚠️ Ни одна статья не загружена", WARNING)
             return
-        self.all_articles.sort(key=lambda x: x.get("published", 0), reverse=True)
-        self.articles = self.all_articles[:]
-        self.current_index = 0
-        self.show_article(0)
-        self.log(f"✅ Загружено {len(self.all_articles)} статей")
+        if self.search_query:
+            # Активный поиск остаётся: выдача пересчитывается по обновлённому хранилищу
+            ids = self.live_search.query_ids(self.search_query, self.favorites_only)
+        else:
+            ids = self.store.query_ids(favorites_only=self.favorites_only)
+        current = self.articles.ids[self.current_index] if 0 <= self.current_index < len(self.articles) else None
+        if current in ids:
+            # Статьи уже показывались порциями по мере загрузки — читатель остаётся на своей
+            self.current_index = ids.index(current)
+            self._set_articles(ids, self.current_index)
+        else:
+            self._set_articles(ids)
+            self.current_index = 0 if ids else -1
+            if ids:
+                self.show_article(0)
+            else:
+                self.content_text.delete("0.0", "end")
+                self.content_text.insert("0.0", "Ничего не найдено.")
+        self.log(f"✅ В хранилище {total} статей")
+        if PIL_AVAILABLE:
+            self.log(f"🖼️ Кэш изображений — {self.image_cache_summary()}", DEBUG)
+        pre = self.prefetcher.stats()
+        self.log(f"⏩ Предзагрузка: попаданий {pre['hits']}/{pre['hits'] + pre['misses']} ({pre['hit_rate']:.0%}), "
+                 f"готово {pre['entries']} шт., {format_bytes(pre['bytes'])}", DEBUG)
+
+    def on_search_key(self, event=None):
+        # Дебаунс: поиск запускается после паузы в наборе
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DEBOUNCE_MS, self._search_if_changed)
+
+    def _search_if_changed(self):
+        self.search_job = None
+        if self.search_entry.get().strip() != self.search_query:
+            self.perform_search()
 
     def perform_search(self):
-        query = self.search_entry.get().strip().lower()
-        if not query:
-            self.articles = self.all_articles[:]
-        else:
-            self.articles = [
-                a for a in self.all_articles
-                if query in a.get("title", "").lower() or query in a.get("summary", "").lower()
-            ]
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
+        self.search_query = self.search_entry.get().strip()
+        self.live_search.submit(self.search_query, self.favorites_only)
+
+    def toggle_favorites_view(self):
+        # Избранное — та же лента с поиском, только выборка идёт через таблицу избранного
+        self.favorites_only = bool(self.favorites_switch.get())
+        self.perform_search()
+        if self.favorites_only:
+            self.log(f"⭐ Избранное: {self.store.favorites_count()} статей")
+
+    def export_favorites(self):
+        from tkinter import filedialog, messagebox
+        path = filedialog.asksaveasfilename(
+            initialfile="favorites.html",
+            defaultextension=".html",
+            filetypes=[("HTML", "*.html"), ("JSON", "*.json"), ("JSON Lines", "*.jsonl")]
+        )
+        if not path:
+            return
+
+        def work():
+            try:
+                self.engine.export_favorites(path)
+            except Exception as e:
+                message = f"Не удалось выгрузить избранное:\n{e}"
+                self.root.after(0, lambda: messagebox.showerror("Ошибка", message))
+        threading.Thread(target=work, daemon=True).start()
+
+    def _on_search_results(self, generation, query, ids, final):
+        self.root.after(0, lambda: self._show_search_results(generation, ids))
+
+    def _show_search_results(self, generation, ids):
+        if generation != self.live_search.generation:
+            return  # пока результаты шли, запрос уже сменился
+        # Дополнение первой порции: текущая статья остаётся на месте
+        if self.articles.ids and ids[:len(self.articles.ids)] == self.articles.ids and self.current_index >= 0:
+            self._set_articles(ids, self.current_index)
+            return
+        self._set_articles(ids)
         self.current_index = 0 if self.articles else -1
         if self.articles:
             self.show_article(0)
@@ -621,43 +1167,68 @@ class FreshRSSPro:
             self.content_text.delete("0.0", "end")
             self.content_text.insert("0.0", "Ничего не найдено.")
 
+    def _display_text(self, art):
+        #if ("читать далее" in summary.lower() or "read more" in summary.lower()) and NEWSPAPER_AVAILABLE and link:
+        #    self.log(f"🔍 Загрузка полной статьи: {link}")
+        #    full_text = self._fetch_full_article(link) or summary
+        return display_text(art)
+
+    @profiled("show_article")
     def show_article(self, index):
         if not self.articles or index < 0 or index >= len(self.articles):
             return
+        t0 = time.perf_counter()
+        direction = -1 if index < self.current_index else 1
         self.current_index = index
 
         art = self.articles[index]
+        if self.article_list:
+            self.article_list.select(index)
         title = art.get("title", "Без заголовка")
-        pub_time = datetime.fromtimestamp(art.get("published", 0)).strftime("%d %b %Y, %H:%M") if art.get("published") else "—"
-        origin = art.get("origin", {}).get("title", "Источник")
-        link = art.get("link", "")
-
-        summary = art.get("summary", "")
-        full_text = summary
-        #if ("читать далее" in summary.lower() or "read more" in summary.lower()) and NEWSPAPER_AVAILABLE and link:
-        #    self.log(f"🔍 Загрузка полной статьи: {link}")
-        #    full_text = self._fetch_full_article(link) or summary
-
-        display_text = f"{title}\n\n{origin} • {pub_time}\n\n{self._clean_text(full_text)}"
+        prefetched = self.prefetcher.get(art.get("id"))
+        if prefetched:
+            display_text, pil_img = prefetched
+        else:
+            display_text, pil_img = self._display_text(art), None
         self.title_label.configure(text=title)
         self.content_text.delete("0.0", "end")
         self.content_text.insert("0.0", display_text)
+        self.startup.finish("первая статья", self.log)
 
         img_url = art.get("image_url")
         if img_url and PIL_AVAILABLE:
-            self._load_image_async(img_url)
+            # Кэш картинок спрашивается один раз — повторный get() посчитал бы попадание или промах дважды
+            photo = self.image_cache.get(img_url)
+            if photo is None and pil_img is not None:
+                self.image_request = img_url
+                self._show_image(img_url, pil_img)
+            else:
+                self._load_image_async(img_url, photo)
         else:
+            self.image_request = None
             self.image_label.configure(image=None, text="")
 
-        key = f"{link}|{title}"
-        self.favorite_btn.configure(text="❤️ В избранном" if key in self.favorites else "🤍 В избранное")
+        self.favorite_btn.configure(text="❤️ В избранном" if self.store.is_favorite(art.get("id")) else "🤍 В избранное")
 
-        if self.auto_tts and self.tts_engine:
-            try:
-                self.tts_engine.stop()
-            except:
-                pass
-            threading.Thread(target=lambda: self.speak_text(display_text), daemon=True).start()
+        if self.auto_tts:
+            # Прошлая статья обрывается, эта читается с первого предложения, следующие записываются заранее
+            self.tts.speak(display_text, art.get("id"))
+            self._schedule_prerender(index, direction)
+
+        self._schedule_prefetch(index, direction)
+        # Картинка догружается асинхронно и в замер не входит
+        self.metrics.observe("show_article", time.perf_counter() - t0)
+
+    def _schedule_prerender(self, index, direction):
+        ahead = int(self.config.get("tts_prerender", DEFAULT_TTS_PRERENDER))
+        upcoming = [index + direction * k for k in range(1, ahead + 1)]
+        self.tts.prerender([(self.articles[i].get("id"), self._display_text(self.articles[i]))
+                            for i in upcoming if 0 <= i < len(self.articles)])
+
+    def _schedule_prefetch(self, index, direction):
+        ahead = int(self.config.get("prefetch_ahead", DEFAULT_PREFETCH_AHEAD))
+        upcoming = [index + direction * k for k in range(1, ahead + 1)]
+        self.prefetcher.schedule([self.articles[i] for i in upcoming if 0 <= i < len(self.articles)])
 
     #def _fetch_full_article(self, url):
       #  try:
@@ -669,29 +1240,63 @@ class FreshRSSPro:
        #     self.log(f"⚠️ Не удалось загрузить полную статью: {e}")
        #     return None
 
-    def _load_image_async(self, url):
+    def _load_image_async(self, url, photo=None):
+        # photo — картинка, уже найденная вызывающим в кэше картинок
+        self.image_request = url
+        if photo is not None:
+            self.image_label.configure(image=photo, text="")
+            return
+
         def worker():
             try:
-                if url in self.image_cache:
-                    img = self.image_cache[url]
-                else:
-                    response = requests.get(url, timeout=5)
-                    img_data = response.content
-                    pil_img = Image.open(BytesIO(img_data)).convert("RGBA")
-                    max_size = (800, 400)
-                    pil_img.thumbnail(max_size, Image.LANCZOS)
-                    img = ImageTk.PhotoImage(pil_img)
-                    self.image_cache[url] = img
-                self.root.after(0, lambda: self.image_label.configure(image=img, text=""))
+                pil_img = self._load_thumbnail(url)
+                self.root.after(0, lambda: self._show_image(url, pil_img))
             except Exception as e:
-                self.root.after(0, lambda: self.image_label.configure(image=None, text=""))
-                self.log(f"🖼️ Ошибка загрузки изображения: {e}")
+                self.root.after(0, lambda: self._show_image(url, None))
+                self.log(f"🖼️ Ошибка загрузки изображения: {e}", DEBUG)
         threading.Thread(target=worker, daemon=True).start()
 
+    def _load_thumbnail(self, url):
+        # Сначала дисковый кэш уже уменьшенных картинок, затем сеть
+        from PIL import Image
+        key = f"{url}|{THUMB_SIZE[0]}x{THUMB_SIZE[1]}"
+        data = self.thumb_cache.get(key)
+        if data is not None:
+            return Image.open(BytesIO(data))
+        response = self.engine.http.get(url, timeout=5, max_bytes=IMAGE_MAX_BYTES)
+        response.raise_for_status()
+        pil_img = Image.open(BytesIO(response.content)).convert("RGBA")
+        pil_img.thumbnail(THUMB_SIZE, Image.LANCZOS)
+        buf = BytesIO()
+        if pil_img.getextrema()[3][0] < 255:
+            pil_img.save(buf, "PNG", optimize=True)
+        else:
+            pil_img.convert("RGB").save(buf, "JPEG", quality=85)
+        self.thumb_cache.put(key, buf.getvalue())
+        return pil_img
+
+    def _show_image(self, url, pil_img):
+        # PhotoImage создаётся только в потоке Tk
+        if pil_img is None:
+            if self.image_request == url:
+                self.image_label.configure(image=None, text="")
+            return
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(pil_img)
+        self.image_cache.put(url, photo, pil_img.width * pil_img.height * 4)
+        # Пока картинка грузилась, пользователь мог перейти к другой статье
+        if self.image_request == url:
+            self.image_label.configure(image=photo, text="")
+
+    def image_cache_summary(self):
+        mem, disk = self.image_cache.stats(), self.thumb_cache.stats()
+        return (f"память {format_bytes(mem['bytes'])}/{format_bytes(mem['max_bytes'])} "
+                f"({mem['entries']} шт., попаданий {mem['hit_rate']:.0%}, вытеснено {mem['evictions']}) | "
+                f"диск {format_bytes(disk['bytes'])}/{format_bytes(disk['max_bytes'])} "
+                f"(попаданий {disk['hit_rate']:.0%}, просрочено {disk['expired']}, вытеснено {disk['evictions']})")
+
     def speak_text(self, text):
-        if self.tts_engine:
-            self.tts_engine.say(text)
-            self.tts_engine.runAndWait()
+        self.tts.speak(text)
 
     def next_article(self):
         if self.articles and self.current_index < len(self.articles) - 1:
@@ -711,22 +1316,34 @@ class FreshRSSPro:
     def _fetch_weather(self):
         city = self.config.get("weather_city", DEFAULT_WEATHER_CITY)
         try:
-            r = requests.get(f"https://wttr.in/{city}?format=4", timeout=10)
+            r = self.engine.http.get(f"https://wttr.in/{city}?format=4", timeout=10, max_bytes=WEATHER_MAX_BYTES)
             if r.status_code == 200:
                 self.weather = r.text.strip()
             else:
                 self.weather = "—"
         except Exception as e:
-            self.log(f"🌦️ Ошибка погоды: {e}")
+            self.log(f"🌦️ Ошибка погоды: {e}", WARNING)
             self.weather = "—"
 
     def start_rss_updater(self):
         self.stop_rss_updater.clear()
         interval = self.config.get("rss_update_interval", 3600)
         def loop():
-            while not self.stop_rss_updater.wait(interval):
-                self.log("🔁 Автообновление RSS...")
-                self.load_articles()
+            if not self.config.get("adaptive_refresh", True):
+                while not self.stop_rss_updater.wait(interval):
+                    self.log("🔁 Автообновление RSS...")
+                    self.load_articles()
+                return
+            # У каждого источника свой срок (см. scheduler.py): просыпаемся к ближайшему
+            # и обновляем только те источники, чей срок подошёл. Пока идёт другое обновление
+            # (полное при запуске, по кнопке), плановый проход пропускается, а срок считается
+            # после него: иначе ещё не запланированные источники «подходят» каждые несколько секунд.
+            while True:
+                busy = self.engine.refresh_lock.locked()
+                if self.stop_rss_updater.wait(REFRESH_BUSY_POLL if busy else self.engine.seconds_until_due()):
+                    return
+                if not self.engine.refresh_lock.locked():
+                    self.engine.refresh_due()
         self.rss_updater_thread = threading.Thread(target=loop, daemon=True)
         self.rss_updater_thread.start()
 
@@ -739,6 +1356,7 @@ class FreshRSSPro:
     def setup_tray(self):
         if not TRAY_AVAILABLE:
             return
+        import pystray
 
         def on_open(icon, item):
             self.root.after(0, self.restore_from_tray)
@@ -749,7 +1367,7 @@ class FreshRSSPro:
             self.root.quit()
 
         def update_title(icon):
-            count = len(self.all_articles)
+            count = self.store.count()
             return f"Статей: {count}"
 
         menu = (
@@ -792,18 +1410,27 @@ class FreshRSSPro:
 
     def on_closing(self):
         if self.config.get("minimize_to_tray", True):
+            self.save_session()
             self.minimize_to_tray()
         else:
             self.stop_rss_updater.set()
             if self.tray_icon:
                 self.tray_icon.stop()
+            self.tts.close()
+            self.applog.close_file()
             self.root.destroy()
 
     def run(self):
         self.root.mainloop()
+        # Выход — из окна или из меню трея
+        self.save_session(background=False)
 
 
 # === Запуск ===
 if __name__ == "__main__":
-    app = FreshRSSPro()
+    parser = argparse.ArgumentParser(description=f"{APP_NAME} {VERSION}")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="вывести время каждой фазы запуска — от импорта до первой статьи")
+    args = parser.parse_args()
+    app = FreshRSSPro(startup_profile=args.startup_profile)
     app.run()
@@ -0,0 +1,217 @@
+import time
+import random
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+
+# === Общий HTTP-клиент ===
+# Ленты, картинки, погода и Google Reader API ходят в сеть через один HttpClient:
+#   - одна requests.Session с пулом соединений — keep-alive и TLS-сессии переиспользуются;
+#   - сжатие ответов (gzip/deflate, а с установленным brotli — и br) — его согласует сама requests;
+#   - повтор при обрыве соединения и ответах 429/502/503/504 — не больше retries раз,
+#     с экспоненциальной паузой и случайным разбросом, Retry-After учитывается;
+#   - не больше per_host одновременных запросов к одному хосту и не чаще min_interval между ними;
+#   - ответ читается порциями и обрывается, если распакованный размер превысил max_bytes;
+#   - по каждому хосту копятся запросы, ошибки, повторы, время и байты (распакованные и по сети).
+
+DEFAULT_PER_HOST = 4             # одновременных запросов к одному хосту
+DEFAULT_MIN_INTERVAL = 0.0       # сек. между началом запросов к одному хосту
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5            # сек.: пауза перед первым повтором, дальше удваивается
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+MAX_RETRY_WAIT = 10              # сек.: более долгий Retry-After — забота расписания, а не повтора
+POOL_HOSTS = 32                  # хостов, чьи пулы соединений держатся открытыми
+CHUNK_SIZE = 64 * 1024
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+def retry_after(headers, now=None):
+    # Retry-After в секундах или HTTP-дате -> сек. ожидания; None, если заголовка нет
+    value = (headers.get("Retry-After") or "").strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - (now or time.time()), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostStats:
+    __slots__ = ("requests", "errors", "retries", "bytes", "wire_bytes", "seconds", "max_seconds")
+
+    def __init__(self):
+        self.requests = self.errors = self.retries = self.bytes = self.wire_bytes = 0
+        self.seconds = self.max_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "wire_bytes": self.wire_bytes,
+            "seconds": self.seconds,
+            "avg_ms": self.seconds / self.requests * 1000 if self.requests else 0.0,
+            "max_ms": self.max_seconds * 1000
+        }
+
+
+class HttpClient:
+    def __init__(self, user_agent=None, timeout=(5, 20), per_host=DEFAULT_PER_HOST, min_interval=DEFAULT_MIN_INTERVAL,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_bytes=DEFAULT_MAX_BYTES):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.per_host = max(int(per_host), 1)
+        self.min_interval = float(min_interval)
+        self.retries = max(int(retries), 0)
+        self.backoff = float(backoff)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.session = None
+        self.slots = {}         # хост -> семафор одновременных запросов
+        self.next_start = {}    # хост -> время (monotonic), раньше которого новый запрос не начинается
+        self.hosts = {}         # хост -> HostStats
+
+    def _session(self):
+        # requests грузится при первом запросе, а не при импорте модуля
+        with self.lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                # Запросов к хосту одновременно не больше per_host — столько соединений и держим
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=self.per_host)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                if self.user_agent:
+                    session.headers["User-Agent"] = self.user_agent
+                self.session = session
+            return self.session
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, max_bytes=None, retries=None, truncate=False, **kwargs):
+        # -> requests.Response с уже прочитанным телом; исключения — как у requests
+        # (плюс ResponseTooLarge). Повторяются только GET: POST может быть неидемпотентным.
+        # truncate=True — вместо ResponseTooLarge тело обрезается до max_bytes (для проверки начала документа).
+        import requests
+        session = self._session()
+        kwargs.setdefault("timeout", self.timeout)
+        host = (urlsplit(url).hostname or "").lower()
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        attempts = 1 + (self.retries if retries is None else retries) if method == "GET" else 1
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            t0 = time.perf_counter()
+            try:
+                with self._slot(host):
+                    response = session.request(method, url, stream=True, **kwargs)
+                    try:
+                        size, wire = self._read(response, limit, truncate)
+                    finally:
+                        response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(host, time.perf_counter() - t0, error=True)
+                if last or isinstance(e, requests.ReadTimeout):
+                    # Таймаут чтения уже съел read_timeout — повтор растянул бы цикл обновления
+                    raise
+                self._wait(host, self._delay(attempt))
+                continue
+            except Exception:
+                self._record(host, time.perf_counter() - t0, error=True)
+                raise
+            retry = response.status_code in RETRY_STATUSES and not last
+            self._record(host, time.perf_counter() - t0, size, wire, error=response.status_code >= 400)
+            if retry:
+                wait = retry_after(response.headers)
+                if wait is None or wait <= MAX_RETRY_WAIT:
+                    self._wait(host, self._delay(attempt) if wait is None else wait)
+                    continue
+            return response
+
+    @contextmanager
+    def _slot(self, host):
+        with self.lock:
+            slot = self.slots.get(host)
+            if slot is None:
+                slot = self.slots[host] = threading.BoundedSemaphore(self.per_host)
+        with slot:
+            if self.min_interval > 0:
+                with self.lock:
+                    now = time.monotonic()
+                    start = max(now, self.next_start.get(host, 0.0))
+                    self.next_start[host] = start + self.min_interval
+                if start > now:
+                    time.sleep(start - now)
+            yield
+
+    @staticmethod
+    def _read(response, limit, truncate=False):
+        # Тело читается порциями: огромный или бесконечный ответ обрывается на limit байтах
+        length = response.headers.get("Content-Length", "")
+        if limit and not truncate and length.isdigit() \
+                and response.headers.get("Content-Encoding") in (None, "identity") and int(length) > limit:
+            raise ResponseTooLarge(f"ответ {int(length)} байт больше предела {limit}")
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if limit and size + len(chunk) > limit:
+                if not truncate:
+                    raise ResponseTooLarge(f"ответ больше предела {limit} байт")
+                chunks.append(chunk[:limit - size])
+                size = limit
+                break
+            size += len(chunk)
+            chunks.append(chunk)
+        # Прочитанное тело отдаётся как обычный response.content
+        response._content = b"".join(chunks)
+        wire = response.raw.tell() if hasattr(response.raw, "tell") else size
+        return size, wire or size
+
+    def _delay(self, attempt):
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _wait(self, host, seconds):
+        with self.lock:
+            self.hosts.setdefault(host, HostStats()).retries += 1
+        time.sleep(seconds)
+
+    def _record(self, host, seconds, size=0, wire=0, error=False):
+        with self.lock:
+            stats = self.hosts.setdefault(host, HostStats())
+            stats.requests += 1
+            stats.errors += error
+            stats.bytes += size
+            stats.wire_bytes += wire
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def stats(self):
+        # хост -> счётчики; самые медленные в сумме хосты первыми
+        with self.lock:
+            items = sorted(self.hosts.items(), key=lambda item: -item[1].seconds)
+            return {host: stats.as_dict() for host, stats in items}
+
+    def summary(self, top=5):
+        stats = self.stats()
+        if not stats:
+            return "запросов не было"
+        count = sum(s["requests"] for s in stats.values())
+        size = sum(s["bytes"] for s in stats.values())
+        wire = sum(s["wire_bytes"] for s in stats.values())
+        slowest = ", ".join(f"{host} {s['avg_ms']:.0f}/{s['max_ms']:.0f} мс" for host, s in list(stats.items())[:top])
+        return (f"хостов {len(stats)}, запросов {count}, повторов {sum(s['retries'] for s in stats.values())}, "
+                f"ошибок {sum(s['errors'] for s in stats.values())}, "
+                f"по сети {wire / 1048576:.1f} из {size / 1048576:.1f} МБ | медленные (сред./макс.): {slowest}")
@@ -0,0 +1,183 @@
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# === Двухуровневый кэш изображений: LRU в памяти + миниатюры на диске ===
+
+
+class LRUCache:
+    # Вытесняет давно не использованные записи, как только суммарный размер превысит бюджет.
+    # Потокобезопасности нет намеренно: для PhotoImage кэш используется только из потока Tk.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()  # key -> (value, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, value, size):
+        if key in self.items:
+            self.size -= self.items.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self.items[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, old_size) = self.items.popitem(last=False)
+            self.size -= old_size
+            self.evictions += 1
+
+    def clear(self):
+        self.items.clear()
+        self.size = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.items),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+THUMBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thumbs (
+    key      TEXT PRIMARY KEY,
+    digest   TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    created  INTEGER NOT NULL,
+    accessed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_thumbs_accessed ON thumbs(accessed);
+CREATE INDEX IF NOT EXISTS idx_thumbs_digest ON thumbs(digest);
+"""
+
+
+class ThumbnailCache:
+    # Уже уменьшенные изображения на диске. Файлы адресуются хешем содержимого
+    # (одинаковая картинка по разным URL хранится один раз), а индекс url -> хеш лежит в SQLite.
+    def __init__(self, directory, max_bytes, ttl):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.dir / "index.db"), check_same_thread=False)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        with self.lock:
+            self.conn.executescript(THUMBS_SCHEMA)
+            self.conn.commit()
+            self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM thumbs)").fetchone()[0]
+
+    def _blob_path(self, digest):
+        return self.dir / digest[:2] / f"{digest}.bin"
+
+    def get(self, key):
+        now = int(time.time())
+        with self.lock:
+            row = self.conn.execute("SELECT digest, created FROM thumbs WHERE key = ?", (key,)).fetchone()
+            if row and row[1] + self.ttl < now:
+                self._remove(key, row[0])
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                data = self._blob_path(row[0]).read_bytes()
+            except OSError:
+                self._remove(key, row[0])
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE thumbs SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        digest = hashlib.sha256(data).hexdigest()
+        now = int(time.time())
+        with self.lock:
+            path = self._blob_path(digest)
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                tmp.replace(path)
+                self.size += len(data)
+            old = self.conn.execute("SELECT digest FROM thumbs WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO thumbs (key, digest, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, digest, len(data), now, now))
+            if old and old[0] != digest:
+                self._drop_blob_if_unused(old[0])
+            self.conn.commit()
+            if self.size > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def prune(self):
+        # Удаляет просроченные миниатюры и ужимает кэш до лимита — вызывается в фоне при старте
+        with self.lock:
+            expired = self.conn.execute(
+                "SELECT key, digest FROM thumbs WHERE created < ?", (int(time.time()) - self.ttl,)).fetchall()
+            for key, digest in expired:
+                self._remove(key, digest)
+            self.expired += len(expired)
+            if self.size > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self.conn.commit()
+
+    def _evict(self, target):
+        cur = self.conn.execute("SELECT key, digest FROM thumbs ORDER BY accessed")
+        for key, digest in cur.fetchall():
+            if self.size <= target:
+                break
+            self._remove(key, digest)
+            self.evictions += 1
+        self.conn.commit()
+
+    def _remove(self, key, digest):
+        self.conn.execute("DELETE FROM thumbs WHERE key = ?", (key,))
+        self._drop_blob_if_unused(digest)
+
+    def _drop_blob_if_unused(self, digest):
+        if self.conn.execute("SELECT 1 FROM thumbs WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+            return
+        path = self._blob_path(digest)
+        try:
+            self.size -= path.stat().st_size
+            path.unlink()
+        except OSError:
+            pass
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
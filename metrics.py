@@ -0,0 +1,232 @@
+import re
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# === Метрики приложения ===
+# Замеры, которые раньше были только строками журнала, копятся здесь:
+#   timings    — длительности операций (обновление, поиск, показ статьи): число, сумма, максимум,
+#                p50/p95 по последним TIMING_SAMPLES замерам;
+#   counters   — счётчики событий (обновлений, новых статей, ошибок источников);
+#   sources    — последний запрос каждого источника: время, байты, код ответа, разбор, статьи, новые;
+#   collectors — функции, которые в момент снимка отдают состояние кэшей и пулов.
+# snapshot() — всё вместе словарём (для JSON и окна статистики), prometheus() — в текстовом
+# формате Prometheus (для node_exporter textfile collector и т. п.).
+
+TIMING_SAMPLES = 512
+PROMETHEUS_PREFIX = "freshrss"
+
+# Поля сведений об источнике (см. FreshRSSEngine._source_info), выводимые в Prometheus
+SOURCE_GAUGES = {
+    "seconds": "source_fetch_seconds",
+    "bytes": "source_bytes",
+    "status": "source_http_status",
+    "parse_seconds": "source_parse_seconds",
+    "store_seconds": "source_store_seconds",
+    "entries": "source_entries",
+    "new": "source_new_articles"
+}
+
+
+class Timing:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=TIMING_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def as_dict(self):
+        samples = sorted(self.samples)
+        pick = lambda q: samples[min(int(len(samples) * q), len(samples) - 1)] * 1000 if samples else 0.0
+        return {
+            "count": self.count,
+            "seconds": self.total,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": pick(0.5),
+            "p95_ms": pick(0.95),
+            "max_ms": self.max * 1000
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.timings = {}
+        self.counters = {}
+        self.sources = {}       # url источника -> сведения о последнем запросе и итоги по всем
+        self.collectors = {}    # имя -> (функция, имя метки или None)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.add(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_collector(self, name, collect, label=None):
+        # collect() -> {показатель: число}; с label — {значение метки: {показатель: число}}
+        self.collectors[name] = (collect, label)
+
+    def record_refresh(self, stats):
+        self.observe("refresh", stats["seconds"])
+        self.count("refreshes")
+        self.count("new_articles", len(stats["new_ids"]))
+        with self.lock:
+            for info in stats["sources"]:
+                key = info.get("url") or info.get("name", "")
+                previous = self.sources.get(key, {})
+                fetches = previous.get("fetches", 0) + 1
+                errors = previous.get("errors", 0) + bool(info.get("error"))
+                total = previous.get("total_seconds", 0.0) + info.get("seconds", 0.0)
+                self.sources[key] = {
+                    **{k: v for k, v in info.items() if k != "published"},
+                    "fetches": fetches,
+                    "errors": errors,
+                    "total_seconds": total,
+                    "avg_seconds": total / fetches,
+                    "time": stats.get("started", time.time())
+                }
+        self.count("source_errors", sum(1 for info in stats["sources"] if info.get("error")))
+
+    def snapshot(self):
+        with self.lock:
+            result = {
+                "time": time.time(),
+                "uptime": time.time() - self.started,
+                "timings": {name: timing.as_dict() for name, timing in self.timings.items()},
+                "counters": dict(self.counters),
+                "sources": {key: dict(info) for key, info in self.sources.items()},
+                "collectors": {}
+            }
+        for name, (collect, _) in list(self.collectors.items()):
+            try:
+                result["collectors"][name] = collect()
+            except Exception as e:
+                result["collectors"][name] = {"error": str(e)}
+        return result
+
+    def json(self, indent=2):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def prometheus(self, prefix=PROMETHEUS_PREFIX):
+        snapshot = self.snapshot()
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        family("uptime_seconds", "gauge", "Время работы процесса")
+        lines.append(f"{prefix}_uptime_seconds {snapshot['uptime']:.3f}")
+        for name, timing in sorted(snapshot["timings"].items()):
+            metric = f"{_metric_name(name)}_seconds"
+            family(metric, "summary", f"Длительность: {name}")
+            for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms")):
+                lines.append(f'{prefix}_{metric}{{quantile="{quantile}"}} {timing[key] / 1000:.6f}')
+            lines.append(f"{prefix}_{metric}_sum {timing['seconds']:.6f}")
+            lines.append(f"{prefix}_{metric}_count {timing['count']}")
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{_metric_name(name)}_total"
+            family(metric, "counter", f"Счётчик: {name}")
+            lines.append(f"{prefix}_{metric} {value}")
+
+        sources = snapshot["sources"]
+        for field, metric in SOURCE_GAUGES.items():
+            values = [(key, info.get(field)) for key, info in sources.items() if _number(info.get(field))]
+            if values:
+                family(metric, "gauge", f"Последний запрос источника: {field}")
+                lines += [f'{prefix}_{metric}{{source="{_label(key)}"}} {value}' for key, value in values]
+        if sources:
+            family("source_up", "gauge", "1 — последний запрос источника прошёл без ошибки")
+            lines += [f'{prefix}_source_up{{source="{_label(key)}"}} {int(not info.get("error"))}'
+                      for key, info in sources.items()]
+            family("source_errors_total", "counter", "Ошибок источника с запуска")
+            lines += [f'{prefix}_source_errors_total{{source="{_label(key)}"}} {info["errors"]}'
+                      for key, info in sources.items()]
+
+        for name, values in sorted(snapshot["collectors"].items()):
+            label = self.collectors[name][1]
+            rows = values.items() if label else [(None, values)]
+            series = {}
+            for label_value, fields in rows:
+                if not isinstance(fields, dict):
+                    continue
+                for field, value in fields.items():
+                    if _number(value):
+                        labels = f'{{{label}="{_label(label_value)}"}}' if label else ""
+                        series.setdefault(field, []).append(f"{labels} {value}")
+            for field, items in sorted(series.items()):
+                metric = f"{_metric_name(name)}_{_metric_name(field)}"
+                family(metric, "gauge", f"{name}: {field}")
+                lines += [f"{prefix}_{metric}{item}" for item in items]
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        # Снимок в виде текста для окна статистики
+        snapshot = self.snapshot()
+        lines = [f"Время работы: {snapshot['uptime'] / 60:.0f} мин", "", "Операции:"]
+        lines.append(f"  {'':<16} {'раз':>6} {'p50, мс':>9} {'p95, мс':>9} {'макс, мс':>9}")
+        for name, t in sorted(snapshot["timings"].items()):
+            lines.append(f"  {name:<16} {t['count']:6d} {t['p50_ms']:9.1f} {t['p95_ms']:9.1f} {t['max_ms']:9.1f}")
+        if snapshot["counters"]:
+            lines += ["", "Счётчики: " + ", ".join(f"{k} {v}" for k, v in sorted(snapshot["counters"].items()))]
+        if snapshot["sources"]:
+            lines += ["", "Источники (последнее обновление, медленные сверху):",
+                      f"  {'источник':<32} {'код':>4} {'время, с':>9} {'разбор, с':>9} {'КБ':>8} "
+                      f"{'статей':>7} {'новых':>6} {'ошибок':>7}"]
+            for info in sorted(snapshot["sources"].values(), key=lambda i: -i.get("seconds", 0.0)):
+                status = info.get("error") and "ERR" or info.get("status") or "—"
+                lines.append(f"  {info.get('name', '')[:32]:<32} {status:>4} {info.get('seconds', 0.0):9.2f} "
+                             f"{info.get('parse_seconds', 0.0):9.3f} {info.get('bytes', 0) / 1024:8.0f} "
+                             f"{info.get('entries', 0):7d} {info.get('new', 0):6d} {info['errors']:7d}")
+        for name, values in sorted(snapshot["collectors"].items()):
+            label = self.collectors[name][1]
+            lines += ["", f"{name}:"]
+            rows = values.items() if label else [("", values)]
+            for label_value, fields in rows:
+                if not isinstance(fields, dict):
+                    fields = {"": fields}
+                shown = ", ".join(f"{k} {_format(k, v)}" for k, v in fields.items())
+                lines.append(f"  {label_value + ': ' if label_value else ''}{shown}")
+        return "\n".join(lines)
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(key, value):
+    if key.endswith("rate") and _number(value):
+        return f"{value:.0%}"
+    if key.endswith("bytes") and _number(value):
+        return f"{value / 1048576:.1f} МБ"
+    return f"{value:.1f}" if isinstance(value, float) else str(value)
@@ -0,0 +1,78 @@
+import os
+from pathlib import Path
+from xml.etree.ElementTree import iterparse, ParseError
+from xml.sax.saxutils import quoteattr, escape
+
+# === Импорт и экспорт списка источников в OPML ===
+# OPML — формат, в котором читалки (FreshRSS, Feedly, Inoreader, NetNewsWire) отдают подписки:
+# <outline xmlUrl="..." text="..."/>, вложенные <outline> — папки. Файл читается потоково
+# (iterparse): разобранные элементы сразу освобождаются, поэтому выгрузка на десятки тысяч
+# лент не строит дерево в памяти. Запись — построчно, через временный файл.
+
+OPML_TYPES = ("rss", "atom", "")   # type у outline с лентой; другие (link, include) пропускаются
+
+
+class OpmlError(Exception):
+    pass
+
+
+def iter_opml(path):
+    # -> {"url", "title", "folder"} для каждой ленты в порядке файла; folder — путь папок через "/"
+    stack = []      # открытые элементы
+    folders = []    # заголовки открытых outline; "" — outline, который сам лента
+    try:
+        for event, elem in iterparse(str(path), events=("start", "end")):
+            if event == "start":
+                if not stack and elem.tag != "opml":
+                    raise OpmlError(f"не OPML: корневой элемент {elem.tag}")
+                stack.append(elem)
+                if elem.tag == "outline":
+                    folders.append("" if _url(elem) else (elem.get("title") or elem.get("text") or "").strip())
+                continue
+            stack.pop()
+            if elem.tag != "outline":
+                continue
+            folders.pop()
+            url = _url(elem)
+            if url and elem.get("type", "rss").lower() in OPML_TYPES:
+                yield {
+                    "url": url,
+                    "title": (elem.get("title") or elem.get("text") or "").strip(),
+                    "folder": "/".join(f for f in folders if f)
+                }
+            # Разобранный outline не копится в дереве
+            stack[-1].remove(elem)
+    except ParseError as e:
+        raise OpmlError(f"не OPML: {e}") from e
+
+
+def _url(outline):
+    return (outline.get("xmlUrl") or outline.get("xmlurl") or "").strip()
+
+
+def write_opml(path, sources, title="FreshRSS Pro"):
+    # sources — {"url", "name", "folder"?}; папки группируются в порядке первого появления. -> записано лент
+    groups = {}
+    for src in sources:
+        groups.setdefault(src.get("folder", ""), []).append(src)
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<opml version="2.0">\n')
+        f.write(f"  <head><title>{escape(title)}</title></head>\n  <body>\n")
+        for folder, items in groups.items():
+            indent = "    "
+            if folder:
+                f.write(f"    <outline text={quoteattr(folder)} title={quoteattr(folder)}>\n")
+                indent = "      "
+            for src in items:
+                name = src.get("name") or src["url"]
+                f.write(f'{indent}<outline type="rss" text={quoteattr(name)} title={quoteattr(name)} '
+                        f'xmlUrl={quoteattr(src["url"])}/>\n')
+                count += 1
+            if folder:
+                f.write("    </outline>\n")
+        f.write("  </body>\n</opml>\n")
+    os.replace(tmp, path)
+    return count
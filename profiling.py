@@ -0,0 +1,169 @@
+import io
+import os
+import time
+import pstats
+import cProfile
+import functools
+import threading
+import tracemalloc
+from pathlib import Path
+
+from applog import DEBUG, INFO, WARNING
+
+# === Профилирование по запросу ===
+# Включается переменной окружения FRESHRSS_PROFILE=1 или флажком в настройках ("profiling").
+# Методы, помеченные @profiled, выполняются под cProfile и tracemalloc: на каждый вызов
+# в каталоге profiles/ пишутся <время>-<имя>.prof (pstats — для snakeviz, pstats, gprof2dot)
+# и .txt с топом функций и мест выделения памяти, а короткий топ уходит в журнал.
+# cProfile видит только свой поток, поэтому вызовы @profiled(worker=True) из рабочих потоков
+# (загрузка источников) профилируются отдельно и вливаются в открытый сеанс обновления.
+# Выключенный профилировщик обходится одной проверкой флага на вызов.
+
+PROFILE_ENV = "FRESHRSS_PROFILE"
+DEFAULT_TOP = 10          # строк топа в журнале
+REPORT_TOP = 40           # строк топа в .txt
+TRACE_FRAMES = 5          # глубина стека для tracemalloc
+PROFILE_KEEP = 50         # последних сеансов на диске
+
+
+def env_enabled():
+    return os.environ.get(PROFILE_ENV, "").strip().lower() not in ("", "0", "false", "no")
+
+
+def profiled(name, worker=False):
+    # Декоратор метода; профилировщик берётся из self.profiler (None — не профилировать)
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if profiler is None or not profiler.enabled:
+                return func(self, *args, **kwargs)
+            if worker:
+                return profiler.run_worker(func, self, *args, **kwargs)
+            return profiler.run(name, func, self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Session:
+    def __init__(self, name):
+        self.name = name
+        self.profile = cProfile.Profile()
+        self.workers = []          # профили вызовов из рабочих потоков
+        self.lock = threading.Lock()
+        self.memory = None         # снимок tracemalloc в начале сеанса
+        self.started = time.perf_counter()
+
+
+class Profiler:
+    def __init__(self, out_dir, log=None, enabled=False, top=DEFAULT_TOP):
+        self.out_dir = Path(out_dir)
+        self.log = log or (lambda msg, level=None: None)
+        self.enabled = enabled
+        self.top = top
+        self.lock = threading.Lock()
+        self.local = threading.local()   # сеанс, открытый в этом потоке
+        self.current = None              # последний открытый сеанс — в него вливаются рабочие потоки
+        self.tracing = 0                 # сеансов, которым нужен tracemalloc
+        self.owns_tracing = False        # tracemalloc запущен нами, а не, например, бенчмарком
+
+    def run(self, name, func, *args, **kwargs):
+        if getattr(self.local, "session", None) is not None:
+            # Вложенный вызов (показ статьи из _finish_loading) уже попадает во внешний профиль
+            return func(*args, **kwargs)
+        session = Session(name)
+        try:
+            session.profile.enable()
+        except ValueError as e:
+            # Python 3.12+: одновременно может работать только один cProfile
+            self.log(f"🔬 Профиль {name} пропущен: {e}", DEBUG)
+            return func(*args, **kwargs)
+        self._start_tracing(session)
+        self.local.session = session
+        with self.lock:
+            previous, self.current = self.current, session
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session.profile.disable()
+            self.local.session = None
+            with self.lock:
+                self.current = previous if self.current is session else self.current
+            try:
+                self._finish(session)
+            except Exception as e:
+                self.log(f"⚠️ Не удалось сохранить профиль {name}: {e}", WARNING)
+
+    def run_worker(self, func, *args, **kwargs):
+        session = self.current
+        if session is None or getattr(self.local, "session", None) is not None:
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            with session.lock:
+                session.workers.append(profile)
+
+    def _start_tracing(self, session):
+        with self.lock:
+            self.tracing += 1
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACE_FRAMES)
+                self.owns_tracing = True
+        session.memory = tracemalloc.take_snapshot()
+
+    def _stop_tracing(self):
+        with self.lock:
+            self.tracing -= 1
+            if not self.tracing and self.owns_tracing:
+                tracemalloc.stop()
+                self.owns_tracing = False
+
+    def _finish(self, session):
+        elapsed = time.perf_counter() - session.started
+        try:
+            memory = tracemalloc.take_snapshot().compare_to(session.memory, "lineno")
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            self._stop_tracing()
+        stats = pstats.Stats(session.profile)
+        with session.lock:
+            for profile in session.workers:
+                stats.add(profile)
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        base = self.out_dir / f"{stamp}-{session.name}"
+        stats.dump_stats(str(base.with_suffix(".prof")))
+
+        report = io.StringIO()
+        report.write(f"{session.name}: {elapsed:.3f} с, рабочих потоков в профиле: {len(session.workers)}, "
+                     f"пик памяти Python {peak / 1048576:.1f} МБ\n\n")
+        stats.stream = report
+        stats.sort_stats("cumulative").print_stats(REPORT_TOP)
+        report.write("\nВыделение памяти за вызов (прирост по строкам):\n")
+        for diff in memory[:REPORT_TOP]:
+            report.write(f"  {diff}\n")
+        base.with_suffix(".txt").write_text(report.getvalue(), encoding="utf-8")
+
+        lines = [f"🔬 Профиль {session.name}: {elapsed * 1000:.0f} мс, пик памяти {peak / 1048576:.1f} МБ -> {base.name}.prof"]
+        rows = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:self.top]
+        for (path, lineno, func), (_, calls, tottime, cumtime, _) in rows:
+            lines.append(f"    {cumtime * 1000:8.1f} мс всего {tottime * 1000:8.1f} мс своих {calls:7d}× "
+                         f"{Path(path).name}:{lineno} {func}")
+        for diff in memory[:3]:
+            lines.append(f"    память {diff.size_diff / 1024:+.0f} КБ {diff.traceback[0]}")
+        for line in lines:
+            self.log(line, INFO)
+        self._prune()
+
+    def _prune(self):
+        files = sorted(self.out_dir.glob("*.prof"))
+        for path in files[:-PROFILE_KEEP]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".txt").unlink(missing_ok=True)
@@ -0,0 +1,133 @@
+import re
+import time
+import random
+import threading
+import statistics
+from email.utils import parsedate_to_datetime
+
+# === Адаптивное расписание обновления источников ===
+# У каждого источника свой интервал: он подстраивается под частоту публикаций ленты
+# (медиана промежутков между статьями), не бывает короче подсказок сервера
+# (Cache-Control: max-age, <ttl>, sy:updatePeriod, Retry-After), растёт экспоненциально
+# при ошибках и размывается случайным разбросом, чтобы запросы не уходили одновременно.
+
+DEFAULT_MIN_INTERVAL = 300        # 5 мин
+DEFAULT_MAX_INTERVAL = 86400      # сутки
+MAX_BACKOFF = 86400
+JITTER = 0.1                      # ±10% интервала
+CADENCE_SAMPLES = 20              # столько последних промежутков учитывается при оценке частоты
+IDLE_GROWTH = 1.5                 # интервал растёт, если за проход ничего нового
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*(?:s-)?max-age\s*=\s*(\d+)", re.IGNORECASE)
+SY_PERIODS = {"hourly": 3600, "daily": 86400, "weekly": 7 * 86400, "monthly": 30 * 86400, "yearly": 365 * 86400}
+
+
+def source_key(src):
+    return f"{src.get('type', 'rss')}:{src.get('url', '')}|{src.get('user', '')}"
+
+
+def parse_retry_after(value, now=None):
+    # Retry-After: число секунд или HTTP-дата
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0, int(parsedate_to_datetime(value).timestamp() - (now or time.time())))
+    except (TypeError, ValueError):
+        return None
+
+
+def response_hints(headers, info):
+    # Подсказки сервера из заголовков ответа — в сведения о запросе
+    cache_control = headers.get("Cache-Control", "")
+    if "no-cache" not in cache_control.lower():
+        m = _MAX_AGE.search(cache_control)
+        if m:
+            info["max_age"] = int(m.group(1))
+    retry_after = parse_retry_after(headers.get("Retry-After"))
+    if retry_after is not None:
+        info["retry_after"] = retry_after
+
+
+def feed_hints(feed, info):
+    # Подсказки из самой ленты: <ttl> (минуты) и sy:updatePeriod / sy:updateFrequency
+    try:
+        if feed.get("ttl"):
+            info["ttl"] = int(feed["ttl"]) * 60
+        period = SY_PERIODS.get(str(feed.get("sy_updateperiod", "")).strip().lower())
+        if period:
+            info["ttl"] = max(info.get("ttl", 0), period // max(int(feed.get("sy_updatefrequency") or 1), 1))
+    except (TypeError, ValueError):
+        pass
+
+
+def cadence(timestamps):
+    # Медианный промежуток между публикациями (сек.) или None, если данных мало
+    stamps = sorted({t for t in timestamps if t > 0}, reverse=True)[:CADENCE_SAMPLES + 1]
+    gaps = [a - b for a, b in zip(stamps, stamps[1:]) if a > b]
+    if len(gaps) < 2:
+        return None
+    return statistics.median(gaps)
+
+
+class FeedScheduler:
+    def __init__(self, default_interval, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL,
+                 state=None, rng=None):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.lock = threading.Lock()
+        self.rng = rng or random.Random()
+        # ключ источника -> {"next": время, "interval": сек., "failures": n, "cadence": сек. или None}
+        self.state = dict(state or {})
+
+    def snapshot(self):
+        with self.lock:
+            return {key: dict(value) for key, value in self.state.items()}
+
+    def due(self, sources, now=None):
+        now = now or time.time()
+        with self.lock:
+            return [src for src in sources if self.state.get(source_key(src), {}).get("next", 0) <= now]
+
+    def next_due(self, sources):
+        with self.lock:
+            return min((self.state.get(source_key(src), {}).get("next", 0) for src in sources), default=None)
+
+    def record(self, src, info, now=None):
+        # Планирует следующий запрос источника по итогам прохода
+        now = now or time.time()
+        key = source_key(src)
+        with self.lock:
+            entry = self.state.setdefault(key, {"interval": self.default_interval, "failures": 0, "cadence": None})
+            if info.get("error"):
+                entry["failures"] += 1
+                delay = min(entry["interval"] * 2 ** entry["failures"], MAX_BACKOFF)
+            else:
+                entry["failures"] = 0
+                observed = cadence(info.get("published", []))
+                if observed:
+                    entry["cadence"] = observed
+                if info.get("new"):
+                    # Статьи появились — проверяем примерно вдвое чаще, чем лента публикует
+                    interval = entry["cadence"] / 2 if entry["cadence"] else self.default_interval
+                else:
+                    interval = entry["interval"] * IDLE_GROWTH
+                    if entry["cadence"]:
+                        interval = min(interval, entry["cadence"])
+                entry["interval"] = min(max(interval, self.min_interval), self.max_interval)
+                delay = entry["interval"]
+            # Подсказки сервера — нижняя граница и для разброса; Retry-After соблюдается и при ошибках
+            floor = max(info.get("max_age") or 0, info.get("ttl") or 0, info.get("retry_after") or 0)
+            delay = max(delay * (1 + self.rng.uniform(-JITTER, JITTER)), floor)
+            entry["next"] = now + delay
+            return delay
+
+    def forget(self, sources):
+        # Удаляет расписание источников, которых больше нет в настройках
+        keys = {source_key(src) for src in sources}
+        with self.lock:
+            for key in [k for k in self.state if k not in keys]:
+                del self.state[key]
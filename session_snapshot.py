@@ -0,0 +1,60 @@
+import os
+import json
+import zlib
+import struct
+from pathlib import Path
+
+# === Снимок последнего сеанса ===
+# Лента в том порядке, в каком её видел читатель, и состояние показа (текущая статья, поисковый
+# запрос) — чтобы при запуске сразу открыть то же место, не выбирая заново все статьи из базы и
+# не дожидаясь источников. Формат: MAGIC, длина заголовка (4 байта), затем zlib-сжатые
+# JSON-заголовок и id статей. id — 40 шестнадцатеричных знаков, поэтому хранятся как 20 байт;
+# если встретится id другого вида, список пишется текстом через "\n".
+# Файл читается одним вызовом и распаковывается в памяти; пишется через временный файл.
+
+MAGIC = b"FRSS\x01"
+ID_BYTES = 20
+SNAPSHOT_LIMIT = 200000   # больше статей в ленте не сохраняется — дальше её дочитает обновление
+COMPRESS_LEVEL = 1        # id почти не сжимаются, а заголовок мал — быстрый уровень
+
+
+def save_snapshot(path, ids, state):
+    ids = list(ids[:SNAPSHOT_LIMIT])
+    try:
+        packed = b"".join(bytes.fromhex(art_id) for art_id in ids)
+        binary = len(packed) == len(ids) * ID_BYTES and packed.hex() == "".join(ids)
+    except ValueError:
+        binary = False
+    if not binary:
+        packed = "\n".join(ids).encode("utf-8")
+    header = json.dumps({**state, "count": len(ids), "binary": binary}, ensure_ascii=False).encode("utf-8")
+    payload = zlib.compress(struct.pack(">I", len(header)) + header + packed, COMPRESS_LEVEL)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(MAGIC + payload)
+    os.replace(tmp, path)
+    return len(MAGIC) + len(payload)
+
+
+def load_snapshot(path):
+    # -> (ids, state) или None, если снимка нет или он повреждён
+    try:
+        data = Path(path).read_bytes()
+        if not data.startswith(MAGIC):
+            return None
+        raw = zlib.decompress(data[len(MAGIC):])
+        size = struct.unpack(">I", raw[:4])[0]
+        state = json.loads(raw[4:4 + size].decode("utf-8"))
+        body = raw[4 + size:]
+    except (OSError, ValueError, zlib.error, struct.error):
+        return None
+    if state.get("binary"):
+        hexed = body.hex()
+        step = ID_BYTES * 2
+        ids = [hexed[i:i + step] for i in range(0, len(hexed), step)]
+    else:
+        ids = body.decode("utf-8").split("\n") if body else []
+    if len(ids) != state.get("count"):
+        return None
+    return ids, state
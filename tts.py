@@ -0,0 +1,182 @@
+import re
+import wave
+import queue
+import hashlib
+import itertools
+import threading
+from pathlib import Path
+
+from applog import WARNING
+
+try:
+    import winsound
+except ImportError:
+    winsound = None  # не Windows: готовые WAV проигрывать нечем, озвучка идёт только вживую
+
+# === Озвучка статей ===
+# Движок pyttsx3 не потокобезопасен, поэтому им владеет единственный поток TTSWorker.
+# Текст режется на предложения: первое звучит сразу, а между предложениями поток
+# проверяет, не отменена ли озвучка (перешли к другой статье). Следующие статьи
+# заранее записываются в WAV (save_to_file) в дисковый кэш — ключ из id статьи и
+# настроек голоса — и при переходе к ним проигрываются без задержки.
+
+DEFAULT_RATE = 170
+DEFAULT_VOLUME = 0.9
+DEFAULT_CACHE_MB = 200
+MAX_CHUNK = 400          # символов: длинные абзацы без точек режутся по пробелам
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+SPEAK, RENDER = 0, 1     # приоритеты заданий: озвучка текущей статьи раньше подготовки следующих
+
+
+def split_sentences(text):
+    chunks = []
+    for part in _SENTENCE_END.split(text):
+        part = part.strip()
+        while len(part) > MAX_CHUNK:
+            cut = part.rfind(" ", 0, MAX_CHUNK)
+            cut = cut if cut > 0 else MAX_CHUNK
+            chunks.append(part[:cut])
+            part = part[cut:].strip()
+        if part:
+            chunks.append(part)
+    return chunks
+
+
+class TTSWorker:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024, rate=DEFAULT_RATE, volume=DEFAULT_VOLUME,
+                 log=None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.rate = rate
+        self.volume = volume
+        self.log = log or (lambda msg, level=None: None)
+        self.engine = None
+        self.voice = ""
+        self.available = False
+        self.failed = False              # pyttsx3 не поднялся — задания не принимаются
+        self.jobs = queue.PriorityQueue()
+        self.seq = itertools.count()     # порядок заданий с одинаковым приоритетом
+        self.generation = 0              # растёт при каждой новой озвучке — старые задания отменяются
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.rendered = 0
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def speak(self, text, art_id=None):
+        # Прерывает текущую озвучку и очередь и читает text; при готовом WAV — проигрывает его
+        if self.failed:
+            return
+        with self.lock:
+            self.generation += 1
+            self.cancelled.set()
+            self._put(SPEAK, (self.generation, art_id, text))
+
+    def stop(self):
+        with self.lock:
+            self.generation += 1
+            self.cancelled.set()
+
+    def prerender(self, articles):
+        # articles: [(id, текст)] — записать в кэш заранее, пока нет ничего срочного
+        if winsound is None or self.failed:
+            return
+        for art_id, text in articles:
+            if art_id and not self._cache_path(art_id).exists():
+                self._put(RENDER, (self.generation, art_id, text))
+
+    def close(self):
+        self.stop()
+        self._put(-1, None)
+
+    def _put(self, priority, job):
+        self.jobs.put((priority, next(self.seq), job))
+
+    def _run(self):
+        try:
+            import pyttsx3
+            self.engine = pyttsx3.init()
+            self.engine.setProperty("rate", self.rate)
+            self.engine.setProperty("volume", self.volume)
+            self.voice = str(self.engine.getProperty("voice") or "")
+            self.available = True
+        except Exception as e:
+            self.failed = True
+            self.log(f"🔇 TTS: не удалось инициализировать: {e}", WARNING)
+            return
+        while True:
+            priority, _, job = self.jobs.get()
+            if job is None:
+                break
+            generation, art_id, text = job
+            try:
+                if priority == SPEAK:
+                    if generation == self.generation:
+                        self.cancelled.clear()
+                        self._speak(generation, art_id, text)
+                elif generation == self.generation and not self._urgent_queued():
+                    # Запись для прошлой озвучки уже не нужна, а пришедшая озвучка не ждёт конца записи
+                    self._render(art_id, text)
+            except Exception as e:
+                self.log(f"🔇 TTS: ошибка озвучки: {e}", WARNING)
+
+    def _urgent_queued(self):
+        # В очереди ждёт задание важнее записи — озвучка или остановка потока
+        with self.jobs.mutex:
+            return bool(self.jobs.queue) and self.jobs.queue[0][0] < RENDER
+
+    def _speak(self, generation, art_id, text):
+        path = self._cache_path(art_id) if art_id else None
+        if path and winsound is not None and path.exists():
+            self._play(path)
+            return
+        for sentence in split_sentences(text):
+            if generation != self.generation:
+                return
+            self.engine.say(sentence)
+            self.engine.runAndWait()
+
+    def _play(self, path):
+        with wave.open(str(path), "rb") as w:
+            duration = w.getnframes() / float(w.getframerate() or 1)
+        path.touch()
+        winsound.PlaySound(str(path), winsound.SND_FILENAME | winsound.SND_ASYNC)
+        if self.cancelled.wait(duration + 0.2):
+            winsound.PlaySound(None, 0)
+
+    def _render(self, art_id, text):
+        path = self._cache_path(art_id)
+        if path.exists():
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        self.engine.save_to_file(text, str(tmp))
+        self.engine.runAndWait()
+        if tmp.exists() and tmp.stat().st_size:
+            tmp.replace(path)
+            self.rendered += 1
+            self._prune()
+
+    def _cache_path(self, art_id):
+        key = hashlib.sha1(f"{art_id}|{self.voice}|{self.rate}|{self.volume}".encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.wav"
+
+    def _prune(self):
+        # Сверх бюджета удаляются записи, которые дольше всех не проигрывались
+        files = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.cache_dir.glob("*.wav")]
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self):
+        files = list(self.cache_dir.glob("*.wav")) if self.cache_dir.exists() else []
+        return {"entries": len(files), "bytes": sum(p.stat().st_size for p in files), "rendered": self.rendered,
+                "queued": self.jobs.qsize()}
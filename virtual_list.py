@@ -0,0 +1,126 @@
+import math
+import tkinter as tk
+
+# === Виртуальный список статей ===
+# Строки рисуются на Canvas только для видимого окна: сколько бы статей ни было в ленте,
+# на экране живёт пара десятков элементов, а заголовки видимых строк запрашиваются
+# у row_source(start, stop) при каждой перерисовке. Прокрутка — через стандартный
+# протокол yview, поэтому подходит и tk.Scrollbar, и CTkScrollbar.
+
+ROW_HEIGHT = 46
+PADDING = 8
+CHAR_WIDTH = 7  # примерная ширина символа в пикселях — для обрезки заголовков без замеров шрифта
+
+DARK_COLORS = {"bg": "#2b2b2b", "fg": "#dce4ee", "meta": "#8d949c", "selected": "#1f538d", "separator": "#3a3a3a"}
+LIGHT_COLORS = {"bg": "#f2f2f2", "fg": "#1a1a1a", "meta": "#6b6b6b", "selected": "#9cc3ee", "separator": "#dadada"}
+
+
+def clip(text, width):
+    chars = max(width // CHAR_WIDTH, 4)
+    return text if len(text) <= chars else text[:chars - 1] + "…"
+
+
+class VirtualList:
+    def __init__(self, parent, row_source, on_select, row_height=ROW_HEIGHT, colors=DARK_COLORS, width=320):
+        # row_source(start, stop) -> [(заголовок, подпись)] для строк start..stop-1
+        self.row_source = row_source
+        self.on_select = on_select
+        self.row_height = row_height
+        self.colors = colors
+        self.count = 0
+        self.offset = 0          # прокрутка в пикселях
+        self.selected = -1
+        self.scrollbar = None
+        self.canvas = tk.Canvas(parent, width=width, highlightthickness=0, bd=0, bg=colors["bg"])
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self._click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll(3))
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def set_scrollbar(self, scrollbar):
+        self.scrollbar = scrollbar
+
+    def set_colors(self, colors):
+        self.colors = colors
+        self.canvas.configure(bg=colors["bg"])
+        self.redraw()
+
+    def set_count(self, count, selected=-1):
+        # Новая выборка: прокрутка сохраняется, если выделенная строка остаётся видимой
+        self.count = count
+        self.selected = selected
+        self.offset = min(self.offset, self._max_offset())
+        self.see(selected)
+        self.redraw()
+
+    def select(self, index):
+        self.selected = index
+        self.see(index)
+        self.redraw()
+
+    def see(self, index):
+        if index < 0:
+            return
+        height = self._height()
+        top = index * self.row_height
+        if top < self.offset:
+            self.offset = top
+        elif top + self.row_height > self.offset + height:
+            self.offset = top + self.row_height - height
+        self.offset = max(0, min(self.offset, self._max_offset()))
+
+    def scroll(self, rows):
+        self.offset = max(0, min(self.offset + rows * self.row_height, self._max_offset()))
+        self.redraw()
+
+    def yview(self, *args):
+        # Протокол полосы прокрутки: ("moveto", доля) или ("scroll", n, "units"|"pages")
+        if args and args[0] == "moveto":
+            self.offset = max(0, min(int(float(args[1]) * self.count * self.row_height), self._max_offset()))
+            self.redraw()
+        elif args and args[0] == "scroll":
+            step = int(args[1])
+            if len(args) > 2 and args[2] == "pages":
+                step *= max(self._height() // self.row_height - 1, 1)
+            self.scroll(step)
+
+    def redraw(self):
+        canvas = self.canvas
+        canvas.delete("row")
+        width = canvas.winfo_width()
+        height = self._height()
+        first = self.offset // self.row_height
+        stop = min(self.count, first + math.ceil(height / self.row_height) + 1)
+        rows = self.row_source(first, stop) if stop > first else []
+        colors = self.colors
+        for i, (title, meta) in enumerate(rows, first):
+            y = i * self.row_height - self.offset
+            if i == self.selected:
+                canvas.create_rectangle(0, y, width, y + self.row_height, fill=colors["selected"], width=0, tags="row")
+            canvas.create_text(PADDING, y + 6, anchor="nw", text=clip(title, width - 2 * PADDING),
+                               fill=colors["fg"], font=("Segoe UI", 10, "bold"), tags="row")
+            canvas.create_text(PADDING, y + 26, anchor="nw", text=clip(meta, width - 2 * PADDING),
+                               fill=colors["meta"], font=("Segoe UI", 9), tags="row")
+            canvas.create_line(0, y + self.row_height - 1, width, y + self.row_height - 1,
+                               fill=colors["separator"], tags="row")
+        if self.scrollbar is not None:
+            total = self.count * self.row_height
+            if total <= height:
+                self.scrollbar.set(0.0, 1.0)
+            else:
+                self.scrollbar.set(self.offset / total, (self.offset + height) / total)
+
+    def _height(self):
+        return max(self.canvas.winfo_height(), self.row_height)
+
+    def _max_offset(self):
+        return max(self.count * self.row_height - self._height(), 0)
+
+    def _click(self, event):
+        index = (self.offset + event.y) // self.row_height
+        if 0 <= index < self.count:
+            self.on_select(index)